@@ -0,0 +1,204 @@
+"""
+Admission Control for Sumeru AI Platform
+
+This module limits outbound LLM requests: a global and a per-provider
+concurrency cap with a priority queue, plus token buckets for requests and
+tokens per minute. Waiters are admitted by priority (lower numbers first),
+then in arrival order. Every current caller is interactive chat, so there is
+no background tier: PRIORITY_INTERACTIVE is the only level in use and
+admission is effectively first come, first served.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Any, AsyncIterator, Deque
+
+PRIORITY_INTERACTIVE = 0
+
+class PrioritySemaphore:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.waiters: List[tuple] = []  # heap of (priority, sequence, future)
+        self.sequence = itertools.count()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.waiters)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        """Take a slot, queueing behind higher-priority (lower number) and earlier waiters"""
+        if self.in_use < self.limit and not self.waiters:
+            self.in_use += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation landed
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                self.waiters = [waiter for waiter in self.waiters if waiter[2] is not future]
+                heapq.heapify(self.waiters)
+            raise
+
+    def release(self):
+        """Return a slot, handing it straight to the next waiter if there is one"""
+        self.in_use -= 1
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                self.in_use += 1
+                future.set_result(None)
+                return
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Wait until amount tokens are available and take them"""
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class GateStats:
+    def __init__(self, window_size: int = 500):
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits: Deque[float] = deque(maxlen=window_size)
+
+    def record(self, wait: float):
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.recent_waits)
+        return {
+            "admitted": self.admitted,
+            "avg_wait": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+            "p95_wait": round(ordered[int(0.95 * (len(ordered) - 1))], 4) if ordered else 0.0,
+            "max_wait": round(self.max_wait, 4)
+        }
+
+class AdmissionController:
+    def __init__(self, global_limit: int, provider_limits: Dict[str, Dict[str, Any]]):
+        self.global_gate = PrioritySemaphore(global_limit)
+        self.provider_gates: Dict[str, PrioritySemaphore] = {}
+        self.request_buckets: Dict[str, TokenBucket] = {}
+        self.token_buckets: Dict[str, TokenBucket] = {}
+        self.stats: Dict[str, GateStats] = {}
+        for provider, limits in provider_limits.items():
+            self.configure(provider, **limits)
+
+    def configure(self, provider: str, max_concurrency: int = 10, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        """Set a provider's concurrency cap and optional requests/tokens per minute"""
+        self.provider_gates[provider] = PrioritySemaphore(max_concurrency)
+        if rpm:
+            self.request_buckets[provider] = TokenBucket(rpm)
+        if tpm:
+            self.token_buckets[provider] = TokenBucket(tpm)
+        self.stats.setdefault(provider, GateStats())
+
+    @asynccontextmanager
+    async def admit(self, provider: str, priority: int = PRIORITY_INTERACTIVE, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """Hold a provider slot and a global slot for the duration of a request.
+
+        The provider slot and the provider's rpm/tpm buckets are waited on
+        before the global slot, so a backlog or rate limit on one provider
+        queues on its own gate instead of holding global slots.
+        """
+        if provider not in self.provider_gates:
+            self.configure(provider)
+        provider_gate = self.provider_gates[provider]
+        started_at = time.monotonic()
+
+        await provider_gate.acquire(priority)
+        try:
+            if provider in self.request_buckets:
+                await self.request_buckets[provider].acquire(1)
+            if provider in self.token_buckets and estimated_tokens:
+                await self.token_buckets[provider].acquire(estimated_tokens)
+            await self.global_gate.acquire(priority)
+            try:
+                self.stats[provider].record(time.monotonic() - started_at)
+                yield
+            finally:
+                self.global_gate.release()
+        finally:
+            provider_gate.release()
+
+    def is_queued(self, providers: List[str]) -> bool:
+        """Whether any request is waiting for a global slot or for a slot on one of providers"""
+        if self.global_gate.queue_depth:
+            return True
+        return any(provider in self.provider_gates and self.provider_gates[provider].queue_depth for provider in providers)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get slot usage, queue depth and wait times for every gate"""
+        return {
+            "global": {
+                "limit": self.global_gate.limit,
+                "in_use": self.global_gate.in_use,
+                "queue_depth": self.global_gate.queue_depth
+            },
+            "providers": {
+                provider: {
+                    "limit": gate.limit,
+                    "in_use": gate.in_use,
+                    "queue_depth": gate.queue_depth,
+                    "rpm": self.request_buckets[provider].capacity if provider in self.request_buckets else None,
+                    "tpm": self.token_buckets[provider].capacity if provider in self.token_buckets else None,
+                    **self.stats[provider].snapshot()
+                }
+                for provider, gate in self.provider_gates.items()
+            }
+        }
+
+def load_router_limits(path: str) -> Dict[str, Dict[str, float]]:
+    """Read per-provider rpm/tpm from a router.yaml-style model_list.
+
+    The provider is the prefix of each litellm model name, e.g. "gemini" for
+    "gemini/gemini-2.5-pro". Returns an empty mapping if PyYAML is unavailable.
+    """
+    try:
+        import yaml
+    except ImportError:
+        print("PyYAML not available. Ignoring router limits config.")
+        return {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+
+    limits: Dict[str, Dict[str, float]] = {}
+    for entry in config.get("model_list", []):
+        params = entry.get("litellm_params", {})
+        provider = str(params.get("model", "")).split("/")[0]
+        if not provider:
+            continue
+        for field in ("rpm", "tpm"):
+            if params.get(field):
+                limits.setdefault(provider, {})[field] = params[field]
+    return limits
@@ -0,0 +1,219 @@
+"""
+Artifact Store for Sumeru AI Platform
+
+This module keeps generated file content on disk, addressed by its SHA-256
+hash, so identical content is stored once however many tasks produce it. A
+small SQLite index counts the references to each blob; a blob is deleted when
+its last reference is released. The owners of those references live in
+memory, so reconcile() rebuilds the counts from them at startup and deletes
+whatever nothing owns any more. Blobs are compressed with zstd when the
+zstandard package is installed.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Any, Tuple, Union
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+COMPRESSION_NONE = "none"
+COMPRESSION_ZSTD = "zstd"
+
+# Content smaller than this gains nothing from compression
+MIN_COMPRESS_BYTES = 512
+
+@dataclass
+class BlobInfo:
+    digest: str
+    size: int
+    stored_size: int
+    compression: str
+    refcount: int
+
+class ArtifactStore:
+    def __init__(self, root: str, compression: str = COMPRESSION_ZSTD, level: int = 3):
+        self.root = root
+        self.compression = compression
+        self.level = level
+        self.lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+        self.stats = {"puts": 0, "deduplicated": 0, "reads": 0, "releases": 0, "deleted": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the index on first use; call with self.lock held"""
+        if self.db is None:
+            os.makedirs(self.root, exist_ok=True)
+            if self.compression == COMPRESSION_ZSTD and not ZSTD_AVAILABLE:
+                print("zstandard not available. Artifacts are stored uncompressed.")
+                self.compression = COMPRESSION_NONE
+            self.db = sqlite3.connect(os.path.join(self.root, "index.db"), check_same_thread=False)
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    stored_size INTEGER NOT NULL,
+                    compression TEXT NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self.db.commit()
+        return self.db
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _encode(self, data: bytes) -> Tuple[bytes, str]:
+        if self.compression == COMPRESSION_ZSTD and len(data) >= MIN_COMPRESS_BYTES:
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(data)
+            if len(compressed) < len(data):
+                return compressed, COMPRESSION_ZSTD
+        return data, COMPRESSION_NONE
+
+    def put(self, content: Union[str, bytes]) -> str:
+        """Store content, or take another reference to an identical blob, and return its hash"""
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            db = self._connect()
+            self.stats["puts"] += 1
+            if db.execute("UPDATE blobs SET refcount = refcount + 1 WHERE digest = ?", (digest,)).rowcount:
+                db.commit()
+                self.stats["deduplicated"] += 1
+                return digest
+
+        stored, compression = self._encode(data)
+        path = self.path_for(digest)
+        with self.lock:
+            db = self._connect()
+            # Another thread may have stored the same content while this one compressed it
+            if db.execute("UPDATE blobs SET refcount = refcount + 1 WHERE digest = ?", (digest,)).rowcount:
+                db.commit()
+                self.stats["deduplicated"] += 1
+                return digest
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(stored)
+            os.replace(temp_path, path)
+            db.execute(
+                "INSERT INTO blobs (digest, size, stored_size, compression, refcount, created_at) VALUES (?, ?, ?, ?, 1, ?)",
+                (digest, len(data), len(stored), compression, time.time())
+            )
+            db.commit()
+        return digest
+
+    def put_many(self, contents: Iterable[Union[str, bytes]]) -> List[str]:
+        """Store several contents, returning their hashes in order"""
+        return [self.put(content) for content in contents]
+
+    def get_info(self, digest: str) -> Optional[BlobInfo]:
+        """Get a blob's sizes, compression and reference count, or None if it is not stored"""
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT digest, size, stored_size, compression, refcount FROM blobs WHERE digest = ?", (digest,)
+            ).fetchone()
+        return BlobInfo(*row) if row is not None else None
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Read a blob's content, or None if it is not stored"""
+        info = self.get_info(digest)
+        if info is None:
+            return None
+        try:
+            with open(self.path_for(digest), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None  # released since it was looked up
+        with self.lock:
+            self.stats["reads"] += 1
+        if info.compression == COMPRESSION_ZSTD:
+            data = zstandard.ZstdDecompressor().decompress(data, max_output_size=info.size)
+        return data
+
+    def get_text(self, digest: str) -> Optional[str]:
+        """Read a blob's content as UTF-8 text, or None if it is not stored"""
+        data = self.get(digest)
+        return data.decode("utf-8") if data is not None else None
+
+    def release(self, digest: str) -> bool:
+        """Drop one reference to a blob, deleting it with its last reference; returns True if deleted"""
+        with self.lock:
+            db = self._connect()
+            if not db.execute(
+                "UPDATE blobs SET refcount = refcount - 1 WHERE digest = ? AND refcount > 0", (digest,)
+            ).rowcount:
+                return False
+            self.stats["releases"] += 1
+            deleted = db.execute("DELETE FROM blobs WHERE digest = ? AND refcount <= 0", (digest,)).rowcount > 0
+            db.commit()
+            if deleted:
+                try:
+                    os.remove(self.path_for(digest))
+                except OSError:
+                    pass
+                self.stats["deleted"] += 1
+            return deleted
+
+    def release_many(self, digests: Iterable[str]) -> int:
+        """Drop one reference to each blob; returns how many blobs were deleted"""
+        return sum(self.release(digest) for digest in digests)
+
+    def reconcile(self, references: Dict[str, int]) -> int:
+        """Set every refcount to the references its live owners hold and delete unowned blobs; returns the number deleted"""
+        with self.lock:
+            db = self._connect()
+            digests = [row[0] for row in db.execute("SELECT digest FROM blobs")]
+            orphans = [digest for digest in digests if references.get(digest, 0) <= 0]
+            db.executemany("DELETE FROM blobs WHERE digest = ?", [(digest,) for digest in orphans])
+            db.executemany(
+                "UPDATE blobs SET refcount = ? WHERE digest = ?",
+                [(references[digest], digest) for digest in digests if references.get(digest, 0) > 0]
+            )
+            db.commit()
+            for digest in orphans:
+                try:
+                    os.remove(self.path_for(digest))
+                except OSError:
+                    pass
+            self.stats["deleted"] += len(orphans)
+            return len(orphans)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get blob counts, logical and stored bytes, and the bytes saved by deduplication"""
+        with self.lock:
+            blobs, size, stored_size, references, logical_size = self._connect().execute(
+                "SELECT COUNT(*), TOTAL(size), TOTAL(stored_size), TOTAL(refcount), TOTAL(size * refcount) FROM blobs"
+            ).fetchone()
+            return {
+                **self.stats,
+                "blobs": blobs,
+                "references": int(references),
+                "logical_bytes": int(logical_size),
+                "content_bytes": int(size),
+                "stored_bytes": int(stored_size),
+                "saved_bytes": int(logical_size - stored_size),
+                "compression": self.compression
+            }
+
+    def close(self):
+        """Close the index"""
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+# Global artifact store instance
+artifact_store = ArtifactStore(
+    os.getenv("ARTIFACT_STORE_DIR", "./artifacts"),
+    compression=os.getenv("ARTIFACT_COMPRESSION", COMPRESSION_ZSTD)
+)
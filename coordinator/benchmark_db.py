@@ -0,0 +1,96 @@
+"""
+Chat Storage Benchmark for Sumeru AI Platform
+
+Measures messages per second for the old storage path (default rollback
+journal, one commit per row on the event loop) against AsyncDatabase in WAL
+mode with group commit, at each durability level.
+
+Usage: python benchmark_db.py [--messages 2000] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from database import AsyncDatabase, DURABILITY_LEVELS
+
+MESSAGES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender TEXT NOT NULL,
+        message TEXT NOT NULL,
+        avatar TEXT DEFAULT '👤',
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_working BOOLEAN DEFAULT FALSE,
+        message_type TEXT DEFAULT 'user',
+        steps_remaining INTEGER DEFAULT 0,
+        is_error BOOLEAN DEFAULT FALSE,
+        error_type TEXT DEFAULT NULL
+    )
+'''
+
+INSERT_MESSAGE = '''
+    INSERT INTO messages (sender, message, avatar, is_working, message_type, steps_remaining, is_error, error_type)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def message_params(i: int) -> tuple:
+    return ("User", f"benchmark message {i}", "👤", False, "user", 0, False, None)
+
+async def bench_per_row_commit(path: str, messages: int, concurrency: int) -> float:
+    """The pre-WAL path: every save_message commits its own row on the event loop"""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(MESSAGES_TABLE)
+    conn.commit()
+
+    async def worker(start: int):
+        for i in range(start, messages, concurrency):
+            conn.execute(INSERT_MESSAGE, message_params(i))
+            conn.commit()
+            await asyncio.sleep(0)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    conn.close()
+    return messages / elapsed
+
+async def bench_group_commit(path: str, messages: int, concurrency: int, durability: str, commit_window: float) -> tuple:
+    db = AsyncDatabase(path, durability=durability, commit_window=commit_window)
+    db.start()
+    await db.execute(MESSAGES_TABLE)
+
+    async def worker(start: int):
+        for i in range(start, messages, concurrency):
+            await db.execute(INSERT_MESSAGE, message_params(i))
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    stats = db.get_stats()
+    db.close()
+    return messages / elapsed, stats
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--commit-window-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.messages} messages from {args.concurrency} concurrent writers")
+
+        rate = await bench_per_row_commit(os.path.join(tmp, "baseline.db"), args.messages, args.concurrency)
+        print(f"  per-row commit, rollback journal: {rate:10.0f} msg/s")
+
+        for durability in DURABILITY_LEVELS:
+            path = os.path.join(tmp, f"wal-{durability}.db")
+            rate, stats = await bench_group_commit(path, args.messages, args.concurrency, durability, args.commit_window_ms / 1000)
+            print(f"  WAL + group commit, {durability:6}: {rate:10.0f} msg/s (avg batch {stats['avg_batch_size']})")
+
+if __name__ == "__main__":
+    asyncio.run(main())
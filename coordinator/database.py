@@ -0,0 +1,246 @@
+"""
+Async SQLite Access Layer for Sumeru AI Platform
+
+This module keeps SQLite off the event loop. All writes go through a request
+queue to one dedicated writer thread (SQLite allows a single writer anyway),
+and reads run on a small pool of threads, each with its own connection.
+
+The database runs in WAL mode and the writer group-commits: requests that
+arrive within a short window share one transaction, so concurrent chat
+requests pay for one fsync between them instead of one per row.
+"""
+
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Callable, Tuple
+
+# synchronous setting per durability level. In WAL mode "normal" never corrupts
+# the database, but a power loss can drop the last commits; "full" syncs every
+# commit and "off" leaves flushing to the OS.
+DURABILITY_LEVELS = {"full": "FULL", "normal": "NORMAL", "off": "OFF"}
+
+class AsyncDatabase:
+    def __init__(self, path: str, read_pool_size: int = 4, durability: str = "normal", commit_window: float = 0.0,
+                 max_batch: int = 256, cache_size_kb: int = 16384, mmap_size: int = 256 * 1024 * 1024,
+                 busy_timeout_ms: int = 5000):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level {durability!r}; expected one of {', '.join(DURABILITY_LEVELS)}")
+        self.path = path
+        self.read_pool_size = read_pool_size
+        self.durability = durability
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.held_request: Optional[tuple] = None
+        self.writer_conn: Optional[sqlite3.Connection] = None
+        self.writer_thread: Optional[threading.Thread] = None
+        self.read_executor: Optional[ThreadPoolExecutor] = None
+        self.read_local = threading.local()
+        self.read_connections: List[sqlite3.Connection] = []
+        self.read_connections_lock = threading.Lock()
+        self.stats = {"writes": 0, "failed_writes": 0, "batches": 0, "max_batch_size": 0}
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a connection configured like every other connection in the pool"""
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous = {DURABILITY_LEVELS[self.durability]}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def start(self):
+        """Switch the database to WAL and start the writer thread and the read pool"""
+        if self.writer_thread is not None:
+            return
+        # Transactions are managed explicitly so one batch can hold a savepoint per request
+        self.writer_conn = self.connect()
+        self.writer_conn.isolation_level = None
+        # Only takes effect on a new database, and only before WAL writes its header
+        self.writer_conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.writer_conn.execute("PRAGMA journal_mode = WAL")
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+        self.writer_thread.start()
+        self.read_executor = ThreadPoolExecutor(max_workers=self.read_pool_size, thread_name_prefix="sqlite-reader")
+
+    def close(self):
+        """Drain pending writes, then stop the writer thread and close every connection"""
+        if self.writer_thread is not None:
+            self.write_queue.put(None)
+            self.writer_thread.join()
+            self.writer_thread = None
+        if self.read_executor is not None:
+            self.read_executor.shutdown(wait=True)
+            self.read_executor = None
+        with self.read_connections_lock:
+            for conn in self.read_connections:
+                conn.close()
+            self.read_connections.clear()
+
+    def _writer_loop(self):
+        conn = self.writer_conn
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch and not batch[0][4]:
+                    self._run_alone(conn, batch[0])
+                elif batch:
+                    self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+            self.writer_conn = None
+
+    def _next_batch(self) -> Tuple[List[tuple], bool]:
+        """Block for one write request, then collect the rest of the batch.
+
+        Everything already queued joins the batch. Only when that shows other
+        writers are active does the writer hold the batch open for the commit
+        window, so a lone write is never delayed. A request that must run
+        outside a transaction always runs in a batch of its own.
+        """
+        request = self.held_request or self.write_queue.get()
+        self.held_request = None
+        if request is None:
+            return [], True
+        batch = [request]
+        if not request[4]:
+            return batch, False
+        deadline = time.monotonic() + self.commit_window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                if len(batch) > 1 and timeout > 0:
+                    request = self.write_queue.get(timeout=timeout)
+                else:
+                    request = self.write_queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            if not request[4]:
+                self.held_request = request
+                break
+            batch.append(request)
+        return batch, False
+
+    def _run_alone(self, conn: sqlite3.Connection, request: tuple):
+        """Run one request in autocommit mode, for statements such as VACUUM that cannot run in a transaction"""
+        func, args, future, loop, _ = request
+        # A write run alone counts as a batch of one
+        self.stats["batches"] += 1
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], 1)
+        try:
+            result = func(conn, *args)
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            self.stats["failed_writes"] += 1
+            loop.call_soon_threadsafe(_resolve, future, None, e)
+        else:
+            self.stats["writes"] += 1
+            loop.call_soon_threadsafe(_resolve, future, result, None)
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[tuple]):
+        """Run a batch in one transaction, isolating each request in its own savepoint"""
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, future, loop, _ in batch:
+                conn.execute("SAVEPOINT request")
+                try:
+                    result = func(conn, *args)
+                except Exception as e:
+                    # Undo just this request; the rest of the batch still commits
+                    conn.execute("ROLLBACK TO request")
+                    conn.execute("RELEASE request")
+                    outcomes.append((future, loop, None, e))
+                else:
+                    conn.execute("RELEASE request")
+                    outcomes.append((future, loop, result, None))
+            conn.execute("COMMIT")
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            outcomes = [(future, loop, None, e) for _, _, future, loop, _ in batch]
+
+        self.stats["batches"] += 1
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+        for future, loop, result, error in outcomes:
+            self.stats["failed_writes" if error is not None else "writes"] += 1
+            loop.call_soon_threadsafe(_resolve, future, result, error)
+
+    def _read_connection(self) -> sqlite3.Connection:
+        conn = getattr(self.read_local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            conn.execute("PRAGMA query_only = ON")
+            self.read_local.conn = conn
+            with self.read_connections_lock:
+                self.read_connections.append(conn)
+        return conn
+
+    async def run_write(self, func: Callable[..., Any], *args) -> Any:
+        """Run func(conn, *args) on the writer thread and wait until its transaction commits.
+
+        func runs inside a shared group-commit transaction, so it must not
+        commit or roll back itself; raising undoes only its own changes.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.write_queue.put((func, args, future, loop, True))
+        return await future
+
+    async def run_unbatched(self, func: Callable[..., Any], *args) -> Any:
+        """Run func(conn, *args) on the writer thread outside any transaction, between batches"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.write_queue.put((func, args, future, loop, False))
+        return await future
+
+    async def run_read(self, func: Callable[..., Any], *args) -> Any:
+        """Run func(conn, *args) on a read connection"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.read_executor, lambda: func(self._read_connection(), *args))
+
+    async def execute(self, sql: str, params: tuple = ()) -> int:
+        """Execute one write statement and return the last inserted row id"""
+        return await self.run_write(lambda conn: conn.execute(sql, params).lastrowid)
+
+    async def fetch_all(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """Run a query and return its rows as dicts"""
+        return await self.run_read(lambda conn: [dict(row) for row in conn.execute(sql, params).fetchall()])
+
+    async def fetch_one(self, sql: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
+        """Run a query and return its first row as a dict, or None"""
+        def fetch(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row is not None else None
+        return await self.run_read(fetch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get write and commit counters, including the average group-commit batch size"""
+        return {
+            **self.stats,
+            "avg_batch_size": round((self.stats["writes"] + self.stats["failed_writes"]) / self.stats["batches"], 2) if self.stats["batches"] else 0.0,
+            "pending_writes": self.write_queue.qsize(),
+            "durability": self.durability,
+            "commit_window_ms": self.commit_window * 1000
+        }
+
+def _resolve(future: asyncio.Future, result: Any, error: Optional[BaseException]):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
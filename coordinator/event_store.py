@@ -0,0 +1,233 @@
+"""
+Event Store for Sumeru AI Platform
+
+This module keeps agent activity (messages, conversations, task history) in
+fixed-capacity ring buffers, one per stream, with secondary indexes by agent,
+task and workflow. Recent-N queries, filtered or not, touch only the events
+they return. Events that fall out of a full buffer can be spilled to SQLite so
+older history stays queryable while memory use stays capped; the spill keeps
+a bounded number of events per stream too.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Any, Tuple
+
+INDEX_FIELDS = ("agent_role", "task_id", "workflow_id")
+
+class EventSpill:
+    """SQLite storage for events evicted from ring buffers, written in batches by its own thread"""
+
+    def __init__(self, db_path: str, batch_size: int = 100, max_rows: int = 100000):
+        self.batch_size = batch_size
+        self.max_rows = max_rows  # per stream; older spilled events are pruned, 0 keeps every one
+        self.pending: List[Tuple[Any, ...]] = []
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.pruned = 0
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                stream TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                agent_role TEXT,
+                task_id TEXT,
+                workflow_id TEXT,
+                data TEXT NOT NULL,
+                spilled_at REAL NOT NULL,
+                PRIMARY KEY (stream, seq)
+            )
+        ''')
+        for field in INDEX_FIELDS:
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS idx_events_{field} ON events (stream, {field}, seq)")
+        self.db.commit()
+        # Evictions happen inside EventStream.append on the event loop, so commits run here instead
+        self.batches: "queue.Queue[Optional[List[Tuple[Any, ...]]]]" = queue.Queue()
+        self.writer = threading.Thread(target=self._writer_loop, name="event-spill-writer", daemon=True)
+        self.writer.start()
+
+    def add(self, stream: str, seq: int, event: Dict[str, Any]):
+        """Queue an evicted event, handing the queue to the writer once it reaches batch_size"""
+        with self.lock:
+            self.pending.append((
+                stream, seq, *(event.get(field) for field in INDEX_FIELDS),
+                json.dumps(event, default=str), time.time()
+            ))
+            if len(self.pending) >= self.batch_size:
+                self.batches.put(self.pending)
+                self.pending = []
+
+    def _writer_loop(self):
+        while True:
+            batch = self.batches.get()
+            try:
+                if batch is None:
+                    return
+                self._write(batch)
+            except Exception as e:
+                print(f"Error spilling events: {e}")
+            finally:
+                self.batches.task_done()
+
+    def _write(self, batch: List[Tuple[Any, ...]]):
+        newest: Dict[str, int] = {}
+        for stream, seq, *_ in batch:
+            newest[stream] = max(newest.get(stream, 0), seq)
+        with self.db_lock:
+            # Spilled events are history; a clashing seq must never replace one already written
+            self.db.executemany("INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            if self.max_rows:
+                # Seqs of a stream are spilled in order, so its newest max_rows events are the last max_rows seqs
+                for stream, seq in newest.items():
+                    self.pruned += self.db.execute(
+                        "DELETE FROM events WHERE stream = ? AND seq <= ?", (stream, seq - self.max_rows)
+                    ).rowcount
+            self.db.commit()
+
+    def flush(self):
+        """Hand queued events to the writer and wait until everything handed over is written"""
+        with self.lock:
+            if self.pending:
+                self.batches.put(self.pending)
+                self.pending = []
+        self.batches.join()
+
+    def max_seq(self, stream: str) -> int:
+        """Get the highest seq spilled for a stream so far, or 0 if there is none"""
+        self.flush()
+        with self.db_lock:
+            row = self.db.execute("SELECT MAX(seq) FROM events WHERE stream = ?", (stream,)).fetchone()
+        return row[0] or 0
+
+    def query(self, stream: str, limit: int, before_seq: Optional[int] = None, **filters: Any) -> List[Dict[str, Any]]:
+        """Get up to limit spilled events of a stream older than before_seq, oldest first"""
+        conditions = ["stream = ?"]
+        params: List[Any] = [stream]
+        if before_seq is not None:
+            conditions.append("seq < ?")
+            params.append(before_seq)
+        for field, value in filters.items():
+            if field not in INDEX_FIELDS:
+                raise ValueError(f"Cannot filter events by {field}")
+            if value is not None:
+                conditions.append(f"{field} = ?")
+                params.append(value)
+        self.flush()
+        with self.db_lock:
+            rows = self.db.execute(
+                f"SELECT data FROM events WHERE {' AND '.join(conditions)} ORDER BY seq DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def close(self):
+        """Write queued events, stop the writer and close the database"""
+        self.flush()
+        self.batches.put(None)
+        self.writer.join()
+        with self.db_lock:
+            self.db.close()
+
+class EventStream:
+    """A bounded, indexed log of events; the oldest event is evicted when it is full"""
+
+    def __init__(self, name: str, capacity: int, spill: Optional[EventSpill] = None):
+        self.name = name
+        self.capacity = capacity
+        self.spill = spill
+        self.events: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        # field -> value -> (seq, event) in append order; each holds a subset of self.events
+        self.indexes: Dict[str, Dict[Any, Deque[Tuple[int, Dict[str, Any]]]]] = {field: {} for field in INDEX_FIELDS}
+        # Continue after what earlier runs spilled, so their history is never overwritten
+        self.next_seq = spill.max_seq(name) + 1 if spill is not None else 1
+        self.appended = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def append(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Add an event, evicting (and spilling) the oldest one if the stream is full"""
+        with self.lock:
+            entry = (self.next_seq, event)
+            self.next_seq += 1
+            self.appended += 1
+            self.events.append(entry)
+            for field, index in self.indexes.items():
+                value = event.get(field)
+                if value is not None:
+                    index.setdefault(value, deque()).append(entry)
+            while len(self.events) > self.capacity:
+                self._evict()
+        return event
+
+    def _evict(self):
+        seq, event = self.events.popleft()
+        # The evicted event is the oldest overall, so it is also the oldest in each of its indexes
+        for field, index in self.indexes.items():
+            value = event.get(field)
+            if value is None:
+                continue
+            entries = index.get(value)
+            if entries and entries[0][0] == seq:
+                entries.popleft()
+                if not entries:
+                    del index[value]
+        self.evicted += 1
+        if self.spill is not None:
+            self.spill.add(self.name, seq, event)
+
+    def recent(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        """Get the newest limit events, oldest first, optionally matching every given field"""
+        filters = {field: value for field, value in filters.items() if value is not None}
+        with self.lock:
+            if not filters:
+                entries = self.events
+            else:
+                unknown = filters.keys() - self.indexes.keys()
+                if unknown:
+                    raise ValueError(f"Cannot filter events by {', '.join(sorted(unknown))}")
+                # Walk the smallest matching index and check the remaining fields
+                candidates = [self.indexes[field].get(value, ()) for field, value in filters.items()]
+                entries = min(candidates, key=len)
+                if len(filters) > 1:
+                    entries = (
+                        entry for entry in reversed(entries)
+                        if all(entry[1].get(field) == value for field, value in filters.items())
+                    )
+                    return [event for _, event in reversed(list(islice(entries, limit)))]
+            return [event for _, event in reversed(list(islice(reversed(entries), limit)))]
+
+    def history(self, limit: int = 50, before_seq: Optional[int] = None, **filters: Any) -> List[Dict[str, Any]]:
+        """Get events older than the ones still in memory from the spill, oldest first"""
+        if self.spill is None:
+            return []
+        with self.lock:
+            oldest = self.events[0][0] if self.events else self.next_seq
+        before_seq = oldest if before_seq is None else min(before_seq, oldest)
+        return self.spill.query(self.name, limit, before_seq, **filters)
+
+    def clear(self):
+        """Drop every event held in memory"""
+        with self.lock:
+            self.events.clear()
+            for index in self.indexes.values():
+                index.clear()
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get size, capacity and eviction counters"""
+        with self.lock:
+            return {
+                "events": len(self.events),
+                "capacity": self.capacity,
+                "appended": self.appended,
+                "evicted": self.evicted,
+                "indexed_keys": {field: len(index) for field, index in self.indexes.items()},
+                "spill": self.spill is not None
+            }
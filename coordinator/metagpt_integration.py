@@ -7,28 +7,47 @@ providing AI agents that can collaborate on software development tasks.
 
 import asyncio
 import json
+import os
 import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Deque, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
+from collections import deque
+from itertools import islice
 import uuid
 
+from artifact_store import artifact_store
+from event_store import EventSpill, EventStream
+from search_index import search_index, SOURCE_AGENT
+
+# Event streams keep at most this many events each; with a spill database,
+# older events move there instead of being dropped
+AGENT_EVENT_CAPACITY = int(os.getenv("AGENT_EVENT_CAPACITY", "1000"))
+AGENT_EVENT_SPILL_DB = os.getenv("AGENT_EVENT_SPILL_DB", "")  # e.g. ./agent_events.db
+AGENT_EVENT_SPILL_MAX = int(os.getenv("AGENT_EVENT_SPILL_MAX", "100000"))  # per stream, 0 for no limit
+event_spill = EventSpill(AGENT_EVENT_SPILL_DB, max_rows=AGENT_EVENT_SPILL_MAX) if AGENT_EVENT_SPILL_DB else None
+
+# Finished tasks beyond this many are dropped, oldest first, releasing their files
+AGENT_TASK_CAPACITY = int(os.getenv("AGENT_TASK_CAPACITY", "500"))
+
 # Global state for agent management
 active_agents: Dict[str, Dict[str, Any]] = {}
 agent_progress: Dict[str, Dict[str, Any]] = {}
-agent_messages: List[Dict[str, Any]] = []
+agent_messages = EventStream("agent_messages", AGENT_EVENT_CAPACITY, event_spill)
 agent_files: Dict[str, List[Dict[str, Any]]] = {}
 
-# Message consolidation tracking
+# Message consolidation tracking: the open consolidated message of each agent,
+# and finished ones in the order they were closed
 consolidated_messages: Dict[str, Dict[str, Any]] = {}
+finished_consolidations: Deque[Dict[str, Any]] = deque(maxlen=AGENT_EVENT_CAPACITY)
 
 # Agent collaboration and communication
-agent_conversations: List[Dict[str, Any]] = []
+agent_conversations = EventStream("agent_conversations", AGENT_EVENT_CAPACITY, event_spill)
 agent_dependencies: Dict[str, List[str]] = {}
 
 # Performance monitoring and analytics
 agent_analytics: Dict[str, Dict[str, Any]] = {}
-task_history: List[Dict[str, Any]] = []
+task_history = EventStream("task_history", AGENT_EVENT_CAPACITY, event_spill)
 
 # Advanced task management
 task_workflows: Dict[str, Dict[str, Any]] = {}
@@ -93,6 +112,9 @@ class MetaGPTIntegration:
         self.task_counter = 0
         self.agent_files: Dict[str, List[Dict[str, Any]]] = {}
         self.workflows: Dict[str, CollaborativeWorkflow] = {}
+        # Bumped by every agent message; get_recent_messages reuses its last result until it changes
+        self.message_version = 0
+        self.recent_messages_cache: Optional[Tuple[int, int, List[Dict[str, Any]]]] = None
 
     def _initialize_agents(self) -> Dict[str, MetaGPTAgent]:
         """Initialize available agents with consolidated collaborative capabilities"""
@@ -279,79 +301,71 @@ class MetaGPTIntegration:
         return agent_progress.get(agent_role, {})
 
     def get_recent_messages(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get recent agent messages with consolidation"""
-        # Get all messages
-        all_messages = agent_messages[-limit:]
-        
-        # Apply consolidation logic
-        consolidated = self._consolidate_messages(all_messages)
-        
-        return consolidated
+        """Get the latest consolidated agent messages: finished ones in the order they closed, then open ones"""
+        cached = self.recent_messages_cache
+        if cached is not None and cached[0] == self.message_version and cached[1] == limit:
+            messages = cached[2]
+        else:
+            bounded = max(limit, 0)
+            open_messages = list(consolidated_messages.values())[-bounded:] if bounded else []
+            finished = list(islice(reversed(finished_consolidations), bounded - len(open_messages)))
+            finished.reverse()
+            messages = finished + open_messages
+            self.recent_messages_cache = (self.message_version, limit, messages)
+        # Open messages are updated in place, so callers get copies rather than the live dicts
+        return [self._copy_message(message) for message in messages]
+
+    @staticmethod
+    def _copy_message(message: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a consolidated message, including its list of steps"""
+        copied = dict(message)
+        if 'consolidated_steps' in copied:
+            copied['consolidated_steps'] = list(copied['consolidated_steps'])
+        return copied
+
+    def get_message_version(self) -> int:
+        """Get a counter that changes whenever the consolidated messages do"""
+        return self.message_version
+
+    def _consolidate_message(self, message: Dict[str, Any]):
+        """Fold one new agent message into the consolidated view, updating the agent's open message in place"""
+        agent_role = message.get('agent_role')
+        message_type = message.get('message_type', 'progress')
+        current = consolidated_messages.get(agent_role)
+
+        # A start message always opens a new consolidated message, closing any open one
+        if message_type == 'start' or (message_type == 'progress' and current is None):
+            if current is not None:
+                finished_consolidations.append(current)
+            consolidated_messages[agent_role] = {
+                **message,
+                'consolidated_steps': [message['message']],
+                'step_count': 1,
+                'last_update': message['timestamp']
+            }
 
-    def _consolidate_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Consolidate related agent messages into single updates"""
-        consolidated = []
-        current_agent_messages = {}
-        
-        for message in messages:
-            agent_role = message.get('agent_role')
-            message_type = message.get('message_type', 'progress')
-            
-            # For start messages, create a new consolidated entry
-            if message_type == 'start':
-                if agent_role in current_agent_messages:
-                    # Add the previous consolidated message
-                    consolidated.append(current_agent_messages[agent_role])
-                
-                # Create new consolidated message
-                current_agent_messages[agent_role] = {
-                    **message,
-                    'consolidated_steps': [message['message']],
-                    'step_count': 1,
-                    'last_update': message['timestamp']
-                }
-            
-            # For progress messages, add to existing consolidated message
-            elif message_type == 'progress':
-                if agent_role in current_agent_messages:
-                    # Add to existing consolidated message
-                    current_agent_messages[agent_role]['consolidated_steps'].append(message['message'])
-                    current_agent_messages[agent_role]['step_count'] += 1
-                    current_agent_messages[agent_role]['last_update'] = message['timestamp']
-                    current_agent_messages[agent_role]['message'] = f"Working on: {message['message']}"
-                else:
-                    # Create new consolidated message for progress
-                    current_agent_messages[agent_role] = {
-                        **message,
-                        'consolidated_steps': [message['message']],
-                        'step_count': 1,
-                        'last_update': message['timestamp']
-                    }
-            
-            # For complete messages, finalize the consolidated message
-            elif message_type == 'complete':
-                if agent_role in current_agent_messages:
-                    # Add completion to existing consolidated message
-                    current_agent_messages[agent_role]['consolidated_steps'].append(message['message'])
-                    current_agent_messages[agent_role]['step_count'] += 1
-                    current_agent_messages[agent_role]['last_update'] = message['timestamp']
-                    current_agent_messages[agent_role]['message'] = f"Completed: {message['message']}"
-                    current_agent_messages[agent_role]['message_type'] = 'complete'
-                    
-                    # Add to consolidated list
-                    consolidated.append(current_agent_messages[agent_role])
-                    del current_agent_messages[agent_role]
-                else:
-                    # Standalone completion message
-                    consolidated.append(message)
-        
-        # Add any remaining active consolidated messages
-        for agent_role, consolidated_msg in current_agent_messages.items():
-            consolidated.append(consolidated_msg)
-        
-        return consolidated
+        elif message_type == 'progress':
+            current['consolidated_steps'].append(message['message'])
+            current['step_count'] += 1
+            current['last_update'] = message['timestamp']
+            current['message'] = f"Working on: {message['message']}"
+
+        elif message_type == 'complete':
+            if current is None:
+                # Standalone completion message
+                finished_consolidations.append(message)
+            else:
+                current['consolidated_steps'].append(message['message'])
+                current['step_count'] += 1
+                current['last_update'] = message['timestamp']
+                current['message'] = f"Completed: {message['message']}"
+                current['message_type'] = 'complete'
+                finished_consolidations.append(consolidated_messages.pop(agent_role))
 
-    def add_agent_message(self, agent_role: str, message: str, message_type: str = "progress"):
+        self.message_version += 1
+
+    def add_agent_message(self, agent_role: str, message: str, message_type: str = "progress",
+                          task_id: Optional[str] = None, workflow_id: Optional[str] = None):
         """Add a message from an agent with consolidation support"""
         agent = self.get_agent_by_role(agent_role)
         if agent:
@@ -363,9 +377,12 @@ class MetaGPTIntegration:
                 "agent_avatar": self._get_agent_avatar(agent_role),
                 "message": message,
                 "message_type": message_type,
+                "task_id": task_id,
+                "workflow_id": workflow_id,
                 "is_agent": True
             }
             agent_messages.append(msg)
+            self._consolidate_message(msg)
             return msg
         return None
 
@@ -490,6 +507,7 @@ class MetaGPTIntegration:
             workflow_id=workflow_id
         )
         self.tasks[task_id] = task
+        self._prune_tasks()
         
         # Get agent
         agent = self.get_agent_by_role(agent_role)
@@ -527,24 +545,27 @@ class MetaGPTIntegration:
             # Update task status
             task.status = "completed" if result["success"] else "failed"
             task.result = result.get("message", "")
+            task.files_generated = self._store_file_contents(task_id, result.get("files_generated", []))
             
             # Track performance
             end_time = datetime.now().isoformat()
-            self.track_agent_performance(agent_role, task_description, start_time, end_time, result["success"])
+            self.track_agent_performance(agent_role, task_description, start_time, end_time, result["success"],
+                                         task_id=task_id, workflow_id=workflow_id)
             
             return {
                 "success": result["success"],
                 "message": result["message"],
                 "task_id": task_id,
                 "agent_name": agent.name,
-                "files_generated": result.get("files_generated", []),
+                "files_generated": task.files_generated,
                 "deliverables": result.get("deliverables", [])
             }
             
         except Exception as e:
             task.status = "failed"
             task.result = str(e)
-            self.track_agent_performance(agent_role, task_description, start_time, None, False)
+            self.track_agent_performance(agent_role, task_description, start_time, None, False,
+                                         task_id=task_id, workflow_id=workflow_id)
             return {
                 "success": False,
                 "error": str(e),
@@ -582,7 +603,7 @@ class MetaGPTIntegration:
                     agent_progress[agent_role]["steps_remaining"].remove(step)
             
             # Add progress message
-            self.add_agent_message(agent_role, f"Working on: {step}", "progress")
+            self.add_agent_message(agent_role, f"Working on: {step}", "progress", task_id, task.workflow_id)
             
             # Simulate work time
             await asyncio.sleep(2)  # 2 seconds per step for demo
@@ -610,15 +631,15 @@ class MetaGPTIntegration:
             task.result = mock_responses.get(agent_role, f"Task completed: {task.description}")
 
             # Generate actual files based on agent role
-            print(f"DEBUG: About to call _generate_agent_files for agent {agent_role}, task: {task.description}, task_id: {task_id}")
-            self._generate_agent_files(agent_role, task.description, task_id)
+            print(f"DEBUG: About to call _store_agent_files for agent {agent_role}, task: {task.description}, task_id: {task_id}")
+            await self._store_agent_files(agent_role, task.description, task_id)
 
             # Remove from active agents
             if agent_role in active_agents:
                 del active_agents[agent_role]
 
             # Add completion message
-            self.add_agent_message(agent_role, f"Completed: {task.description}", "complete")
+            self.add_agent_message(agent_role, f"Completed: {task.description}", "complete", task_id, task.workflow_id)
 
     def get_all_tasks(self) -> List[MetaGPTTask]:
         """Get all tasks"""
@@ -640,57 +661,65 @@ class MetaGPTIntegration:
             return True
         return False
 
-    def _generate_agent_files(self, agent_role: str, task_description: str, task_id: str):
-        """
-        Generates mock files based on the agent's capabilities and the task description.
-        This is a placeholder for actual file generation logic.
-        """
+    async def _store_agent_files(self, agent_role: str, task_description: str, task_id: str):
+        """Generate an agent's files, writing their content to the artifact store off the event loop"""
         print(f"DEBUG: Generating files for agent {agent_role}, task: {task_description}, task_id: {task_id}")
-        
+        files = self._agent_file_contents(agent_role, task_description)
+        digests = await asyncio.to_thread(artifact_store.put_many, [content for _, content in files])
+        released: List[str] = []
+        for (filename, content), digest in zip(files, digests):
+            self._create_mock_file(task_id, filename, content, content_hash=digest, released=released)
+        if released:
+            await asyncio.to_thread(artifact_store.release_many, released)
+        print(f"DEBUG: Generated {len(self.agent_files.get(task_id, []))} files for task {task_id}")
+
+    def _agent_file_contents(self, agent_role: str, task_description: str) -> List[Tuple[str, str]]:
+        """Get the (filename, content) pairs an agent produces for a task"""
+        files: List[Tuple[str, str]] = []
         if agent_role == "product_manager":
-            self._create_mock_file(task_id, "product_requirements.md", f"Product Requirements for: {task_description}\n\n- User stories:\n  - {task_description} user story 1\n  - {task_description} user story 2\n- Acceptance criteria:\n  - Criteria 1\n  - Criteria 2\n- Feature prioritization: High, Medium, Low\n- Product roadmap: [Link to roadmap]")
-            self._create_mock_file(task_id, "competitive_analysis.md", f"Competitive Analysis for: {task_description}\n\n- Market overview\n- Key competitors\n- Differentiators\n- Market trends")
+            files.append(("product_requirements.md", f"Product Requirements for: {task_description}\n\n- User stories:\n  - {task_description} user story 1\n  - {task_description} user story 2\n- Acceptance criteria:\n  - Criteria 1\n  - Criteria 2\n- Feature prioritization: High, Medium, Low\n- Product roadmap: [Link to roadmap]"))
+            files.append(("competitive_analysis.md", f"Competitive Analysis for: {task_description}\n\n- Market overview\n- Key competitors\n- Differentiators\n- Market trends"))
 
         elif agent_role == "architect":
-            self._create_mock_file(task_id, "system_architecture.md", f"System Architecture for: {task_description}\n\n- High-level overview\n- API design\n- Database schema\n- Technology stack: [Tech stack details]")
-            self._create_mock_file(task_id, "api_specs.json", json.dumps({"api_name": "User Management", "version": "v1", "endpoints": [{"path": "/users", "method": "GET", "description": "Get all users"}, {"path": "/users/{id}", "method": "GET", "description": "Get user by ID"}]}))
+            files.append(("system_architecture.md", f"System Architecture for: {task_description}\n\n- High-level overview\n- API design\n- Database schema\n- Technology stack: [Tech stack details]"))
+            files.append(("api_specs.json", json.dumps({"api_name": "User Management", "version": "v1", "endpoints": [{"path": "/users", "method": "GET", "description": "Get all users"}, {"path": "/users/{id}", "method": "GET", "description": "Get user by ID"}]})))
 
         elif agent_role == "engineer":
-            self._create_mock_file(task_id, "code_implementation.py", f"# {task_description}\n\n```python\n# Core functionality\n# Testing\n# Code review\n```")
-            self._create_mock_file(task_id, "unit_tests.py", f"# {task_description} Unit Tests\n\n```python\n# Test cases\n# Test coverage\n```")
+            files.append(("code_implementation.py", f"# {task_description}\n\n```python\n# Core functionality\n# Testing\n# Code review\n```"))
+            files.append(("unit_tests.py", f"# {task_description} Unit Tests\n\n```python\n# Test cases\n# Test coverage\n```"))
 
         elif agent_role == "project_manager":
-            self._create_mock_file(task_id, "project_timeline.md", f"Project Timeline for: {task_description}\n\n- Phase 1: [Start Date] - [End Date]\n  - Milestone 1: [Task 1]\n  - Milestone 2: [Task 2]\n- Phase 2: [Start Date] - [End Date]\n  - Milestone 1: [Task 1]\n  - Milestone 2: [Task 2]")
-            self._create_mock_file(task_id, "resource_allocation.md", f"Resource Allocation for: {task_description}\n\n- Team members\n- Tools and technologies\n- Budget")
+            files.append(("project_timeline.md", f"Project Timeline for: {task_description}\n\n- Phase 1: [Start Date] - [End Date]\n  - Milestone 1: [Task 1]\n  - Milestone 2: [Task 2]\n- Phase 2: [Start Date] - [End Date]\n  - Milestone 1: [Task 1]\n  - Milestone 2: [Task 2]"))
+            files.append(("resource_allocation.md", f"Resource Allocation for: {task_description}\n\n- Team members\n- Tools and technologies\n- Budget"))
 
         elif agent_role == "ui_designer":
-            self._create_mock_file(task_id, "wireframes.png", "Wireframe for: " + task_description)
-            self._create_mock_file(task_id, "user_flow.png", "User flow for: " + task_description)
-            self._create_mock_file(task_id, "design_system.md", f"Design System for: {task_description}\n\n- Color palette\n- Typography\n- Components\n- Interactive elements")
+            files.append(("wireframes.png", "Wireframe for: " + task_description))
+            files.append(("user_flow.png", "User flow for: " + task_description))
+            files.append(("design_system.md", f"Design System for: {task_description}\n\n- Color palette\n- Typography\n- Components\n- Interactive elements"))
 
         elif agent_role == "data_scientist":
-            self._create_mock_file(task_id, "data_exploration.ipynb", f"# Data Exploration for: {task_description}\n\n```python\n# Data loading\n# Data cleaning\n# EDA\n```")
-            self._create_mock_file(task_id, "ml_models.py", f"# {task_description} ML Models\n\n```python\n# Model training\n# Model evaluation\n```")
+            files.append(("data_exploration.ipynb", f"# Data Exploration for: {task_description}\n\n```python\n# Data loading\n# Data cleaning\n# EDA\n```"))
+            files.append(("ml_models.py", f"# {task_description} ML Models\n\n```python\n# Model training\n# Model evaluation\n```"))
 
         elif agent_role == "devops_engineer":
-            self._create_mock_file(task_id, "infrastructure.tf", f"# Infrastructure for: {task_description}\n\n```terraform\n# Terraform code\n# Infrastructure as code\n```")
-            self._create_mock_file(task_id, "monitoring.yml", f"# Monitoring for: {task_description}\n\n```yaml\n# Alerting\n# Logging\n```")
+            files.append(("infrastructure.tf", f"# Infrastructure for: {task_description}\n\n```terraform\n# Terraform code\n# Infrastructure as code\n```"))
+            files.append(("monitoring.yml", f"# Monitoring for: {task_description}\n\n```yaml\n# Alerting\n# Logging\n```"))
 
         elif agent_role == "security_expert":
-            self._create_mock_file(task_id, "security_audit.pdf", f"Security Audit Report for: {task_description}")
-            self._create_mock_file(task_id, "vulnerability_report.json", json.dumps({"task": task_description, "vulnerabilities": [{"name": "SQL Injection", "severity": "High", "description": "Potential vulnerability in user input handling"}, {"name": "XSS", "severity": "Medium", "description": "Cross-site scripting vulnerability"}]}))
+            files.append(("security_audit.pdf", f"Security Audit Report for: {task_description}"))
+            files.append(("vulnerability_report.json", json.dumps({"task": task_description, "vulnerabilities": [{"name": "SQL Injection", "severity": "High", "description": "Potential vulnerability in user input handling"}, {"name": "XSS", "severity": "Medium", "description": "Cross-site scripting vulnerability"}]})))
 
         elif agent_role == "qa_engineer":
-            self._create_mock_file(task_id, "test_plans.md", f"# Test Plans for: {task_description}\n\n```markdown\n# Test cases\n# Test coverage\n```")
-            self._create_mock_file(task_id, "automated_tests.py", f"# {task_description} Automated Tests\n\n```python\n# Test automation\n# Performance testing\n```")
+            files.append(("test_plans.md", f"# Test Plans for: {task_description}\n\n```markdown\n# Test cases\n# Test coverage\n```"))
+            files.append(("automated_tests.py", f"# {task_description} Automated Tests\n\n```python\n# Test automation\n# Performance testing\n```"))
 
         elif agent_role == "technical_writer":
-            self._create_mock_file(task_id, "technical_docs.md", f"# Technical Documentation for: {task_description}\n\n```markdown\n# API Documentation\n# User Guides\n```")
-            self._create_mock_file(task_id, "knowledge_base.md", f"# Knowledge Base for: {task_description}\n\n```markdown\n# API Endpoints\n# Troubleshooting\n```")
-        
-        print(f"DEBUG: Generated {len(self.agent_files.get(task_id, []))} files for task {task_id}")
+            files.append(("technical_docs.md", f"# Technical Documentation for: {task_description}\n\n```markdown\n# API Documentation\n# User Guides\n```"))
+            files.append(("knowledge_base.md", f"# Knowledge Base for: {task_description}\n\n```markdown\n# API Endpoints\n# Troubleshooting\n```"))
+        return files
 
-    def _create_mock_file(self, task_id: str, filename: str, content: str):
+    def _create_mock_file(self, task_id: str, filename: str, content: str,
+                          content_hash: Optional[str] = None, released: Optional[List[str]] = None):
         """
         Creates a mock file in the file manager.
         This is a placeholder for actual file storage.
@@ -703,22 +732,17 @@ class MetaGPTIntegration:
         print(f"Content:\n{content}")
         
         # Store file info in global state for retrieval
-        if task_id not in self.agent_files:
-            self.agent_files[task_id] = []
-            
-        file_info = {
+        file_info = self._add_task_file(task_id, {
             'id': str(uuid.uuid4()),
             'name': filename,
-            'content': content,
             'type': self._get_file_type(filename),
             'icon': self._get_file_icon(filename),
             'path': f'/agent-outputs/{task_id}/',
             'isGenerated': True,
-            'created_at': datetime.now().isoformat(),
-            'task_id': task_id
-        }
+            'created_at': datetime.now().isoformat()
+        }, content, content_hash, released)
         
-        self.agent_files[task_id].append(file_info)
+        search_index.queue_document(SOURCE_AGENT, f"{task_id}/{filename}", filename, content, task_id=task_id)
         print(f"DEBUG: File stored: {file_info['name']} for task {task_id}")
         print(f"DEBUG: agent_files now has {len(self.agent_files)} task entries")
         print(f"DEBUG: task {task_id} now has {len(self.agent_files[task_id])} files")
@@ -760,8 +784,85 @@ class MetaGPTIntegration:
         }
         return icons.get(file_type, '📄')
 
-    def get_agent_files(self, task_id: str = None) -> List[Dict[str, Any]]:
-        """Get files generated by agents"""
+    def _add_task_file(self, task_id: str, file_info: Dict[str, Any], content: str,
+                       content_hash: Optional[str] = None, released: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Store a task's file content and register the file, replacing (and releasing) one with the same name and path.
+
+        Callers that already put the content pass its content_hash; with released
+        given, the replaced file's hash is appended there for the caller to release.
+        """
+        file_info = {
+            **file_info,
+            # Content lives in the artifact store; get_agent_file_content reads it back
+            'content_hash': content_hash or artifact_store.put(content),
+            'size': len(content.encode('utf-8')),
+            'created_at': file_info.get('created_at') or datetime.now().isoformat(),
+            'task_id': task_id
+        }
+        files = self.agent_files.setdefault(task_id, [])
+        for index, existing in enumerate(files):
+            if existing['name'] == file_info['name'] and existing.get('path') == file_info.get('path'):
+                # Taken after the new reference, so unchanged content is never deleted in between
+                if released is not None:
+                    released.append(existing['content_hash'])
+                else:
+                    artifact_store.release(existing['content_hash'])
+                files[index] = file_info
+                break
+        else:
+            files.append(file_info)
+        return file_info
+
+    def _store_file_contents(self, task_id: str, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Move generated file contents into the artifact store as the task's files, leaving their hashes behind"""
+        stored = []
+        for file_info in files:
+            file_info = dict(file_info)
+            content = file_info.pop("content", None)
+            if content is not None:
+                file_info = self._add_task_file(task_id, file_info, content)
+            stored.append(file_info)
+        return stored
+
+    def get_agent_file_content(self, file_info: Dict[str, Any]) -> Optional[str]:
+        """Read a generated file's content from the artifact store"""
+        if "content_hash" not in file_info:
+            return file_info.get("content")
+        return artifact_store.get_text(file_info["content_hash"])
+
+    def content_references(self) -> Dict[str, int]:
+        """Count the artifact store references held by every task's files"""
+        references: Dict[str, int] = {}
+        for files in self.agent_files.values():
+            for file_info in files:
+                references[file_info["content_hash"]] = references.get(file_info["content_hash"], 0) + 1
+        return references
+
+    def release_task_files(self, task_id: str) -> int:
+        """Forget a task's generated files and release their content; returns how many were dropped"""
+        files = self.agent_files.pop(task_id, [])
+        for file_info in files:
+            artifact_store.release(file_info["content_hash"])
+            search_index.queue_removal(SOURCE_AGENT, f"{task_id}/{file_info['name']}")
+        return len(files)
+
+    def remove_task(self, task_id: str) -> bool:
+        """Drop a task record together with its generated files"""
+        task = self.tasks.pop(task_id, None)
+        self.release_task_files(task_id)
+        return task is not None
+
+    def _prune_tasks(self):
+        """Drop the oldest finished tasks beyond AGENT_TASK_CAPACITY"""
+        excess = len(self.tasks) - AGENT_TASK_CAPACITY
+        if excess <= 0:
+            return
+        finished = [task_id for task_id, task in self.tasks.items() if task.status not in ("pending", "running")]
+        for task_id in finished[:excess]:
+            self.remove_task(task_id)
+
+    def get_agent_files(self, task_id: str = None, include_content: bool = False) -> List[Dict[str, Any]]:
+        """Get files generated by agents, reading their content only if include_content is set"""
         print(f"DEBUG: get_agent_files called with task_id={task_id}")
         print(f"DEBUG: self.agent_files has {len(self.agent_files)} task entries")
         print(f"DEBUG: self.agent_files keys: {list(self.agent_files.keys())}")
@@ -772,14 +873,16 @@ class MetaGPTIntegration:
         if task_id:
             files = self.agent_files.get(task_id, [])
             print(f"DEBUG: Returning {len(files)} files for task {task_id}")
-            return files
         else:
             # Return all files from all tasks
-            all_files = []
+            files = []
             for task_files in self.agent_files.values():
-                all_files.extend(task_files)
-            print(f"DEBUG: Returning {len(all_files)} total files")
-            return all_files
+                files.extend(task_files)
+            print(f"DEBUG: Returning {len(files)} total files")
+
+        if include_content:
+            return [{**file_info, 'content': self.get_agent_file_content(file_info)} for file_info in files]
+        return files
 
     def test_file_generation(self):
         """Test method to manually create files and verify retrieval"""
@@ -816,7 +919,7 @@ class MetaGPTIntegration:
 
     def get_agent_conversations(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Get recent agent conversations"""
-        return agent_conversations[-limit:] if agent_conversations else []
+        return agent_conversations.recent(limit)
 
     def set_agent_dependency(self, agent_role: str, depends_on: List[str]):
         """Set task dependencies for an agent"""
@@ -1100,7 +1203,8 @@ class MetaGPTIntegration:
         
         return profiles.get(agent_role, None)
 
-    def track_agent_performance(self, agent_role: str, task_description: str, start_time: str, end_time: str = None, success: bool = True, steps_completed: int = 0):
+    def track_agent_performance(self, agent_role: str, task_description: str, start_time: str, end_time: str = None, success: bool = True, steps_completed: int = 0,
+                                task_id: Optional[str] = None, workflow_id: Optional[str] = None):
         """Track agent performance for analytics"""
         if agent_role not in agent_analytics:
             agent_analytics[agent_role] = {
@@ -1109,8 +1213,7 @@ class MetaGPTIntegration:
                 "failed_tasks": 0,
                 "total_time": 0,
                 "avg_completion_time": 0,
-                "total_steps": 0,
-                "task_history": []
+                "total_steps": 0
             }
         
         # Calculate task duration
@@ -1140,6 +1243,8 @@ class MetaGPTIntegration:
         task_record = {
             "id": str(uuid.uuid4()),
             "agent_role": agent_role,
+            "task_id": task_id,
+            "workflow_id": workflow_id,
             "task_description": task_description,
             "start_time": start_time,
             "end_time": end_time,
@@ -1149,17 +1254,21 @@ class MetaGPTIntegration:
             "timestamp": datetime.now().isoformat()
         }
         
-        analytics["task_history"].append(task_record)
         task_history.append(task_record)
 
-    def get_agent_analytics(self, agent_role: str = None) -> Dict[str, Any]:
-        """Get analytics for specific agent or all agents"""
+    def get_agent_analytics(self, agent_role: str = None, history_limit: int = 50) -> Dict[str, Any]:
+        """Get analytics for specific agent or all agents, with each agent's latest history_limit tasks"""
         if agent_role:
-            return agent_analytics.get(agent_role, {})
+            if agent_role not in agent_analytics:
+                return {}
+            return {**agent_analytics[agent_role], "task_history": task_history.recent(history_limit, agent_role=agent_role)}
         
         # Return analytics for all agents
         return {
-            "agents": agent_analytics,
+            "agents": {
+                role: {**analytics, "task_history": task_history.recent(history_limit, agent_role=role)}
+                for role, analytics in agent_analytics.items()
+            },
             "overall_stats": self._calculate_overall_stats(),
             "recent_activity": self._get_recent_activity()
         }
@@ -1180,14 +1289,23 @@ class MetaGPTIntegration:
         }
 
     def _get_recent_activity(self, limit: int = 20) -> List[Dict[str, Any]]:
-        """Get recent task activity"""
-        recent_tasks = []
-        for agent_role, analytics in agent_analytics.items():
-            recent_tasks.extend(analytics.get("task_history", [])[-limit:])
-        
-        # Sort by timestamp and return most recent
-        recent_tasks.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        return recent_tasks[:limit]
+        """Get recent task activity, most recent first"""
+        return list(reversed(task_history.recent(limit)))
+
+    def get_task_history(self, agent_role: str = None, task_id: str = None, workflow_id: str = None,
+                         limit: int = 50) -> List[Dict[str, Any]]:
+        """Get the latest task records matching the given agent, task and workflow, oldest first"""
+        records = task_history.recent(limit, agent_role=agent_role, task_id=task_id, workflow_id=workflow_id)
+        if len(records) < limit:
+            # Fill up from events that were spilled out of memory, if any
+            records = task_history.history(
+                limit - len(records), agent_role=agent_role, task_id=task_id, workflow_id=workflow_id
+            ) + records
+        return records
+
+    def get_event_stats(self) -> Dict[str, Any]:
+        """Get size and eviction counters for the agent event streams"""
+        return {stream.name: stream.get_stats() for stream in (agent_messages, agent_conversations, task_history)}
 
     def get_performance_insights(self) -> Dict[str, Any]:
         """Get performance insights and recommendations"""
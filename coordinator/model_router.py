@@ -0,0 +1,148 @@
+"""
+Adaptive Model Router for Sumeru AI Platform
+
+This module ranks candidate (provider, model) pairs for a task using live
+latency, success rate, remaining quota and price, so traffic shifts toward the
+fastest healthy model without editing the static priority lists.
+"""
+
+import math
+import random
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Deque, Tuple
+
+from provider_stats import LatencyTracker
+from provider_health import HealthMonitor
+
+@dataclass
+class CandidateScore:
+    provider: str
+    model: str
+    score: float
+    latency: float  # component scores, each in [0, 1]
+    success: float
+    quota: float
+    cost: float
+    prior: float
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+
+@dataclass
+class RoutingDecision:
+    task_type: str
+    strategy: str
+    provider: str
+    model: str
+    candidates: List[CandidateScore] = field(default_factory=list)
+    timestamp: str = None
+
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = datetime.now().isoformat()
+
+@dataclass
+class ArmStats:
+    pulls: int = 0
+    reward: float = 0.0
+
+class AdaptiveRouter:
+    def __init__(self, latency_tracker: LatencyTracker, health_monitor: HealthMonitor,
+                 prices: Dict[Tuple[str, str], float], strategy: str = "score",
+                 weights: Optional[Dict[str, float]] = None, latency_reference: float = 5.0,
+                 price_reference: float = 0.002, exploration: float = 0.5, history_size: int = 100):
+        self.latency_tracker = latency_tracker
+        self.health_monitor = health_monitor
+        self.prices = prices  # blended USD per 1K tokens
+        self.strategy = strategy  # static, score, bandit
+        self.weights = weights or {"latency": 0.35, "success": 0.3, "quota": 0.15, "cost": 0.1, "prior": 0.1}
+        self.latency_reference = latency_reference  # seconds at which the latency score is 0.5
+        self.price_reference = price_reference  # price at which the cost score is 0.5
+        self.exploration = exploration  # UCB1 exploration constant for the bandit strategy
+        self.arms: Dict[str, Dict[Tuple[str, str], ArmStats]] = {}
+        self.decisions: Deque[RoutingDecision] = deque(maxlen=history_size)
+
+    def latency_score(self, seconds: float) -> float:
+        return 1 / (1 + seconds / self.latency_reference)
+
+    def score(self, provider: str, model: str, quota_remaining: float, prior: float) -> CandidateScore:
+        """Score one candidate; models without latency samples fall back to their prior"""
+        p50 = self.latency_tracker.percentile(provider, model, 50)
+        p95 = self.latency_tracker.percentile(provider, model, 95)
+        latency = prior if p50 is None else self.latency_score((p50 + p95) / 2)
+        success = self.health_monitor.success_rate(provider, model)
+        cost = 1 / (1 + self.prices.get((provider, model), self.price_reference) / self.price_reference)
+
+        total = (
+            self.weights["latency"] * latency
+            + self.weights["success"] * success
+            + self.weights["quota"] * quota_remaining
+            + self.weights["cost"] * cost
+            + self.weights["prior"] * prior
+        )
+        return CandidateScore(
+            provider=provider, model=model, score=round(total, 4),
+            latency=round(latency, 4), success=round(success, 4), quota=round(quota_remaining, 4),
+            cost=round(cost, 4), prior=round(prior, 4), p50=p50, p95=p95
+        )
+
+    def _bandit_value(self, task_type: str, provider: str, model: str) -> float:
+        arms = self.arms.get(task_type, {})
+        arm = arms.get((provider, model))
+        if arm is None or arm.pulls == 0:
+            return math.inf
+        total_pulls = sum(a.pulls for a in arms.values())
+        return arm.reward / arm.pulls + self.exploration * math.sqrt(math.log(total_pulls) / arm.pulls)
+
+    def rank(self, task_type: str, candidates: List[Tuple[str, str]],
+             quota_remaining: Dict[Tuple[str, str], float]) -> List[Tuple[str, str]]:
+        """Order candidates for a task and record the routing decision.
+
+        Candidates arrive in static priority order, which also sets each one's prior.
+        """
+        if not candidates or self.strategy == "static":
+            return list(candidates)
+
+        scores = [
+            self.score(provider, model, quota_remaining.get((provider, model), 1.0), 1 - index / len(candidates))
+            for index, (provider, model) in enumerate(candidates)
+        ]
+        if self.strategy == "bandit":
+            # Ties between unexplored arms are broken randomly so each gets sampled
+            scores.sort(key=lambda s: (self._bandit_value(task_type, s.provider, s.model), s.score, random.random()), reverse=True)
+        else:
+            scores.sort(key=lambda s: s.score, reverse=True)
+
+        self.decisions.append(RoutingDecision(
+            task_type=task_type,
+            strategy=self.strategy,
+            provider=scores[0].provider,
+            model=scores[0].model,
+            candidates=scores
+        ))
+        return [(s.provider, s.model) for s in scores]
+
+    def record_outcome(self, task_type: str, provider: str, model: str, success: bool, latency: Optional[float] = None):
+        """Feed a call result back into the bandit for the task category"""
+        arm = self.arms.setdefault(task_type, {}).setdefault((provider, model), ArmStats())
+        arm.pulls += 1
+        if success:
+            arm.reward += self.latency_score(latency) if latency is not None else 1.0
+
+    def get_recent_decisions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get the most recent routing decisions with their candidate scores"""
+        return [asdict(decision) for decision in list(self.decisions)[-limit:]][::-1]
+
+    def get_bandit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get pull counts and mean reward per task category and model"""
+        return {
+            task_type: {
+                f"{provider}/{model}": {
+                    "pulls": arm.pulls,
+                    "mean_reward": round(arm.reward / arm.pulls, 4) if arm.pulls else None
+                }
+                for (provider, model), arm in arms.items()
+            }
+            for task_type, arms in self.arms.items()
+        }
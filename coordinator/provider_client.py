@@ -0,0 +1,192 @@
+"""
+Provider Client Layer for Sumeru AI Platform
+
+This module provides a single async client for every LLM provider the coordinator
+talks to. Each provider gets its own connection pool, timeouts and DNS cache so a
+slow provider cannot starve sockets needed by the others.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, AsyncIterator
+from urllib.parse import urlsplit
+
+import aiohttp
+
+class ProviderAPIError(Exception):
+    """Raised when a provider answers with a non-200 status"""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+def build_chat_messages(prompt: str, agent_role: str) -> List[Dict[str, str]]:
+    """Build the system and user messages sent for a prompt"""
+    return [
+        {"role": "system", "content": f"You are {agent_role}. Provide helpful, accurate, and detailed responses."},
+        {"role": "user", "content": prompt}
+    ]
+
+@dataclass
+class ProviderConfig:
+    name: str
+    display_name: str
+    url: str
+    stream_url: str
+    default_model: str
+    api_format: str = "openai"  # openai, gemini
+    api_key: Optional[str] = None
+    placeholder_key: Optional[str] = None
+    connection_limit: int = 20  # max open connections to this provider
+    keepalive_timeout: float = 30.0  # seconds an idle connection stays pooled
+    dns_ttl: int = 300  # seconds a DNS lookup is cached
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    max_tokens: int = 2000
+    temperature: float = 0.7
+
+class ProviderClient:
+    def __init__(self, config: ProviderConfig):
+        self.config = config
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    def is_configured(self) -> bool:
+        """Check whether the provider has usable credentials"""
+        if self.config.placeholder_key is None:
+            return True
+        return bool(self.config.api_key) and self.config.api_key != self.config.placeholder_key
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Create the provider's connection pool if it does not exist yet"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.connection_limit,
+                limit_per_host=self.config.connection_limit,
+                ttl_dns_cache=self.config.dns_ttl,
+                keepalive_timeout=self.config.keepalive_timeout,
+                enable_cleanup_closed=True
+            )
+            timeout = aiohttp.ClientTimeout(
+                connect=self.config.connect_timeout,
+                sock_read=self.config.read_timeout
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.session
+
+    async def warm(self):
+        """Open a pooled connection so the first real request skips DNS and TLS setup"""
+        session = await self.start()
+        parts = urlsplit(self.config.url)
+        try:
+            async with session.head(f"{parts.scheme}://{parts.netloc}/", allow_redirects=False) as response:
+                await response.read()
+        except Exception as e:
+            print(f"Warming {self.config.display_name} connection pool failed: {e}")
+
+    async def close(self):
+        """Close the provider's connection pool"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _build_request(self, prompt: str, agent_role: str, model: str, stream: bool) -> tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Build the URL, headers and JSON body for a chat request"""
+        messages = build_chat_messages(prompt, agent_role)
+        headers = {"Content-Type": "application/json"}
+
+        if self.config.api_format == "gemini":
+            data = {
+                "contents": [{
+                    "parts": [{"text": f"{messages[0]['content']}\n\nUser: {prompt}"}]
+                }],
+                "generationConfig": {
+                    "maxOutputTokens": self.config.max_tokens,
+                    "temperature": self.config.temperature
+                }
+            }
+        else:
+            headers["Authorization"] = f"Bearer {self.config.api_key}"
+            data = {
+                "model": model,
+                "messages": messages,
+                "max_tokens": self.config.max_tokens,
+                "temperature": self.config.temperature
+            }
+            if stream:
+                data["stream"] = True
+
+        url = self.config.stream_url if stream else self.config.url
+        return url, headers, data
+
+    def _parse_completion(self, result: Dict[str, Any]) -> str:
+        """Extract the completion text from a full response body"""
+        if self.config.api_format == "gemini":
+            return result["candidates"][0]["content"]["parts"][0]["text"]
+        return result["choices"][0]["message"]["content"]
+
+    def _parse_deltas(self, chunk: Dict[str, Any]) -> List[str]:
+        """Extract content fragments from one streamed chunk"""
+        if self.config.api_format == "gemini":
+            return [
+                part["text"]
+                for candidate in chunk.get("candidates", [])
+                for part in candidate.get("content", {}).get("parts", [])
+                if part.get("text")
+            ]
+        choices = chunk.get("choices") or []
+        if not choices:
+            return []
+        delta = choices[0].get("delta", {}).get("content")
+        return [delta] if delta else []
+
+    def _check_configured(self):
+        if not self.is_configured():
+            raise Exception(f"{self.config.display_name} API key not configured")
+
+    async def complete(self, prompt: str, agent_role: str = "Assistant", model: Optional[str] = None) -> str:
+        """Request a full completion and return its text"""
+        self._check_configured()
+        session = await self.start()
+        url, headers, data = self._build_request(prompt, agent_role, model or self.config.default_model, stream=False)
+
+        try:
+            async with session.post(url, headers=headers, json=data) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return self._parse_completion(result)
+                else:
+                    error_text = await response.text()
+                    raise ProviderAPIError(f"{self.config.display_name} API error: {response.status} - {error_text}", response.status)
+        except Exception as e:
+            print(f"{self.config.display_name} API call failed: {e}")
+            raise e
+
+    async def stream(self, prompt: str, agent_role: str = "Assistant", model: Optional[str] = None) -> AsyncIterator[str]:
+        """Request a streamed completion and yield content deltas as they arrive"""
+        self._check_configured()
+        session = await self.start()
+        url, headers, data = self._build_request(prompt, agent_role, model or self.config.default_model, stream=True)
+
+        async with session.post(url, headers=headers, json=data) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise ProviderAPIError(f"{self.config.display_name} API error: {response.status} - {error_text}", response.status)
+
+            async for payload in iter_sse_data(response):
+                for delta in self._parse_deltas(json.loads(payload)):
+                    yield delta
+
+async def iter_sse_data(response) -> AsyncIterator[str]:
+    """Yield the data payload of each server-sent event in a streaming response"""
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            break
+        yield payload
@@ -0,0 +1,152 @@
+"""
+Provider Health Monitoring for Sumeru AI Platform
+
+This module tracks the health of every (provider, model) pair and runs a circuit
+breaker over it, so requests skip providers that are down instead of waiting
+for their timeouts.
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Any, Deque, Tuple
+
+@dataclass
+class ModelHealth:
+    provider: str
+    model: str
+    state: str = "closed"  # closed, open, half_open
+    outcomes: Deque[bool] = field(default_factory=deque)  # recent call results, True on success
+    ewma_latency: Optional[float] = None
+    total_calls: int = 0
+    total_failures: int = 0
+    rate_limited: int = 0  # 429 responses
+    server_errors: int = 0  # 5xx responses
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    probe_in_flight: bool = False
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+class HealthMonitor:
+    def __init__(self, window_size: int = 20, min_calls: int = 5, error_rate_threshold: float = 0.5,
+                 consecutive_failure_threshold: int = 3, open_cooldown: float = 30.0, ewma_alpha: float = 0.2):
+        self.window_size = window_size
+        self.min_calls = min_calls  # calls needed in the window before the error rate can trip the breaker
+        self.error_rate_threshold = error_rate_threshold
+        self.consecutive_failure_threshold = consecutive_failure_threshold
+        self.open_cooldown = open_cooldown  # seconds before an open breaker lets a probe through
+        self.ewma_alpha = ewma_alpha
+        self.models: Dict[Tuple[str, str], ModelHealth] = {}
+
+    def _get(self, provider: str, model: str) -> ModelHealth:
+        key = (provider, model)
+        if key not in self.models:
+            self.models[key] = ModelHealth(provider=provider, model=model, outcomes=deque(maxlen=self.window_size))
+        return self.models[key]
+
+    def _cooldown_elapsed(self, health: ModelHealth) -> bool:
+        return time.monotonic() - health.opened_at >= self.open_cooldown
+
+    def is_available(self, provider: str, model: str) -> bool:
+        """Check whether a request to the model would currently be let through"""
+        health = self.models.get((provider, model))
+        if health is None or health.state == "closed":
+            return True
+        if health.state == "open":
+            return self._cooldown_elapsed(health)
+        return not health.probe_in_flight
+
+    def allow_request(self, provider: str, model: str) -> bool:
+        """Admit a request, moving an open breaker to half-open once its cooldown has passed.
+
+        In the half-open state a single probe request is admitted at a time.
+        """
+        health = self._get(provider, model)
+        if health.state == "open":
+            if not self._cooldown_elapsed(health):
+                return False
+            health.state = "half_open"
+        if health.state == "half_open":
+            if health.probe_in_flight:
+                return False
+            health.probe_in_flight = True
+        return True
+
+    def record_success(self, provider: str, model: str, latency: float):
+        """Record a successful call and its latency"""
+        health = self._get(provider, model)
+        health.total_calls += 1
+        health.outcomes.append(True)
+        health.consecutive_failures = 0
+        if health.ewma_latency is None:
+            health.ewma_latency = latency
+        else:
+            health.ewma_latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * health.ewma_latency
+
+        if health.state == "half_open":
+            health.state = "closed"
+            health.opened_at = None
+            health.outcomes.clear()
+        health.probe_in_flight = False
+
+    def record_failure(self, provider: str, model: str, status: Optional[int] = None):
+        """Record a failed call, tripping the breaker if the model looks unhealthy"""
+        health = self._get(provider, model)
+        health.total_calls += 1
+        health.total_failures += 1
+        health.outcomes.append(False)
+        health.consecutive_failures += 1
+        if status == 429:
+            health.rate_limited += 1
+        elif status is not None and status >= 500:
+            health.server_errors += 1
+
+        tripped = (
+            health.state == "half_open"
+            or health.consecutive_failures >= self.consecutive_failure_threshold
+            or (len(health.outcomes) >= self.min_calls and health.error_rate >= self.error_rate_threshold)
+        )
+        if tripped and health.state != "open":
+            health.state = "open"
+            health.opened_at = time.monotonic()
+        health.probe_in_flight = False
+
+    def record_cancelled(self, provider: str, model: str):
+        """Release a half-open probe whose call was cancelled before it finished"""
+        health = self.models.get((provider, model))
+        if health is not None:
+            health.probe_in_flight = False
+
+    def success_rate(self, provider: str, model: str) -> float:
+        """Get the model's success rate over the rolling window"""
+        health = self.models.get((provider, model))
+        return 1.0 if health is None else 1 - health.error_rate
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get breaker state and health metrics for every tracked model"""
+        now = time.monotonic()
+        return {
+            f"{health.provider}/{health.model}": {
+                "provider": health.provider,
+                "model": health.model,
+                "state": health.state,
+                "available": self.is_available(health.provider, health.model),
+                "error_rate": round(health.error_rate, 3),
+                "ewma_latency": health.ewma_latency,
+                "total_calls": health.total_calls,
+                "total_failures": health.total_failures,
+                "rate_limited": health.rate_limited,
+                "server_errors": health.server_errors,
+                "consecutive_failures": health.consecutive_failures,
+                "retry_in": max(0.0, self.open_cooldown - (now - health.opened_at)) if health.state == "open" else 0.0
+            }
+            for health in self.models.values()
+        }
+
+# Global health monitor instance
+health_monitor = HealthMonitor()
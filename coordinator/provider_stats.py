@@ -0,0 +1,49 @@
+"""
+Provider Latency Statistics for Sumeru AI Platform
+
+This module keeps a rolling window of observed response latencies for every
+(provider, model) pair so callers can reason about typical and tail latency.
+"""
+
+import math
+from collections import deque
+from typing import Dict, Optional, Any, Deque, Tuple
+
+class LatencyTracker:
+    def __init__(self, window_size: int = 200):
+        self.window_size = window_size
+        self.samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, provider: str, model: str, seconds: float):
+        """Record the latency of a successful call"""
+        key = (provider, model)
+        if key not in self.samples:
+            self.samples[key] = deque(maxlen=self.window_size)
+        self.samples[key].append(seconds)
+
+    def sample_count(self, provider: str, model: str) -> int:
+        """Get the number of latency samples held for a model"""
+        return len(self.samples.get((provider, model), ()))
+
+    def percentile(self, provider: str, model: str, pct: float) -> Optional[float]:
+        """Get the nearest-rank latency percentile for a model, or None without samples"""
+        samples = self.samples.get((provider, model))
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(1, math.ceil(pct / 100 * len(ordered)))
+        return ordered[min(rank, len(ordered)) - 1]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get p50/p95 latency for every tracked model"""
+        return {
+            f"{provider}/{model}": {
+                "samples": len(samples),
+                "p50": self.percentile(provider, model, 50),
+                "p95": self.percentile(provider, model, 95)
+            }
+            for (provider, model), samples in self.samples.items()
+        }
+
+# Global latency tracker instance
+latency_tracker = LatencyTracker()
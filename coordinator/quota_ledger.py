@@ -0,0 +1,186 @@
+"""
+Quota Ledger for Sumeru AI Platform
+
+This module keeps API usage counters in memory and writes them back to the
+api_usage table in batches, so quota checks and usage increments on the chat
+hot path never touch the database. Daily and monthly windows roll over here.
+"""
+
+import asyncio
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Tuple
+
+from database import AsyncDatabase
+
+DEFAULT_DAILY_LIMIT = 100
+DEFAULT_MONTHLY_LIMIT = 1000
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+@dataclass
+class UsageCounter:
+    provider: str
+    model: str
+    daily_used: int = 0
+    daily_limit: int = DEFAULT_DAILY_LIMIT
+    monthly_used: int = 0
+    monthly_limit: int = DEFAULT_MONTHLY_LIMIT
+    last_used: Optional[str] = None  # UTC, in SQLite CURRENT_TIMESTAMP format
+    day: str = ""
+    month: str = ""
+    dirty: bool = False
+
+class QuotaLedger:
+    def __init__(self, db: AsyncDatabase):
+        self.db = db
+        self.counters: Dict[Tuple[str, str], UsageCounter] = {}
+        self.lock = threading.Lock()
+        self.flushes = 0
+
+    async def load(self):
+        """Load counters from api_usage, resetting windows that ended while the server was down"""
+        rows = await self.db.fetch_all('SELECT * FROM api_usage')
+        now = _utc_now()
+        with self.lock:
+            self.counters.clear()
+            for row in rows:
+                last_used = row['last_used'] or ""
+                counter = UsageCounter(
+                    provider=row['provider'],
+                    model=row['model'],
+                    daily_used=row['daily_used'],
+                    daily_limit=row['daily_limit'],
+                    monthly_used=row['monthly_used'],
+                    monthly_limit=row['monthly_limit'],
+                    last_used=row['last_used'],
+                    day=last_used[:10],
+                    month=last_used[:7]
+                )
+                self._roll(counter, now)
+                self.counters[(counter.provider, counter.model)] = counter
+
+    def _roll(self, counter: UsageCounter, now: datetime):
+        day = now.strftime('%Y-%m-%d')
+        if counter.day != day:
+            month = now.strftime('%Y-%m')
+            if counter.month != month:
+                counter.monthly_used = 0
+                counter.month = month
+            counter.daily_used = 0
+            counter.day = day
+            counter.dirty = True
+
+    def _get(self, provider: str, model: str, now: datetime) -> UsageCounter:
+        key = (provider, model)
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = UsageCounter(provider=provider, model=model)
+            self.counters[key] = counter
+        self._roll(counter, now)
+        return counter
+
+    def increment(self, provider: str, model: str, amount: int = 1):
+        """Count usage for a model; persisted on the next flush"""
+        now = _utc_now()
+        with self.lock:
+            counter = self._get(provider, model, now)
+            counter.daily_used += amount
+            counter.monthly_used += amount
+            counter.last_used = now.strftime('%Y-%m-%d %H:%M:%S')
+            counter.dirty = True
+
+    def has_quota(self, provider: str, model: str) -> bool:
+        """Check whether a model is under both its daily and monthly limits"""
+        with self.lock:
+            counter = self.counters.get((provider, model))
+            if counter is None:
+                return True
+            self._roll(counter, _utc_now())
+            return counter.daily_used < counter.daily_limit and counter.monthly_used < counter.monthly_limit
+
+    def remaining_fraction(self, provider: str, model: str) -> float:
+        """Get the fraction of quota left, the tighter of the daily and monthly windows"""
+        with self.lock:
+            counter = self.counters.get((provider, model))
+            if counter is None:
+                return 1.0
+            self._roll(counter, _utc_now())
+            fractions = [
+                1 - used / limit
+                for used, limit in ((counter.daily_used, counter.daily_limit), (counter.monthly_used, counter.monthly_limit))
+                if limit > 0
+            ]
+            return min(1.0, max(0.0, min(fractions, default=1.0)))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get usage for every model in the /api/credits format"""
+        now = _utc_now()
+        credits: Dict[str, Dict[str, Any]] = {}
+        with self.lock:
+            for counter in self.counters.values():
+                self._roll(counter, now)
+                credits.setdefault(counter.provider, {})[counter.model] = {
+                    "daily": {
+                        "used": counter.daily_used,
+                        "limit": counter.daily_limit,
+                        "percentage": (counter.daily_used / counter.daily_limit * 100) if counter.daily_limit > 0 else 0
+                    },
+                    "monthly": {
+                        "used": counter.monthly_used,
+                        "limit": counter.monthly_limit,
+                        "percentage": (counter.monthly_used / counter.monthly_limit * 100) if counter.monthly_limit > 0 else 0
+                    },
+                    "last_used": counter.last_used
+                }
+        return credits
+
+    async def flush(self) -> int:
+        """Write every changed counter to api_usage in one transaction and return how many were written"""
+        with self.lock:
+            dirty = [counter for counter in self.counters.values() if counter.dirty]
+            rows = [
+                (c.daily_used, c.daily_limit, c.monthly_used, c.monthly_limit, c.last_used, c.provider, c.model)
+                for c in dirty
+            ]
+            for counter in dirty:
+                counter.dirty = False
+        if not rows:
+            return 0
+
+        try:
+            await self.db.run_write(_write_counters, rows)
+        except Exception:
+            # Leave the counters dirty so the next flush retries them
+            with self.lock:
+                for counter in dirty:
+                    counter.dirty = True
+            raise
+        self.flushes += 1
+        return len(rows)
+
+    async def run(self, interval: float):
+        """Flush periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing quota ledger: {e}")
+
+def _write_counters(conn: sqlite3.Connection, rows: List[tuple]):
+    for row in rows:
+        cursor = conn.execute('''
+            UPDATE api_usage
+            SET daily_used = ?, daily_limit = ?, monthly_used = ?, monthly_limit = ?,
+                last_used = COALESCE(?, last_used)
+            WHERE provider = ? AND model = ?
+        ''', row)
+        if cursor.rowcount == 0:
+            conn.execute('''
+                INSERT INTO api_usage (daily_used, daily_limit, monthly_used, monthly_limit, last_used, provider, model)
+                VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)
+            ''', row)
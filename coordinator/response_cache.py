@@ -0,0 +1,197 @@
+"""
+Completion Cache for Sumeru AI Platform
+
+This module caches LLM completions by a normalized hash of the request, so
+identical prompts are answered without calling a paid provider again. Entries
+live in an in-memory LRU tier and, optionally, in an SQLite tier that survives
+restarts. The SQLite tier is only touched from worker threads, so lookups and
+writes never block the event loop, and a lookup over several candidate keys
+reads them in one query.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different prompts share a cache entry"""
+    return " ".join(text.split())
+
+class CompletionCache:
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 50 * 1024 * 1024, default_ttl: float = 3600.0,
+                 db_path: Optional[str] = None, max_db_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        self.entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (value, expires_at)
+        self.size_bytes = 0
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "sets": 0, "evictions": 0, "expirations": 0}
+        self.db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS completion_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self.db.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        """Hash a completion request into a cache key"""
+        normalized = {
+            "provider": provider,
+            "model": model,
+            "messages": [{"role": m["role"], "content": normalize_text(m["content"])} for m in messages],
+            "temperature": round(float(temperature), 4),
+            "max_tokens": int(max_tokens)
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _evict(self):
+        while self.entries and (len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes):
+            _, (value, _) = self.entries.popitem(last=False)
+            self.size_bytes -= len(value.encode("utf-8"))
+            self.stats["evictions"] += 1
+
+    def _store_memory(self, key: str, value: str, expires_at: float):
+        if key in self.entries:
+            self.size_bytes -= len(self.entries.pop(key)[0].encode("utf-8"))
+        self.entries[key] = (value, expires_at)
+        self.size_bytes += len(value.encode("utf-8"))
+        self._evict()
+
+    def _lookup_memory(self, key: str, now: float) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at > now:
+            self.entries.move_to_end(key)
+            return value
+        self.entries.pop(key)
+        self.size_bytes -= len(value.encode("utf-8"))
+        self.stats["expirations"] += 1
+        return None
+
+    def _load_many(self, keys: List[str], now: float) -> Dict[str, Tuple[str, float]]:
+        with self.db_lock:
+            if self.db is None:
+                return {}
+            rows = self.db.execute(
+                f"SELECT key, value, expires_at FROM completion_cache WHERE key IN ({', '.join('?' * len(keys))}) AND expires_at > ?",
+                (*keys, now)
+            ).fetchall()
+        return {key: (value, expires_at) for key, value, expires_at in rows}
+
+    def _write(self, key: str, value: str, expires_at: float, now: float, prune: bool):
+        with self.db_lock:
+            if self.db is None:
+                return
+            self.db.execute(
+                "INSERT OR REPLACE INTO completion_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now)
+            )
+            if prune:
+                self._prune_db(now)
+            self.db.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached completion, or None if it is missing or expired"""
+        found = await self.get_first([key])
+        return found[1] if found is not None else None
+
+    async def get_first(self, keys: List[str]) -> Optional[Tuple[int, str]]:
+        """Get the index and value of the first key with a live entry, counted as one lookup"""
+        now = time.time()
+        memory_index, memory_value = len(keys), None
+        with self.lock:
+            for index, key in enumerate(keys):
+                memory_value = self._lookup_memory(key, now)
+                if memory_value is not None:
+                    memory_index = index
+                    break
+
+        # Only keys ahead of the first memory hit can change the answer
+        if self.db is not None and memory_index > 0:
+            rows = await asyncio.to_thread(self._load_many, keys[:memory_index], now)
+            for index, key in enumerate(keys[:memory_index]):
+                if key in rows:
+                    value, expires_at = rows[key]
+                    with self.lock:
+                        self._store_memory(key, value, expires_at)
+                        self.stats["disk_hits"] += 1
+                        self.stats["hits"] += 1
+                    return index, value
+
+        with self.lock:
+            if memory_value is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return memory_index, memory_value
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Cache a completion for ttl seconds"""
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        with self.lock:
+            self._store_memory(key, value, expires_at)
+            self.stats["sets"] += 1
+            prune = self.stats["sets"] % 100 == 0
+
+        if self.db is not None:
+            await asyncio.to_thread(self._write, key, value, expires_at, now, prune)
+
+    def _prune_db(self, now: float):
+        self.db.execute("DELETE FROM completion_cache WHERE expires_at <= ?", (now,))
+        self.db.execute('''
+            DELETE FROM completion_cache WHERE key NOT IN (
+                SELECT key FROM completion_cache ORDER BY created_at DESC LIMIT ?
+            )
+        ''', (self.max_db_entries,))
+
+    def _clear_db(self):
+        with self.db_lock:
+            if self.db is not None:
+                self.db.execute("DELETE FROM completion_cache")
+                self.db.commit()
+
+    async def clear(self):
+        """Drop every cached completion from both tiers"""
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+        if self.db is not None:
+            await asyncio.to_thread(self._clear_db)
+
+    def close(self):
+        """Close the SQLite tier"""
+        with self.db_lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current size"""
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "size_bytes": self.size_bytes,
+                "persistent": self.db is not None
+            }
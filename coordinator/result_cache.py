@@ -0,0 +1,282 @@
+"""
+Result Cache for Sumeru AI Platform
+
+This module caches the results of sync and async functions behind a
+thread-safe LRU with a TTL. Concurrent misses for one key run the loader once,
+entries can be served stale while a single background refresh runs, and
+writers invalidate entries by tag instead of waiting for them to expire.
+"""
+
+import asyncio
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Any, Callable, Iterable, Set, Tuple, Union
+
+from single_flight import SingleFlight
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    stale_until: float
+    tags: Tuple[str, ...]
+
+# Every cache registers itself here so one endpoint can report them all
+caches: Dict[str, "ResultCache"] = {}
+
+class ResultCache:
+    def __init__(self, name: str, maxsize: int = 100, ttl: float = 300.0, stale_ttl: float = 0.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.tag_index: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+        # Bumped by every invalidation; a load that started before one is not stored
+        self.generation = 0
+        self.flights = SingleFlight()
+        self.key_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+        self.refreshing: Set[str] = set()
+        self.stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "loads": 0, "load_errors": 0,
+            "refreshes": 0, "evictions": 0, "expirations": 0, "invalidations": 0
+        }
+        caches[name] = self
+
+    def _count(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def _lookup(self, key: str, now: float) -> Tuple[Optional[_Entry], bool]:
+        """Return (entry, fresh); call with self.lock held"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, False
+        if entry.expires_at > now:
+            self.entries.move_to_end(key)
+            return entry, True
+        if entry.stale_until > now:
+            return entry, False
+        self._remove(key)
+        self.stats["expirations"] += 1
+        return None, False
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self.tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_index[tag]
+
+    def _store(self, key: str, value: Any, tags: Tuple[str, ...], generation: int):
+        now = time.monotonic()
+        with self.lock:
+            if generation != self.generation:
+                return
+            self._remove(key)
+            self.entries[key] = _Entry(value, now + self.ttl, now + self.ttl + self.stale_ttl, tags)
+            for tag in tags:
+                self.tag_index.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                self._remove(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def _check(self, key: str) -> Tuple[Optional[_Entry], bool, bool, int]:
+        """Return (entry, fresh, start_refresh, generation) and count the lookup"""
+        with self.lock:
+            entry, fresh = self._lookup(key, time.monotonic())
+            start_refresh = False
+            if entry is None:
+                self.stats["misses"] += 1
+            elif fresh:
+                self.stats["hits"] += 1
+            else:
+                self.stats["stale_hits"] += 1
+                if key not in self.refreshing:
+                    self.refreshing.add(key)
+                    start_refresh = True
+            return entry, fresh, start_refresh, self.generation
+
+    async def get_or_load(self, key: str, loader: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        """Get key, running the async loader once for all concurrent misses"""
+        tags = tuple(tags)
+        entry, fresh, start_refresh, generation = self._check(key)
+        if entry is not None:
+            if start_refresh:
+                asyncio.create_task(self._refresh_async(key, loader, tags, generation))
+            return entry.value
+
+        async def load():
+            return await self._load_async(key, loader, tags, generation)
+        value, _ = await self.flights.do(key, load)
+        return value
+
+    async def _load_async(self, key: str, loader: Callable[[], Any], tags: Tuple[str, ...], generation: int) -> Any:
+        self._count("loads")
+        try:
+            value = await loader()
+        except Exception:
+            self._count("load_errors")
+            raise
+        self._store(key, value, tags, generation)
+        return value
+
+    async def _refresh_async(self, key: str, loader: Callable[[], Any], tags: Tuple[str, ...], generation: int):
+        self._count("refreshes")
+        try:
+            await self.flights.do(key, lambda: self._load_async(key, loader, tags, generation))
+        except Exception as e:
+            print(f"Error refreshing {self.name} cache entry: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def get_or_load_sync(self, key: str, loader: Callable[[], Any], tags: Iterable[str] = ()) -> Any:
+        """Get key, running the loader once for all concurrent misses across threads"""
+        tags = tuple(tags)
+        entry, fresh, start_refresh, generation = self._check(key)
+        if entry is not None:
+            if start_refresh:
+                threading.Thread(
+                    target=self._refresh_sync, args=(key, loader, tags, generation), daemon=True
+                ).start()
+            return entry.value
+
+        with self._key_lock(key):
+            # Another thread may have loaded the key while this one waited
+            with self.lock:
+                entry, fresh = self._lookup(key, time.monotonic())
+            if entry is not None and fresh:
+                return entry.value
+            return self._load_sync(key, loader, tags, generation)
+
+    def _load_sync(self, key: str, loader: Callable[[], Any], tags: Tuple[str, ...], generation: int) -> Any:
+        self._count("loads")
+        try:
+            value = loader()
+        except Exception:
+            self._count("load_errors")
+            raise
+        self._store(key, value, tags, generation)
+        return value
+
+    def _refresh_sync(self, key: str, loader: Callable[[], Any], tags: Tuple[str, ...], generation: int):
+        self._count("refreshes")
+        try:
+            with self._key_lock(key):
+                self._load_sync(key, loader, tags, generation)
+        except Exception as e:
+            print(f"Error refreshing {self.name} cache entry: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def _key_lock(self, key: str) -> "_KeyLock":
+        return _KeyLock(self, key)
+
+    def invalidate(self, key: str):
+        """Drop one entry"""
+        with self.lock:
+            self.generation += 1
+            if key in self.entries:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Drop every entry carrying any of tags and return how many were dropped"""
+        with self.lock:
+            self.generation += 1
+            keys = set().union(*(self.tag_index.get(tag, set()) for tag in tags))
+            for key in keys:
+                self._remove(key)
+            self.stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.generation += 1
+            self.stats["invalidations"] += len(self.entries)
+            self.entries.clear()
+            self.tag_index.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and current size"""
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round((self.stats["hits"] + self.stats["stale_hits"]) / lookups, 4) if lookups else 0.0,
+                "coalesced": self.flights.stats["coalesced"],
+                "entries": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl
+            }
+
+class _KeyLock:
+    """A per-key lock that is dropped from the cache once nobody holds or waits on it"""
+
+    def __init__(self, cache: ResultCache, key: str):
+        self.cache = cache
+        self.key = key
+
+    def __enter__(self):
+        with self.cache.lock:
+            lock, users = self.cache.key_locks.get(self.key, (threading.Lock(), 0))
+            self.cache.key_locks[self.key] = (lock, users + 1)
+        lock.acquire()
+        self.lock = lock
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+        with self.cache.lock:
+            lock, users = self.cache.key_locks[self.key]
+            if users == 1:
+                del self.cache.key_locks[self.key]
+            else:
+                self.cache.key_locks[self.key] = (lock, users - 1)
+
+def make_key(func: Callable, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Build a stable cache key from a function and its arguments"""
+    return f"{func.__module__}.{func.__qualname__}:" + json.dumps([args, kwargs], sort_keys=True, default=repr)
+
+def cached(cache: ResultCache, key: Optional[Callable[..., str]] = None,
+           tags: Union[Iterable[str], Callable[..., Iterable[str]]] = ()):
+    """Cache a sync or async function's results in cache.
+
+    key and tags may be functions of the call's arguments; by default the key
+    covers every argument and the entry carries no tags.
+    """
+    def decorator(func):
+        def resolve(args, kwargs) -> Tuple[str, Iterable[str]]:
+            cache_key = key(*args, **kwargs) if key else make_key(func, args, kwargs)
+            entry_tags = tags(*args, **kwargs) if callable(tags) else tags
+            return cache_key, entry_tags
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_key, entry_tags = resolve(args, kwargs)
+                return await cache.get_or_load(cache_key, lambda: func(*args, **kwargs), entry_tags)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key, entry_tags = resolve(args, kwargs)
+            return cache.get_or_load_sync(cache_key, lambda: func(*args, **kwargs), entry_tags)
+        return wrapper
+    return decorator
+
+def get_all_stats() -> Dict[str, Dict[str, Any]]:
+    """Get stats for every registered cache"""
+    return {name: cache.get_stats() for name, cache in caches.items()}
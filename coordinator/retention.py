@@ -0,0 +1,188 @@
+"""
+Message Retention for Sumeru AI Platform
+
+This module keeps chat.db from growing without bound. A background task moves
+messages past the retention window, or beyond the row cap, into gzip-compressed
+JSONL archives, prunes old system and error rows outright, and returns the
+freed pages to the OS with incremental vacuum, so the hot messages table stays
+a bounded size.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple
+
+from database import AsyncDatabase
+
+@dataclass
+class RetentionPolicy:
+    archive_after_days: float = 30.0
+    prune_after_days: float = 7.0
+    prune_types: Tuple[str, ...] = ("system",)
+    prune_errors: bool = True
+    archive_dir: str = "./archive"
+    max_messages: int = 0  # oldest rows beyond this many are archived; 0 keeps every row
+    batch_size: int = 500
+    vacuum_pages: int = 2000
+
+@dataclass
+class MaintenanceReport:
+    started_at: str
+    pruned: int = 0
+    archived: int = 0
+    archive_bytes: int = 0
+    bytes_reclaimed: int = 0
+    duration: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+def _cutoff(days: float) -> str:
+    # messages.timestamp is CURRENT_TIMESTAMP, i.e. UTC in this format
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+def _database_bytes(conn: sqlite3.Connection) -> int:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    return page_size * page_count
+
+def _incremental_vacuum(conn: sqlite3.Connection, pages: int) -> int:
+    before = _database_bytes(conn)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # A database created before AsyncDatabase enabled incremental mode needs
+        # one full VACUUM to switch; it runs here, in maintenance, not at startup
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        # Each step of this pragma frees one page, and only executescript steps it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    # In WAL mode the file itself shrinks once the freed pages are checkpointed
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    conn.execute("PRAGMA optimize")
+    return before - _database_bytes(conn)
+
+def _delete_messages(conn: sqlite3.Connection, ids: List[int]) -> int:
+    placeholders = ",".join("?" * len(ids))
+    return conn.execute(f"DELETE FROM messages WHERE id IN ({placeholders})", ids).rowcount
+
+class RetentionManager:
+    def __init__(self, db: AsyncDatabase, policy: RetentionPolicy):
+        self.db = db
+        self.policy = policy
+        self.last_report: Optional[MaintenanceReport] = None
+        self.totals = {"runs": 0, "pruned": 0, "archived": 0, "archive_bytes": 0, "bytes_reclaimed": 0}
+        self.lock = asyncio.Lock()
+
+    async def run_once(self) -> MaintenanceReport:
+        """Prune, archive and vacuum once, one short write transaction per batch"""
+        async with self.lock:
+            report = MaintenanceReport(started_at=datetime.now(timezone.utc).isoformat())
+            started_at = time.monotonic()
+            for step in (self._prune, self._archive, self._cap, self._vacuum):
+                try:
+                    await step(report)
+                except Exception as e:
+                    report.errors.append(f"{step.__name__.lstrip('_')}: {e}")
+            report.duration = round(time.monotonic() - started_at, 3)
+
+            self.last_report = report
+            self.totals["runs"] += 1
+            for key in ("pruned", "archived", "archive_bytes", "bytes_reclaimed"):
+                self.totals[key] += getattr(report, key)
+            return report
+
+    async def _prune(self, report: MaintenanceReport):
+        cutoff = _cutoff(self.policy.prune_after_days)
+        selectors = [("message_type = ?", (message_type,)) for message_type in self.policy.prune_types]
+        if self.policy.prune_errors:
+            selectors.append(("is_error = 1", ()))
+        for condition, params in selectors:
+            while True:
+                rows = await self.db.fetch_all(
+                    f"SELECT id FROM messages WHERE {condition} AND timestamp < ? LIMIT ?",
+                    (*params, cutoff, self.policy.batch_size)
+                )
+                if not rows:
+                    break
+                report.pruned += await self.db.run_write(_delete_messages, [row["id"] for row in rows])
+
+    async def _archive(self, report: MaintenanceReport):
+        cutoff = _cutoff(self.policy.archive_after_days)
+        while True:
+            rows = await self.db.fetch_all(
+                "SELECT * FROM messages WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?",
+                (cutoff, self.policy.batch_size)
+            )
+            if not rows:
+                break
+            await self._archive_rows(report, rows)
+
+    async def _cap(self, report: MaintenanceReport):
+        if not self.policy.max_messages:
+            return
+        while True:
+            count = (await self.db.fetch_one("SELECT COUNT(*) AS count FROM messages"))["count"]
+            excess = count - self.policy.max_messages
+            if excess <= 0:
+                break
+            rows = await self.db.fetch_all(
+                "SELECT * FROM messages ORDER BY id LIMIT ?",
+                (min(excess, self.policy.batch_size),)
+            )
+            await self._archive_rows(report, rows)
+
+    async def _archive_rows(self, report: MaintenanceReport, rows: List[Dict[str, Any]]):
+        # Rows are written out before they are deleted, so a crash in between
+        # can repeat rows in the archive but never loses them
+        report.archive_bytes += await asyncio.to_thread(self._write_archive, rows)
+        report.archived += await self.db.run_write(_delete_messages, [row["id"] for row in rows])
+
+    def _write_archive(self, rows: List[Dict[str, Any]]) -> int:
+        os.makedirs(self.policy.archive_dir, exist_ok=True)
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_month.setdefault(str(row["timestamp"])[:7], []).append(row)
+
+        written = 0
+        for month, month_rows in by_month.items():
+            path = os.path.join(self.policy.archive_dir, f"messages-{month}.jsonl.gz")
+            before = os.path.getsize(path) if os.path.exists(path) else 0
+            # Each append is a separate gzip member; gzip readers treat them as one stream
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                for row in month_rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            written += os.path.getsize(path) - before
+        return written
+
+    async def _vacuum(self, report: MaintenanceReport):
+        report.bytes_reclaimed += await self.db.run_unbatched(_incremental_vacuum, self.policy.vacuum_pages)
+
+    async def run(self, interval: float):
+        """Run maintenance periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                report = await self.run_once()
+                if report.pruned or report.archived or report.errors:
+                    print(f"Chat database maintenance: {report}")
+            except Exception as e:
+                print(f"Error running chat database maintenance: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the retention policy, the last run's report and running totals"""
+        return {
+            "policy": {
+                "archive_after_days": self.policy.archive_after_days,
+                "prune_after_days": self.policy.prune_after_days,
+                "prune_types": list(self.policy.prune_types),
+                "prune_errors": self.policy.prune_errors,
+                "max_messages": self.policy.max_messages,
+                "archive_dir": self.policy.archive_dir
+            },
+            "last_run": asdict(self.last_report) if self.last_report else None,
+            "totals": self.totals
+        }
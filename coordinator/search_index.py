@@ -0,0 +1,278 @@
+"""
+Full-Text Search for Sumeru AI Platform
+
+This module keeps SQLite FTS5 indexes over chat messages, workspace files and
+agent-generated files. The message index is maintained by triggers on the
+messages table; documents are queued from any thread and written to the index
+in batches, the same way the quota ledger persists usage.
+"""
+
+import asyncio
+import html
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Any, Tuple
+
+from database import AsyncDatabase
+
+SOURCE_WORKSPACE = "workspace"
+SOURCE_AGENT = "agent"
+
+# Files larger than this are left out of the index
+MAX_INDEXED_FILE_BYTES = 1024 * 1024
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# FTS5 marks matches in the raw indexed text; these control characters stand in
+# for the tags until the text around them has been HTML-escaped
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+def create_search_schema(conn: sqlite3.Connection) -> bool:
+    """Create the FTS tables and triggers, backfilling the message index on first run.
+
+    Returns False if this SQLite build has no FTS5, in which case search is disabled.
+    """
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                message, content='messages', content_rowid='id', tokenize='{FTS_TOKENIZER}', prefix='2 3'
+            )
+        ''')
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                name, content, tokenize='{FTS_TOKENIZER}', prefix='2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"FTS5 not available ({e}). Search is disabled.")
+        return False
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            path TEXT NOT NULL,
+            name TEXT NOT NULL,
+            task_id TEXT,
+            mtime REAL,
+            size INTEGER,
+            indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (source, path)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF message ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+            INSERT INTO messages_fts (rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+
+    if "messages_fts" not in existing:
+        conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    return True
+
+def build_match_query(text: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 query where every term must match.
+
+    A term ending in * is a prefix search. Prefixes are opt-in because ranking
+    a short prefix has to score every term it expands to.
+    """
+    quoted = []
+    for term in text.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*").replace('"', '""')
+        if term:
+            quoted.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(quoted) or None
+
+class SearchIndex:
+    def __init__(self):
+        self.db: Optional[AsyncDatabase] = None
+        self.available = False
+        # (source, path) -> document fields, or None for a removal
+        self.pending: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+
+    async def start(self, db: AsyncDatabase):
+        """Create the search schema on db and start accepting queries"""
+        self.db = db
+        self.available = await db.run_write(create_search_schema)
+
+    def queue_document(self, source: str, path: str, name: str, content: str, task_id: Optional[str] = None,
+                       mtime: Optional[float] = None, size: Optional[int] = None):
+        """Queue a document to be (re)indexed on the next flush; safe to call from any thread.
+
+        Dropped when the index is not started or has no FTS5, so content is never held for a flush that will not come.
+        """
+        if not self.available:
+            return
+        with self.lock:
+            self.pending[(source, path)] = {
+                "name": name, "content": content, "task_id": task_id, "mtime": mtime, "size": size
+            }
+
+    def queue_removal(self, source: str, path: str):
+        """Queue a document to be dropped from the index on the next flush"""
+        if not self.available:
+            return
+        with self.lock:
+            self.pending[(source, path)] = None
+
+    async def flush(self) -> int:
+        """Write queued documents to the index in one transaction and return how many changed"""
+        if not self.available:
+            with self.lock:
+                self.pending.clear()
+            return 0
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            await self.db.run_write(_write_documents, list(pending.items()))
+        except Exception:
+            # Requeue unless a newer version of the document arrived meanwhile
+            with self.lock:
+                for key, document in pending.items():
+                    self.pending.setdefault(key, document)
+            raise
+        return len(pending)
+
+    async def run(self, interval: float):
+        """Flush periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing search index: {e}")
+
+    async def sync_workspace(self, root: str) -> int:
+        """Index new and changed workspace files and drop deleted ones, skipping unchanged files"""
+        if not self.available:
+            return 0
+        indexed = {
+            row["path"]: (row["mtime"], row["size"])
+            for row in await self.db.fetch_all(
+                "SELECT path, mtime, size FROM search_documents WHERE source = ?", (SOURCE_WORKSPACE,)
+            )
+        }
+        await asyncio.to_thread(self._scan_workspace, root, indexed)
+        return await self.flush()
+
+    def _scan_workspace(self, root: str, indexed: Dict[str, Tuple[float, int]]):
+        seen = set()
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                path = os.path.relpath(full_path, root)
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                if stat.st_size > MAX_INDEXED_FILE_BYTES:
+                    continue
+                seen.add(path)
+                if indexed.get(path) == (stat.st_mtime, stat.st_size):
+                    continue
+                try:
+                    with open(full_path, "r", encoding="utf-8") as f:
+                        content = f.read()
+                except (OSError, UnicodeDecodeError):
+                    continue
+                self.queue_document(SOURCE_WORKSPACE, path, filename, content, mtime=stat.st_mtime, size=stat.st_size)
+
+        for path in indexed.keys() - seen:
+            self.queue_removal(SOURCE_WORKSPACE, path)
+
+    async def search_messages(self, text: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Rank chat messages against text, best match first, with highlighted snippets"""
+        query = build_match_query(text)
+        if not self.available or query is None:
+            return []
+        rows = await self.db.fetch_all(f'''
+            SELECT m.id, m.sender, m.avatar, m.timestamp, m.message_type,
+                   snippet(messages_fts, 0, '{_MATCH_START}', '{_MATCH_END}', '…', 24) AS snippet,
+                   messages_fts.rank AS score
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+            ORDER BY messages_fts.rank
+            LIMIT ? OFFSET ?
+        ''', (query, limit, offset))
+        return _escape_highlights(rows, "snippet")
+
+    async def search_documents(self, text: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Rank workspace and agent files against text, weighting file name matches above content"""
+        query = build_match_query(text)
+        if not self.available or query is None:
+            return []
+        await self.flush()
+        rows = await self.db.fetch_all(f'''
+            SELECT d.source, d.path, d.name, d.task_id,
+                   highlight(documents_fts, 0, '{_MATCH_START}', '{_MATCH_END}') AS name_highlight,
+                   snippet(documents_fts, 1, '{_MATCH_START}', '{_MATCH_END}', '…', 24) AS snippet,
+                   bm25(documents_fts, 5.0, 1.0) AS score
+            FROM documents_fts
+            JOIN search_documents d ON d.id = documents_fts.rowid
+            WHERE documents_fts MATCH ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+        ''', (query, limit, offset))
+        return _escape_highlights(rows, "name_highlight", "snippet")
+
+def _escape_highlights(rows: List[Dict[str, Any]], *fields: str) -> List[Dict[str, Any]]:
+    """HTML-escape highlighted fields, then turn the match markers into <mark> tags"""
+    for row in rows:
+        for field in fields:
+            text = html.escape(row[field] or "")
+            row[field] = text.replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_END, HIGHLIGHT_END)
+    return rows
+
+def _write_documents(conn: sqlite3.Connection, changes: List[Tuple[Tuple[str, str], Optional[Dict[str, Any]]]]):
+    for (source, path), document in changes:
+        row = conn.execute(
+            "SELECT id FROM search_documents WHERE source = ? AND path = ?", (source, path)
+        ).fetchone()
+        if row is not None:
+            conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+        if document is None:
+            if row is not None:
+                conn.execute("DELETE FROM search_documents WHERE id = ?", (row[0],))
+            continue
+
+        if row is None:
+            doc_id = conn.execute('''
+                INSERT INTO search_documents (source, path, name, task_id, mtime, size)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (source, path, document["name"], document["task_id"], document["mtime"], document["size"])).lastrowid
+        else:
+            doc_id = row[0]
+            conn.execute('''
+                UPDATE search_documents
+                SET name = ?, task_id = ?, mtime = ?, size = ?, indexed_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (document["name"], document["task_id"], document["mtime"], document["size"], doc_id))
+        conn.execute(
+            "INSERT INTO documents_fts (rowid, name, content) VALUES (?, ?, ?)",
+            (doc_id, document["name"], document["content"])
+        )
+
+# Global search index instance
+search_index = SearchIndex()
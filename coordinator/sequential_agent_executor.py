@@ -256,6 +256,7 @@ class SequentialAgentExecutor:
         # Update agent status
         await websocket_manager.update_agent_status(
             agent_id=step.step_id,
+            workflow_id=workflow.workflow_id,
             agent_name=step.agent_name,
             role=step.agent_role,
             status="working",
@@ -266,6 +267,7 @@ class SequentialAgentExecutor:
         # Send start message
         await websocket_manager.send_agent_message(
             agent_id=step.step_id,
+            workflow_id=workflow.workflow_id,
             agent_name=step.agent_name,
             role=step.agent_role,
             message=f"Starting: {step.task_description}",
@@ -293,6 +295,7 @@ class SequentialAgentExecutor:
         # Update final agent status
         await websocket_manager.update_agent_status(
             agent_id=step.step_id,
+            workflow_id=workflow.workflow_id,
             agent_name=step.agent_name,
             role=step.agent_role,
             status=step.status,
@@ -304,6 +307,7 @@ class SequentialAgentExecutor:
         message_type = "complete" if step.status == "completed" else "error"
         await websocket_manager.send_agent_message(
             agent_id=step.step_id,
+            workflow_id=workflow.workflow_id,
             agent_name=step.agent_name,
             role=step.agent_role,
             message=f"{'Completed' if step.status == 'completed' else 'Failed'}: {step.task_description}",
@@ -318,6 +322,7 @@ class SequentialAgentExecutor:
             progress = (i + 1) * 20
             await websocket_manager.update_agent_status(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 status="working",
@@ -327,6 +332,7 @@ class SequentialAgentExecutor:
             
             await websocket_manager.send_agent_message(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 message=f"Analyzing requirements... {progress}% complete",
@@ -343,6 +349,7 @@ class SequentialAgentExecutor:
             step.files_generated.append(file_info)
             await websocket_manager.send_file_generated(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 filename=file_info["name"],
@@ -360,6 +367,7 @@ class SequentialAgentExecutor:
             progress = (i + 1) * 20
             await websocket_manager.update_agent_status(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 status="working",
@@ -377,6 +385,7 @@ class SequentialAgentExecutor:
             step.files_generated.append(file_info)
             await websocket_manager.send_file_generated(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 filename=file_info["name"],
@@ -394,6 +403,7 @@ class SequentialAgentExecutor:
             progress = (i + 1) * 12
             await websocket_manager.update_agent_status(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 status="working",
@@ -412,6 +422,7 @@ class SequentialAgentExecutor:
             step.files_generated.append(file_info)
             await websocket_manager.send_file_generated(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 filename=file_info["name"],
@@ -429,6 +440,7 @@ class SequentialAgentExecutor:
             progress = (i + 1) * 20
             await websocket_manager.update_agent_status(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 status="working",
@@ -446,6 +458,7 @@ class SequentialAgentExecutor:
             step.files_generated.append(file_info)
             await websocket_manager.send_file_generated(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 filename=file_info["name"],
@@ -463,6 +476,7 @@ class SequentialAgentExecutor:
             progress = (i + 1) * 33
             await websocket_manager.update_agent_status(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 status="working",
@@ -481,6 +495,7 @@ class SequentialAgentExecutor:
             step.files_generated.append(file_info)
             await websocket_manager.send_file_generated(
                 agent_id=step.step_id,
+                workflow_id=workflow.workflow_id,
                 agent_name=step.agent_name,
                 role=step.agent_role,
                 filename=file_info["name"],
@@ -2,19 +2,40 @@ import os
 import json
 import sqlite3
 import asyncio
-import threading
-import functools
-import aiohttp
+import time
 import uuid
+import hashlib
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from dataclasses import asdict
+from typing import Dict, List, Optional, Any, AsyncIterator
 from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
+from email.utils import formatdate, parsedate_to_datetime
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from cachetools import TTLCache
 import uvicorn
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, aclosing
+
+from provider_client import ProviderClient, ProviderConfig, build_chat_messages
+from provider_stats import latency_tracker
+from provider_health import health_monitor
+from model_router import AdaptiveRouter
+from response_cache import CompletionCache, normalize_text
+from single_flight import SingleFlight
+from admission_control import AdmissionController, PRIORITY_INTERACTIVE, load_router_limits
+from quota_ledger import QuotaLedger
+from database import AsyncDatabase
+from search_index import search_index, SOURCE_WORKSPACE
+from retention import RetentionManager, RetentionPolicy
+import result_cache
+from result_cache import ResultCache, cached
+from workspace_index import WorkspaceIndex
+from websocket_manager import websocket_manager
+from zip_export import (
+    ExportCache, ZipEntry, COMPRESSION_METHODS, directory_entries, file_entry, fingerprint, loaded_entry, stream_zip
+)
+from metagpt_integration import metagpt_integration, event_spill
+from artifact_store import artifact_store
 
 # GPT-OSS-20B Configuration (Primary Model)
 GPT_OSS_API_KEY = os.getenv("GPT_OSS_API_KEY", "your-gpt-oss-api-key")
@@ -23,6 +44,7 @@ GPT_OSS_MODEL = "gpt-oss-20b"
 
 # Other API configurations
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+GEMINI_STREAM_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent?alt=sse"
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "your-openrouter-api-key")
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "your-groq-api-key")
@@ -67,6 +89,45 @@ MODEL_SELECTION_RULES = {
     }
 }
 
+# Approximate blended prices in USD per 1K tokens, used by the adaptive router
+MODEL_PRICES = {
+    ("gpt_oss", GPT_OSS_MODEL): 0.0002,
+    ("groq", "llama3-8b-8192"): 0.00007,
+    ("groq", "llama3-70b-8192"): 0.0007,
+    ("groq", "mixtral-8x7b-32768"): 0.00024,
+    ("gemini", "gemini-1.5-flash"): 0.0002,
+    ("openrouter", "claude-3.5-sonnet"): 0.009
+}
+
+# Routing strategy: "static" walks MODEL_SELECTION_RULES in order, "score" ranks candidates
+# by live latency, success rate, quota and price, "bandit" adds UCB1 exploration per task type
+ROUTING_STRATEGY = os.getenv("ROUTING_STRATEGY", "score")
+
+# Outbound request limits. rpm/tpm mirror the litellm_params fields in router.yaml, and
+# PROVIDER_LIMITS_CONFIG can point at a file in that format to override them
+MAX_CONCURRENT_AI_REQUESTS = int(os.getenv("MAX_CONCURRENT_AI_REQUESTS", "32"))
+PROVIDER_LIMITS = {
+    "gpt_oss": {"max_concurrency": 8, "rpm": 60, "tpm": 90000},
+    "groq": {"max_concurrency": 8, "rpm": 30, "tpm": 30000},
+    "gemini": {"max_concurrency": 8, "rpm": 60, "tpm": 90000},
+    "openrouter": {"max_concurrency": 8, "rpm": 60, "tpm": 90000}
+}
+PROVIDER_LIMITS_CONFIG = os.getenv("PROVIDER_LIMITS_CONFIG", "")
+
+# Hedged requests: when the current provider is slower than this percentile of its
+# observed latency, the next candidate is started in parallel and the first success wins
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "3.0"))  # seconds, used until enough samples exist
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "10"))
+HEDGE_CHARGE_ALL_CALLS = os.getenv("HEDGE_CHARGE_ALL_CALLS", "false").lower() == "true"
+
+# Completion cache: identical requests are answered from memory (and optionally SQLite)
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "3600"))  # seconds
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "1000"))
+COMPLETION_CACHE_DB = os.getenv("COMPLETION_CACHE_DB", "")  # e.g. ./completion_cache.db to persist across restarts
+
 # Use a local workspace directory instead of /workspace
 WORK_DIR = "./workspace"
 os.makedirs(WORK_DIR, exist_ok=True)
@@ -74,62 +135,50 @@ os.makedirs(WORK_DIR, exist_ok=True)
 # Database setup
 DB_PATH = "./chat.db"
 
+# Largest page /api/chat/messages and /api/search will return
+MESSAGE_PAGE_MAX = 200
+SEARCH_FLUSH_INTERVAL = float(os.getenv("SEARCH_FLUSH_INTERVAL", "5"))
+
+# Messages older than MESSAGE_ARCHIVE_DAYS move to gzip archives in ARCHIVE_DIR;
+# system and error rows older than MESSAGE_PRUNE_DAYS are deleted outright.
+# Beyond MESSAGE_MAX_ROWS rows (0 for no cap) the oldest are archived too.
+MESSAGE_ARCHIVE_DAYS = float(os.getenv("MESSAGE_ARCHIVE_DAYS", "30"))
+MESSAGE_PRUNE_DAYS = float(os.getenv("MESSAGE_PRUNE_DAYS", "7"))
+MESSAGE_MAX_ROWS = int(os.getenv("MESSAGE_MAX_ROWS", "0"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "3600"))
+
+# Finished ZIP exports are kept here so interrupted downloads can resume with Range
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "./exports")
+EXPORT_CACHE_MAX_ENTRIES = int(os.getenv("EXPORT_CACHE_MAX_ENTRIES", "20"))
+export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_ENTRIES)
+
+# API usage is counted in memory and written back to api_usage every few seconds
+QUOTA_FLUSH_INTERVAL = float(os.getenv("QUOTA_FLUSH_INTERVAL", "5"))
+
 # Performance optimizations
 CACHE_TTL = 300  # 5 minutes
-team_cache = TTLCache(maxsize=100, ttl=CACHE_TTL)
-files_cache = TTLCache(maxsize=100, ttl=CACHE_TTL)
-quotas_cache = TTLCache(maxsize=50, ttl=CACHE_TTL)
-
-# Connection pool for database
-db_connections = {}
-db_lock = threading.Lock()
+CACHE_STALE_TTL = 60  # serve an expired entry this long while it refreshes in the background
+team_cache = ResultCache("team", maxsize=100, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL)
+completion_cache = CompletionCache(
+    max_entries=COMPLETION_CACHE_MAX_ENTRIES,
+    default_ttl=COMPLETION_CACHE_TTL,
+    db_path=COMPLETION_CACHE_DB or None
+)
 
-def get_db_connection():
-    """Get database connection with connection pooling"""
-    thread_id = threading.get_ident()
-    
-    with db_lock:
-        if thread_id not in db_connections:
-            try:
-                db_connections[thread_id] = sqlite3.connect(DB_PATH)
-                db_connections[thread_id].row_factory = sqlite3.Row
-            except Exception as e:
-                print(f"Error creating database connection: {e}")
-                db_connections[thread_id] = sqlite3.connect(DB_PATH)
-                db_connections[thread_id].row_factory = sqlite3.Row
-        
-        try:
-            db_connections[thread_id].execute("SELECT 1")
-        except (sqlite3.OperationalError, sqlite3.ProgrammingError):
-            try:
-                db_connections[thread_id].close()
-            except:
-                pass
-            db_connections[thread_id] = sqlite3.connect(DB_PATH)
-            db_connections[thread_id].row_factory = sqlite3.Row
-            
-        return db_connections[thread_id]
-
-def close_db_connections():
-    """Close all database connections"""
-    with db_lock:
-        for conn in db_connections.values():
-            conn.close()
-        db_connections.clear()
-
-# Cache decorator
-def cache_result(cache_dict, key_func=None):
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            key = key_func(*args, **kwargs) if key_func else str(args) + str(kwargs)
-            if key in cache_dict:
-                return cache_dict[key]
-            result = func(*args, **kwargs)
-            cache_dict[key] = result
-            return result
-        return wrapper
-    return decorator
+# Async database access: one writer thread plus a small pool of read connections.
+# DB_DURABILITY is full, normal or off (SQLite synchronous level under WAL);
+# writes queued while a commit is in flight share the next one, and
+# DB_COMMIT_WINDOW_MS can hold a busy batch open longer to collect more.
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+DB_DURABILITY = os.getenv("DB_DURABILITY", "normal").lower()
+DB_COMMIT_WINDOW_MS = float(os.getenv("DB_COMMIT_WINDOW_MS", "0"))
+db = AsyncDatabase(
+    DB_PATH,
+    read_pool_size=DB_READ_POOL_SIZE,
+    durability=DB_DURABILITY,
+    commit_window=DB_COMMIT_WINDOW_MS / 1000
+)
 
 # Task analysis function
 def analyze_user_command(prompt: str) -> str:
@@ -158,66 +207,28 @@ def analyze_user_command(prompt: str) -> str:
     
     return "default"
 
-def get_best_model_for_task(prompt: str) -> tuple[str, str]:
-    """Get the best model for a given task"""
+def get_candidate_models(prompt: str) -> List[tuple[str, str]]:
+    """Get the available (provider, model) pairs for a task, ranked by the adaptive router"""
     task_type = analyze_user_command(prompt)
+    rule = MODEL_SELECTION_RULES.get(task_type, MODEL_SELECTION_RULES["default"])
     
-    if task_type in MODEL_SELECTION_RULES:
-        rule = MODEL_SELECTION_RULES[task_type]
-        models = rule["models"]
-        providers = rule["providers"]
-        
-        # Try each model in priority order
-        for i, model in enumerate(models):
-            provider = providers[i]
-            if check_model_availability(provider, model):
-                return provider, model
+    candidates = []
+    for provider, model in zip(rule["providers"], rule["models"]):
+        if (provider, model) not in candidates and check_model_availability(provider, model):
+            candidates.append((provider, model))
+    return model_router.rank(task_type, candidates, get_quota_remaining())
+
+def get_best_model_for_task(prompt: str) -> tuple[str, str]:
+    """Get the best model for a given task"""
+    candidates = get_candidate_models(prompt)
+    if candidates:
+        return candidates[0]
     
     # Fallback to GPT-OSS-20B
     return "gpt_oss", GPT_OSS_MODEL
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
-
-manager = ConnectionManager()
-
-# HTTP session management
-http_session = None
-
-async def get_http_session():
-    global http_session
-    if http_session is None:
-        http_session = aiohttp.ClientSession()
-    return http_session
-
-async def close_http_session():
-    global http_session
-    if http_session:
-        await http_session.close()
-        http_session = None
-
 # Database initialization
-def init_db():
-    conn = get_db_connection()
+def init_db(conn: sqlite3.Connection):
     cursor = conn.cursor()
     
     # Create messages table
@@ -236,6 +247,10 @@ def init_db():
         )
     ''')
     
+    # History pages are keyed on (timestamp, id); id rides along in every index as the rowid
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_timestamp_id ON messages (timestamp, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_type_timestamp ON messages (message_type, timestamp)')
+    
     # Create team members table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS team_members (
@@ -263,6 +278,17 @@ def init_db():
         )
     ''')
     
+    # api_usage used to gain a row per call because nothing was unique on (provider, model);
+    # keep the newest row per model and enforce uniqueness from now on
+    cursor.execute('''
+        DELETE FROM api_usage WHERE id NOT IN (
+            SELECT MAX(id) FROM api_usage GROUP BY provider, model
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_api_usage_provider_model ON api_usage (provider, model)
+    ''')
+    
     # Insert default team members
     cursor.execute('''
         INSERT OR IGNORE INTO team_members (name, role, avatar, active) VALUES
@@ -278,8 +304,14 @@ def init_db():
         INSERT OR IGNORE INTO api_usage (provider, model, daily_limit, monthly_limit) VALUES
         ('gpt_oss', ?, 100, 1000)
     ''', (GPT_OSS_MODEL,))
-    
-    conn.commit()
+
+quota_ledger = QuotaLedger(db)
+retention_manager = RetentionManager(db, RetentionPolicy(
+    archive_after_days=MESSAGE_ARCHIVE_DAYS,
+    prune_after_days=MESSAGE_PRUNE_DAYS,
+    max_messages=MESSAGE_MAX_ROWS,
+    archive_dir=ARCHIVE_DIR
+))
 
 # Pydantic models
 class ChatMessage(BaseModel):
@@ -313,60 +345,79 @@ class Credits(BaseModel):
     total: Dict[str, int]
 
 # Database functions
-def save_message(sender: str, message: str, avatar: str = "👤", is_working: bool = False, message_type: str = "user", steps_remaining: int = 0, is_error: bool = False, error_type: Optional[str] = None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+async def save_message(sender: str, message: str, avatar: str = "👤", is_working: bool = False, message_type: str = "user", steps_remaining: int = 0, is_error: bool = False, error_type: Optional[str] = None):
+    await db.execute('''
         INSERT INTO messages (sender, message, avatar, is_working, message_type, steps_remaining, is_error, error_type)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     ''', (sender, message, avatar, is_working, message_type, steps_remaining, is_error, error_type))
-    conn.commit()
 
-def get_messages(limit: int = 50):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+async def get_messages(limit: int = 50, before_id: Optional[int] = None, after_id: Optional[int] = None, message_type: Optional[str] = None):
+    """Get a page of messages by keyset on (timestamp, id).
+
+    Newest first, except with only after_id set, where the page runs oldest
+    first from the cursor so a poller can walk forward without gaps.
+    """
+    conditions = []
+    params: List[Any] = []
+    if message_type:
+        conditions.append('message_type = ?')
+        params.append(message_type)
+    for cursor_id, operator in ((before_id, '<'), (after_id, '>')):
+        if cursor_id is None:
+            continue
+        cursor = await db.fetch_one('SELECT timestamp FROM messages WHERE id = ?', (cursor_id,))
+        if cursor is None:
+            # The cursor row was archived or pruned; ids grow with insertion time, so page on id alone
+            conditions.append(f'id {operator} ?')
+            params.append(cursor_id)
+        else:
+            conditions.append(f'(timestamp, id) {operator} (?, ?)')
+            params.extend((cursor['timestamp'], cursor_id))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = "ASC" if after_id is not None and before_id is None else "DESC"
+    params.append(limit)
+    return await db.fetch_all(f'''
         SELECT * FROM messages 
-        ORDER BY timestamp DESC 
+        {where}
+        ORDER BY timestamp {order}, id {order} 
         LIMIT ?
-    ''', (limit,))
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+    ''', tuple(params))
 
-@cache_result(team_cache)
-def get_team_members_optimized():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM team_members')
-    rows = cursor.fetchall()
-    return [dict(row) for row in rows]
+@cached(team_cache, tags=("team",))
+async def get_team_members_optimized():
+    return await db.fetch_all('SELECT * FROM team_members')
 
-@cache_result(files_cache)
-def get_files_optimized():
-    files = []
-    try:
-        for root, dirs, filenames in os.walk(WORK_DIR):
-            for filename in filenames:
-                file_path = os.path.join(root, filename)
-                relative_path = os.path.relpath(file_path, WORK_DIR)
-                file_type = get_file_type_from_name(filename)
-                icon = get_file_icon_from_type(file_type)
-                
-                files.append({
-                    "name": filename,
-                    "type": file_type,
-                    "icon": icon,
-                    "path": relative_path
-                })
-    except Exception as e:
-        print(f"Error reading files: {e}")
-    
-    return files
+def resolve_workspace_path(filename: str) -> Optional[str]:
+    """Resolve a client-supplied path inside WORK_DIR, or None if it would leave it"""
+    root = os.path.realpath(WORK_DIR)
+    file_path = os.path.realpath(os.path.join(root, filename))
+    if file_path == root or os.path.commonpath([root, file_path]) != root:
+        return None
+    return file_path
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong ETag for a file version, from its inode, size and nanosecond mtime"""
+    version = f"{stat.st_ino}-{stat.st_size}-{stat.st_mtime_ns}"
+    return f'"{hashlib.sha256(version.encode()).hexdigest()[:32]}"'
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since as RFC 9110 specifies"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
 
 def get_file_content(filename: str):
     try:
-        file_path = os.path.join(WORK_DIR, filename)
-        if os.path.exists(file_path):
+        file_path = resolve_workspace_path(filename)
+        if file_path is not None and os.path.isfile(file_path):
             with open(file_path, 'r', encoding='utf-8') as f:
                 return f.read()
         return None
@@ -375,262 +426,438 @@ def get_file_content(filename: str):
         return None
 
 def get_credits():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM api_usage')
-    rows = cursor.fetchall()
-    
-    credits = {}
-    for row in rows:
-        provider = row['provider']
-        model = row['model']
-        daily_used = row['daily_used']
-        daily_limit = row['daily_limit']
-        monthly_used = row['monthly_used']
-        monthly_limit = row['monthly_limit']
-        
-        if provider not in credits:
-            credits[provider] = {}
-        
-        credits[provider][model] = {
-            "daily": {
-                "used": daily_used,
-                "limit": daily_limit,
-                "percentage": (daily_used / daily_limit * 100) if daily_limit > 0 else 0
-            },
-            "monthly": {
-                "used": monthly_used,
-                "limit": monthly_limit,
-                "percentage": (monthly_used / monthly_limit * 100) if monthly_limit > 0 else 0
-            },
-            "last_used": row['last_used']
-        }
-    
-    return credits
+    """Get API usage per provider and model from the in-memory quota ledger"""
+    return quota_ledger.snapshot()
+
+def get_quota_remaining() -> Dict[tuple[str, str], float]:
+    """Get the fraction of quota left for each tracked model, the tighter of daily and monthly"""
+    return {key: quota_ledger.remaining_fraction(*key) for key in list(quota_ledger.counters)}
 
 def check_quota():
     """Check if we have quota available for the current model"""
-    credits = get_credits()
-    if CURRENT_PROVIDER in credits and CURRENT_MODEL in credits[CURRENT_PROVIDER]:
-        model_credits = credits[CURRENT_PROVIDER][CURRENT_MODEL]
-        daily_percentage = model_credits["daily"]["percentage"]
-        monthly_percentage = model_credits["monthly"]["percentage"]
-        
-        if daily_percentage >= 100 or monthly_percentage >= 100:
-            return False
-    return True
+    return quota_ledger.has_quota(CURRENT_PROVIDER, CURRENT_MODEL)
+
+# Provider clients, each with its own connection pool
+PROVIDER_CLIENTS: Dict[str, ProviderClient] = {
+    "gpt_oss": ProviderClient(ProviderConfig(
+        name="gpt_oss",
+        display_name="GPT-OSS",
+        url=GPT_OSS_API_URL,
+        stream_url=GPT_OSS_API_URL,
+        default_model=GPT_OSS_MODEL,
+        api_key=GPT_OSS_API_KEY,
+        placeholder_key="your-gpt-oss-api-key",
+        read_timeout=60.0
+    )),
+    "groq": ProviderClient(ProviderConfig(
+        name="groq",
+        display_name="Groq",
+        url=GROQ_API_URL,
+        stream_url=GROQ_API_URL,
+        default_model="llama3-8b-8192",
+        api_key=GROQ_API_KEY,
+        placeholder_key="your-groq-api-key",
+        read_timeout=30.0
+    )),
+    "gemini": ProviderClient(ProviderConfig(
+        name="gemini",
+        display_name="Gemini",
+        url=GEMINI_API_URL,
+        stream_url=GEMINI_STREAM_API_URL,
+        default_model="gemini-1.5-flash",
+        api_format="gemini",
+        read_timeout=60.0
+    )),
+    "openrouter": ProviderClient(ProviderConfig(
+        name="openrouter",
+        display_name="OpenRouter",
+        url=OPENROUTER_API_URL,
+        stream_url=OPENROUTER_API_URL,
+        default_model="claude-3.5-sonnet",
+        api_key=OPENROUTER_API_KEY,
+        placeholder_key="your-openrouter-api-key",
+        read_timeout=90.0
+    ))
+}
 
-# GPT-OSS-20B API call function
-async def call_gpt_oss_api(prompt: str, agent_role: str = "Assistant", model: str = None) -> str:
-    """Call GPT-OSS-20B API"""
-    if not GPT_OSS_API_KEY or GPT_OSS_API_KEY == "your-gpt-oss-api-key":
-        raise Exception("GPT-OSS API key not configured")
-    
-    session = await get_http_session()
+model_router = AdaptiveRouter(latency_tracker, health_monitor, MODEL_PRICES, ROUTING_STRATEGY)
+
+if PROVIDER_LIMITS_CONFIG:
+    for limited_provider, limits in load_router_limits(PROVIDER_LIMITS_CONFIG).items():
+        PROVIDER_LIMITS.setdefault(limited_provider, {}).update(limits)
+admission_controller = AdmissionController(MAX_CONCURRENT_AI_REQUESTS, PROVIDER_LIMITS)
+
+def estimate_request_tokens(provider: str, prompt: str, agent_role: str) -> int:
+    """Roughly estimate the tokens a request will consume, at about four characters per token"""
+    prompt_chars = sum(len(message["content"]) for message in build_chat_messages(prompt, agent_role))
+    return prompt_chars // 4 + PROVIDER_CLIENTS[provider].config.max_tokens
+
+async def start_provider_clients():
+    """Open and warm every configured provider connection pool"""
+    clients = [client for client in PROVIDER_CLIENTS.values() if client.is_configured()]
+    await asyncio.gather(*(client.warm() for client in clients))
+
+async def close_provider_clients():
+    """Close every provider connection pool"""
+    for client in PROVIDER_CLIENTS.values():
+        await client.close()
+
+# Concurrent identical calls share one in-flight request
+ai_flights = SingleFlight()
+provider_flights = SingleFlight()
+
+def ai_request_key(prompt: str, agent_role: str) -> str:
+    """Get the coalescing key for a routed AI request"""
+    return hashlib.sha256(json.dumps([agent_role, normalize_text(prompt)]).encode("utf-8")).hexdigest()
+
+async def call_provider_api(provider: str, prompt: str, agent_role: str = "Assistant", model: str = None, priority: int = PRIORITY_INTERACTIVE) -> str:
+    """Call a provider, sharing identical in-flight calls; the shared call is charged once when it completes"""
+    model = model or PROVIDER_CLIENTS[provider].config.default_model
+    content, _ = await provider_flights.do(
+        completion_cache_key(provider, model, prompt, agent_role),
+        lambda: execute_provider_call(provider, prompt, agent_role, model, priority)
+    )
+    return content
+
+async def execute_provider_call(provider: str, prompt: str, agent_role: str, model: str, priority: int = PRIORITY_INTERACTIVE) -> str:
+    """Call a provider once admitted, recording its latency and health and charging its usage"""
+    client = PROVIDER_CLIENTS[provider]
+    async with admission_controller.admit(provider, priority, estimate_request_tokens(provider, prompt, agent_role)):
+        content = await execute_admitted_provider_call(client, provider, prompt, agent_role, model)
+    # Charged by the flight itself, so the call is billed once however many callers joined it
+    increment_api_usage(provider, model)
+    return content
+
+async def execute_admitted_provider_call(client: ProviderClient, provider: str, prompt: str, agent_role: str, model: str) -> str:
+    """Call a provider, recording its latency and health"""
+    if not health_monitor.allow_request(provider, model):
+        raise Exception(f"Circuit breaker open for {provider}/{model}")
     
-    headers = {
-        "Authorization": f"Bearer {GPT_OSS_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    started_at = time.monotonic()
+    try:
+        content = await client.complete(prompt, agent_role, model)
+    except asyncio.CancelledError:
+        health_monitor.record_cancelled(provider, model)
+        raise
+    except Exception as e:
+        health_monitor.record_failure(provider, model, getattr(e, "status", None))
+        raise
     
-    data = {
-        "model": model or GPT_OSS_MODEL,
-        "messages": [
-            {"role": "system", "content": f"You are {agent_role}. Provide helpful, accurate, and detailed responses."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 2000,
-        "temperature": 0.7
-    }
+    elapsed = time.monotonic() - started_at
+    latency_tracker.record(provider, model, elapsed)
+    health_monitor.record_success(provider, model, elapsed)
+    return content
+
+async def stream_provider_api(provider: str, prompt: str, agent_role: str = "Assistant", model: str = None, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[str]:
+    """Stream a provider's response deltas once admitted and record usage when the stream completes"""
+    client = PROVIDER_CLIENTS[provider]
+    model = model or client.config.default_model
+    async with admission_controller.admit(provider, priority, estimate_request_tokens(provider, prompt, agent_role)):
+        async with aclosing(stream_admitted_provider_api(client, provider, prompt, agent_role, model)) as deltas:
+            async for delta in deltas:
+                yield delta
+
+async def stream_admitted_provider_api(client: ProviderClient, provider: str, prompt: str, agent_role: str, model: str) -> AsyncIterator[str]:
+    """Stream a provider's response deltas, recording its latency, health and usage"""
+    if not health_monitor.allow_request(provider, model):
+        raise Exception(f"Circuit breaker open for {provider}/{model}")
     
+    started_at = time.monotonic()
     try:
-        async with session.post(GPT_OSS_API_URL, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                content = result["choices"][0]["message"]["content"]
-                increment_api_usage("gpt_oss", model or GPT_OSS_MODEL)
-                return content
-            else:
-                error_text = await response.text()
-                raise Exception(f"GPT-OSS API error: {response.status} - {error_text}")
+        async for delta in client.stream(prompt, agent_role, model):
+            yield delta
+    except (asyncio.CancelledError, GeneratorExit):
+        health_monitor.record_cancelled(provider, model)
+        raise
     except Exception as e:
-        print(f"GPT-OSS API call failed: {e}")
-        raise e
+        health_monitor.record_failure(provider, model, getattr(e, "status", None))
+        raise
+    
+    # Completion time, like non-streamed calls, so hedge delays compare like with like
+    elapsed = time.monotonic() - started_at
+    latency_tracker.record(provider, model, elapsed)
+    health_monitor.record_success(provider, model, elapsed)
+    increment_api_usage(provider, model)
+
+# GPT-OSS-20B API call function
+async def call_gpt_oss_api(prompt: str, agent_role: str = "Assistant", model: str = None) -> str:
+    """Call GPT-OSS-20B API"""
+    return await call_provider_api("gpt_oss", prompt, agent_role, model)
 
 # Other API call functions
 async def call_gemini_api(prompt: str, agent_role: str = "Assistant", model: str = None) -> str:
     """Call Gemini API"""
-    session = await get_http_session()
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "contents": [{
-            "parts": [{"text": f"You are {agent_role}. Provide helpful, accurate, and detailed responses.\n\nUser: {prompt}"}]
-        }],
-        "generationConfig": {
-            "maxOutputTokens": 2000,
-            "temperature": 0.7
-        }
-    }
-    
-    try:
-        async with session.post(GEMINI_API_URL, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                content = result["candidates"][0]["content"]["parts"][0]["text"]
-                increment_api_usage("gemini", model or "gemini-1.5-flash")
-                return content
-            else:
-                error_text = await response.text()
-                raise Exception(f"Gemini API error: {response.status} - {error_text}")
-    except Exception as e:
-        print(f"Gemini API call failed: {e}")
-        raise e
+    return await call_provider_api("gemini", prompt, agent_role, model)
 
 async def call_openrouter_api(prompt: str, agent_role: str = "Assistant", model: str = None) -> str:
     """Call OpenRouter API"""
-    if not OPENROUTER_API_KEY or OPENROUTER_API_KEY == "your-openrouter-api-key":
-        raise Exception("OpenRouter API key not configured")
-    
-    session = await get_http_session()
-    
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": model or "claude-3.5-sonnet",
-        "messages": [
-            {"role": "system", "content": f"You are {agent_role}. Provide helpful, accurate, and detailed responses."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 2000,
-        "temperature": 0.7
-    }
-    
-    try:
-        async with session.post(OPENROUTER_API_URL, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                content = result["choices"][0]["message"]["content"]
-                increment_api_usage("openrouter", model or "claude-3.5-sonnet")
-                return content
-            else:
-                error_text = await response.text()
-                raise Exception(f"OpenRouter API error: {response.status} - {error_text}")
-    except Exception as e:
-        print(f"OpenRouter API call failed: {e}")
-        raise e
+    return await call_provider_api("openrouter", prompt, agent_role, model)
 
 async def call_groq_api(prompt: str, agent_role: str = "Assistant", model: str = None) -> str:
     """Call Groq API"""
-    if not GROQ_API_KEY or GROQ_API_KEY == "your-groq-api-key":
-        raise Exception("Groq API key not configured")
-    
-    session = await get_http_session()
+    return await call_provider_api("groq", prompt, agent_role, model)
+
+def check_model_availability(provider: str, model: str) -> bool:
+    """Check if a model is configured and its circuit breaker admits requests"""
+    client = PROVIDER_CLIENTS.get(provider)
+    if client is None or not client.is_configured():
+        return False
+    return health_monitor.is_available(provider, model)
+
+def get_hedge_delay(provider: str, model: str) -> float:
+    """Get how long to wait on a model before hedging with the next candidate"""
+    if latency_tracker.sample_count(provider, model) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return latency_tracker.percentile(provider, model, HEDGE_PERCENTILE)
+
+async def call_ai_api_hedged(prompt: str, agent_role: str = "Assistant", priority: int = PRIORITY_INTERACTIVE) -> tuple[str, str, str]:
+    """Race candidates from MODEL_SELECTION_RULES, hedging slow calls with the next one.
     
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    A candidate is started when the newest in-flight call exceeds its hedge delay or
+    when every in-flight call has failed. The first success wins and the others are
+    cancelled. Only calls that complete are charged unless HEDGE_CHARGE_ALL_CALLS is set.
+    While requests are queued for admission the delay measures queueing rather than a
+    slow model, so the hedge delay is restarted until the queue has drained.
+    """
+    task_type = analyze_user_command(prompt)
+    candidates = get_candidate_models(prompt) or [("gpt_oss", GPT_OSS_MODEL)]
+    in_flight: Dict[asyncio.Task, tuple[str, str]] = {}
+    started_at: Dict[asyncio.Task, float] = {}
+    owns_flight: Dict[asyncio.Task, bool] = {}
+    next_index = 0
+    hedge_at = 0.0
+    deferred = False
+    last_error = None
     
-    data = {
-        "model": model or "llama3-8b-8192",
-        "messages": [
-            {"role": "system", "content": f"You are {agent_role}. Provide helpful, accurate, and detailed responses."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 2000,
-        "temperature": 0.7
-    }
+    def launch_next():
+        nonlocal next_index, hedge_at
+        provider, model = candidates[next_index]
+        next_index += 1
+        hedge_at = time.monotonic() + get_hedge_delay(provider, model)
+        joined = completion_cache_key(provider, model, prompt, agent_role) in provider_flights.flights
+        task = asyncio.create_task(call_provider_api(provider, prompt, agent_role, model, priority=priority))
+        in_flight[task] = (provider, model)
+        started_at[task] = time.monotonic()
+        owns_flight[task] = not joined
     
+    launch_next()
     try:
-        async with session.post(GROQ_API_URL, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                content = result["choices"][0]["message"]["content"]
-                increment_api_usage("groq", model or "llama3-8b-8192")
-                return content
-            else:
-                error_text = await response.text()
-                raise Exception(f"Groq API error: {response.status} - {error_text}")
-    except Exception as e:
-        print(f"Groq API call failed: {e}")
-        raise e
+        while in_flight:
+            timeout = max(0.0, hedge_at - time.monotonic()) if next_index < len(candidates) else None
+            done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            
+            if not done:
+                # Restart the delay while the queue is non-empty and once more when it is seen drained
+                queued = admission_controller.is_queued([provider for provider, _ in in_flight.values()] + [candidates[next_index][0]])
+                if queued or deferred:
+                    deferred = queued
+                    hedge_at = time.monotonic() + get_hedge_delay(*candidates[next_index - 1])
+                    continue
+                print(f"Hedging slow AI call with {candidates[next_index][0]}/{candidates[next_index][1]}")
+                launch_next()
+                continue
+            
+            for task in done:
+                provider, model = in_flight.pop(task)
+                if task.exception() is None:
+                    model_router.record_outcome(task_type, provider, model, True, time.monotonic() - started_at[task])
+                    return task.result(), provider, model
+                model_router.record_outcome(task_type, provider, model, False)
+                last_error = task.exception()
+                print(f"Hedged call to {provider}/{model} failed: {last_error}")
+            
+            if not in_flight and next_index < len(candidates):
+                launch_next()
+    finally:
+        for task, (provider, model) in in_flight.items():
+            task.cancel()
+            # A cancelled loser was at least this slow; recording it keeps slow models from looking unsampled.
+            # A call that joined an earlier flight started the provider call before started_at, so it is skipped.
+            if owns_flight[task]:
+                latency_tracker.record(provider, model, time.monotonic() - started_at[task])
+            if HEDGE_CHARGE_ALL_CALLS:
+                increment_api_usage(provider, model)
+    
+    raise Exception(f"All AI providers failed. Last error: {last_error}")
+
+def completion_cache_key(provider: str, model: str, prompt: str, agent_role: str) -> str:
+    """Get the completion cache key for a prompt sent to a specific model"""
+    config = PROVIDER_CLIENTS[provider].config
+    return CompletionCache.make_key(provider, model, build_chat_messages(prompt, agent_role), config.temperature, config.max_tokens)
+
+async def get_cached_completion(prompt: str, agent_role: str) -> Optional[tuple[str, str, str]]:
+    """Look up a cached completion from any model the task could be routed to"""
+    rule = MODEL_SELECTION_RULES.get(analyze_user_command(prompt), MODEL_SELECTION_RULES["default"])
+    candidates = list(zip(rule["providers"], rule["models"]))
+    found = await completion_cache.get_first([completion_cache_key(provider, model, prompt, agent_role) for provider, model in candidates])
+    if found is None:
+        return None
+    index, response = found
+    return response, candidates[index][0], candidates[index][1]
 
-def check_model_availability(provider: str, model: str) -> bool:
-    """Check if a model is available (simplified check)"""
-    # For now, assume all models are available
-    # In a real implementation, you would check quotas, API status, etc.
-    return True
+def cache_bypass_requested(request: Request) -> bool:
+    """Check whether a request asked to skip the completion cache"""
+    if request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in request.headers.get("cache-control", "").lower()
 
 # Main AI API call function
-async def call_ai_api(prompt: str, agent_role: str = "Assistant", agent_name: Optional[str] = None) -> tuple[str, str, str]:
-    """Main function to call AI APIs with fallback logic"""
+async def call_ai_api(prompt: str, agent_role: str = "Assistant", agent_name: Optional[str] = None, use_cache: bool = True, priority: int = PRIORITY_INTERACTIVE) -> tuple[str, str, str]:
+    """Main function to call AI APIs with caching and fallback logic"""
+    
+    # Cache hits cost nothing, so they are served before the quota check
+    if use_cache and COMPLETION_CACHE_ENABLED:
+        cached = await get_cached_completion(prompt, agent_role)
+        if cached is not None:
+            return cached
+    
+    result, _ = await ai_flights.do(ai_request_key(prompt, agent_role), lambda: execute_ai_call(prompt, agent_role, priority))
+    return result
+
+async def execute_ai_call(prompt: str, agent_role: str = "Assistant", priority: int = PRIORITY_INTERACTIVE) -> tuple[str, str, str]:
+    """Route a prompt to a provider and cache the completion"""
     
     # Check quota first
     if not check_quota():
         raise Exception("API quota limit reached for the current model")
     
-    # Try GPT-OSS-20B first (primary model)
+    if HEDGING_ENABLED and AUTO_MODE_ENABLED:
+        response, provider, model = await call_ai_api_hedged(prompt, agent_role, priority)
+    else:
+        response, provider, model = await call_ai_api_sequential(prompt, agent_role, priority)
+    
+    if COMPLETION_CACHE_ENABLED and response:
+        await completion_cache.set(completion_cache_key(provider, model, prompt, agent_role), response)
+    return response, provider, model
+
+async def call_ai_api_sequential(prompt: str, agent_role: str = "Assistant", priority: int = PRIORITY_INTERACTIVE) -> tuple[str, str, str]:
+    """Try GPT-OSS-20B, then each other available candidate for the task in ranked order"""
+    primary = ("gpt_oss", GPT_OSS_MODEL)
     try:
-        response = await call_gpt_oss_api(prompt, agent_role, GPT_OSS_MODEL)
+        response = await call_provider_api("gpt_oss", prompt, agent_role, GPT_OSS_MODEL, priority=priority)
         return response, "gpt_oss", GPT_OSS_MODEL
     except Exception as e:
         print(f"GPT-OSS-20B failed: {e}")
-        
-        # Fallback to auto mode
-        if AUTO_MODE_ENABLED:
+        last_error = e
+    
+    # Fall back through the routed candidates, whichever of them the router ranked first
+    if AUTO_MODE_ENABLED:
+        for provider, model in get_candidate_models(prompt):
+            if (provider, model) == primary:
+                continue
             try:
-                provider, model = get_best_model_for_task(prompt)
-                if provider == "gpt_oss":
-                    # Try other models
-                    for fallback_provider, fallback_model in [("groq", "llama3-8b-8192"), ("gemini", "gemini-1.5-flash"), ("openrouter", "claude-3.5-sonnet")]:
-                        try:
-                            if fallback_provider == "groq":
-                                response = await call_groq_api(prompt, agent_role, fallback_model)
-                                return response, fallback_provider, fallback_model
-                            elif fallback_provider == "gemini":
-                                response = await call_gemini_api(prompt, agent_role, fallback_model)
-                                return response, fallback_provider, fallback_model
-                            elif fallback_provider == "openrouter":
-                                response = await call_openrouter_api(prompt, agent_role, fallback_model)
-                                return response, fallback_provider, fallback_model
-                        except Exception as fallback_error:
-                            print(f"Fallback {fallback_provider} failed: {fallback_error}")
-                            continue
-            except Exception as auto_error:
-                print(f"Auto mode failed: {auto_error}")
-        
-        # Final fallback
-        raise Exception(f"All AI providers failed. Last error: {e}")
+                response = await call_provider_api(provider, prompt, agent_role, model, priority=priority)
+                return response, provider, model
+            except Exception as fallback_error:
+                print(f"Fallback {provider}/{model} failed: {fallback_error}")
+                last_error = fallback_error
+    
+    raise Exception(f"All AI providers failed. Last error: {last_error}")
 
-# API usage tracking
-def increment_api_usage(provider: str, model: str):
-    """Increment API usage for a provider and model"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+# Main streaming AI API call function
+async def stream_ai_api(prompt: str, agent_role: str = "Assistant", use_cache: bool = True, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+    """Stream an AI response, sharing one upstream stream between identical concurrent requests"""
+    async for event in ai_flights.stream(ai_request_key(prompt, agent_role), lambda: execute_ai_stream(prompt, agent_role, use_cache, priority)):
+        yield event
+
+async def execute_ai_stream(prompt: str, agent_role: str = "Assistant", use_cache: bool = True, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+    """Stream an AI response, falling back to the next provider until one produces output.
     
-    # Get current date
-    today = datetime.now().strftime('%Y-%m-%d')
-    current_month = datetime.now().strftime('%Y-%m')
+    Yields a "start" event naming the provider and model, then "delta" events with
+    content fragments. Once a provider has streamed any content it is committed to,
+    so a mid-stream failure is raised rather than restarted elsewhere.
+    """
     
-    # Update or insert usage
-    cursor.execute('''
-        INSERT OR REPLACE INTO api_usage (provider, model, daily_used, monthly_used, last_used)
-        VALUES (
-            ?, ?, 
-            COALESCE((SELECT daily_used FROM api_usage WHERE provider = ? AND model = ?), 0) + 1,
-            COALESCE((SELECT monthly_used FROM api_usage WHERE provider = ? AND model = ?), 0) + 1,
-            CURRENT_TIMESTAMP
-        )
-    ''', (provider, model, provider, model, provider, model))
+    if use_cache and COMPLETION_CACHE_ENABLED:
+        cached = await get_cached_completion(prompt, agent_role)
+        if cached is not None:
+            response, provider, model = cached
+            yield {"type": "start", "provider": provider, "model": model, "cached": True}
+            yield {"type": "delta", "content": response}
+            return
+    
+    # Check quota first
+    if not check_quota():
+        raise Exception("API quota limit reached for the current model")
+    
+    task_type = analyze_user_command(prompt)
+    candidates = [("gpt_oss", GPT_OSS_MODEL)]
+    if AUTO_MODE_ENABLED:
+        candidates = get_candidate_models(prompt) or candidates
+    
+    last_error = None
+    for provider, model in candidates:
+        if not check_model_availability(provider, model):
+            continue
+        started = False
+        started_at = time.monotonic()
+        parts = []
+        try:
+            async for delta in stream_provider_api(provider, prompt, agent_role, model, priority):
+                if not started:
+                    started = True
+                    yield {"type": "start", "provider": provider, "model": model}
+                parts.append(delta)
+                yield {"type": "delta", "content": delta}
+            if not started:
+                yield {"type": "start", "provider": provider, "model": model}
+            model_router.record_outcome(task_type, provider, model, True, time.monotonic() - started_at)
+            if COMPLETION_CACHE_ENABLED and parts:
+                await completion_cache.set(completion_cache_key(provider, model, prompt, agent_role), "".join(parts))
+            return
+        except Exception as e:
+            model_router.record_outcome(task_type, provider, model, False)
+            if started:
+                raise
+            print(f"Streaming {provider} failed: {e}")
+            last_error = e
     
-    conn.commit()
+    raise Exception(f"All AI providers failed. Last error: {last_error}")
+
+async def stream_chat_events(message: str, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """Run a streamed chat exchange, persisting the result once the stream ends.
+    
+    Connected WebSocket clients are sent the outcome once, as a chat_done event
+    carrying the whole response or a chat_error event, rather than every delta.
+    """
+    stream_id = str(uuid.uuid4())
+    await save_message("User", message, "👤", False, "user")
+    
+    parts = []
+    provider = model = None
+    try:
+        async for event in stream_ai_api(message, use_cache=use_cache):
+            if event["type"] == "start":
+                provider, model = event["provider"], event["model"]
+            else:
+                parts.append(event["content"])
+            yield {**event, "stream_id": stream_id}
+    except Exception as ai_error:
+        error_message = f"AI service error: {str(ai_error)}"
+        await save_message("System", error_message, "⚠️", False, "system", 0, True, "ai_error")
+        event = {"type": "error", "stream_id": stream_id, "error": error_message}
+        await websocket_manager.broadcast({**event, "type": "chat_error"})
+        yield event
+        return
+    
+    response = "".join(parts)
+    files_created = extract_and_create_files(response)
+    await save_message("AI Assistant", response, "🤖", False, "assistant")
+    
+    event = {
+        "type": "done",
+        "stream_id": stream_id,
+        "provider": provider,
+        "model": model,
+        "files_created": files_created
+    }
+    await websocket_manager.broadcast({**event, "type": "chat_done", "response": response})
+    yield event
+
+# API usage tracking
+def increment_api_usage(provider: str, model: str):
+    """Increment API usage for a provider and model"""
+    quota_ledger.increment(provider, model)
 
 # File processing functions
 def extract_and_create_files(ai_response: str) -> list:
@@ -643,16 +870,27 @@ def extract_and_create_files(ai_response: str) -> list:
     
     for file_type, filename, content in code_blocks:
         try:
-            file_path = os.path.join(WORK_DIR, filename)
+            file_path = resolve_workspace_path(filename.strip())
+            if file_path is None:
+                print(f"Skipping file outside the workspace: {filename}")
+                continue
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
             with open(file_path, 'w', encoding='utf-8') as f:
                 f.write(content.strip())
             
+            relative_path = os.path.relpath(file_path, os.path.realpath(WORK_DIR))
+            workspace_index.record_write(file_path)
+            stat = os.stat(file_path)
+            search_index.queue_document(
+                SOURCE_WORKSPACE, relative_path, os.path.basename(file_path), content.strip(),
+                mtime=stat.st_mtime, size=stat.st_size
+            )
+            
             files_created.append({
                 "name": filename,
                 "type": file_type,
-                "path": file_path
+                "path": os.path.join(WORK_DIR, relative_path)
             })
         except Exception as e:
             print(f"Error creating file {filename}: {e}")
@@ -699,6 +937,9 @@ def get_file_icon_from_type(file_type: str) -> str:
     
     return icons.get(file_type, '📄')
 
+# Every workspace file, kept current by write hooks and filesystem events
+workspace_index = WorkspaceIndex(WORK_DIR, get_file_type_from_name, get_file_icon_from_type)
+
 # FastAPI app setup
 app = FastAPI(title="Sumeru AI Platform", version="1.0.0")
 
@@ -715,12 +956,36 @@ app.add_middleware(
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    init_db()
+    db.start()
+    await db.run_write(init_db)
+    # init_db is the only writer of team_members; a restart within one process must not serve the old rows
+    team_cache.invalidate_tags("team")
+    await quota_ledger.load()
+    quota_flusher = asyncio.create_task(quota_ledger.run(QUOTA_FLUSH_INTERVAL))
+    await search_index.start(db)
+    # Artifact owners live in memory, so references left in the index by an earlier run are dropped
+    await asyncio.to_thread(artifact_store.reconcile, metagpt_integration.content_references())
+    await asyncio.to_thread(workspace_index.build)
+    workspace_index.start_watching()
+    await search_index.sync_workspace(WORK_DIR)
+    search_flusher = asyncio.create_task(search_index.run(SEARCH_FLUSH_INTERVAL))
+    maintenance_task = asyncio.create_task(retention_manager.run(MAINTENANCE_INTERVAL))
+    await start_provider_clients()
     print("🚀 Sumeru AI Platform started")
     yield
     # Shutdown
-    await close_http_session()
-    close_db_connections()
+    quota_flusher.cancel()
+    search_flusher.cancel()
+    maintenance_task.cancel()
+    workspace_index.stop_watching()
+    await quota_ledger.flush()
+    await search_index.flush()
+    if event_spill is not None:
+        await asyncio.to_thread(event_spill.flush)
+    await close_provider_clients()
+    completion_cache.close()
+    websocket_manager.fanout.close_all()
+    db.close()
     print("🛑 Sumeru AI Platform stopped")
 
 app = FastAPI(lifespan=lifespan)
@@ -774,9 +1039,41 @@ async def health_check():
     return {"status": "healthy", "primary_model": GPT_OSS_MODEL}
 
 @app.get("/api/chat/messages")
-async def get_chat_messages():
-    messages = get_messages()
-    return {"messages": messages}
+async def get_chat_messages(limit: int = 50, before_id: Optional[int] = None, after_id: Optional[int] = None,
+                            message_type: Optional[str] = None):
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX))
+    messages = await get_messages(limit + 1, before_id, after_id, message_type)
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if after_id is not None and before_id is None:
+        # Delta mode: next_cursor is the after_id for the next poll
+        next_cursor = messages[-1]["id"] if messages else after_id
+        messages.reverse()
+    else:
+        # Paging back: next_cursor is the before_id for the next older page
+        next_cursor = messages[-1]["id"] if has_more else None
+    return {"messages": messages, "next_cursor": next_cursor, "has_more": has_more}
+
+@app.get("/api/search")
+async def search(q: str, scope: str = "all", limit: int = 20, offset: int = 0):
+    if scope not in ("all", "messages", "files"):
+        raise HTTPException(status_code=400, detail="scope must be one of: all, messages, files")
+    if not search_index.available:
+        raise HTTPException(status_code=503, detail="Search is not available on this server")
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX))
+    offset = max(0, offset)
+
+    results: Dict[str, Any] = {"query": q, "limit": limit, "offset": offset}
+    # Each scope is paged independently; one extra row tells whether another page exists
+    if scope in ("all", "messages"):
+        messages = await search_index.search_messages(q, limit + 1, offset)
+        results["messages"] = messages[:limit]
+        results["messages_has_more"] = len(messages) > limit
+    if scope in ("all", "files"):
+        files = await search_index.search_documents(q, limit + 1, offset)
+        results["files"] = files[:limit]
+        results["files_has_more"] = len(files) > limit
+    return results
 
 @app.post("/api/chat/send")
 async def send_chat_message(request: Request):
@@ -791,17 +1088,17 @@ async def send_chat_message(request: Request):
             raise HTTPException(status_code=400, detail="Message too long (max 2000 characters)")
         
         # Save user message
-        save_message("User", message, "👤", False, "user")
+        await save_message("User", message, "👤", False, "user")
         
         # Get AI response
         try:
-            response, provider, model = await call_ai_api(message)
+            response, provider, model = await call_ai_api(message, use_cache=not cache_bypass_requested(request))
             
             # Extract and create files if any
             files_created = extract_and_create_files(response)
             
             # Save AI response
-            save_message("AI Assistant", response, "🤖", False, "assistant")
+            await save_message("AI Assistant", response, "🤖", False, "assistant")
             
             return {
                 "success": True,
@@ -813,27 +1110,140 @@ async def send_chat_message(request: Request):
             
         except Exception as ai_error:
             error_message = f"AI service error: {str(ai_error)}"
-            save_message("System", error_message, "⚠️", False, "system", 0, True, "ai_error")
+            await save_message("System", error_message, "⚠️", False, "system", 0, True, "ai_error")
             raise HTTPException(status_code=500, detail=error_message)
             
     except HTTPException:
         raise
     except Exception as e:
         error_message = f"Server error: {str(e)}"
-        save_message("System", error_message, "⚠️", False, "system", 0, True, "server_error")
+        await save_message("System", error_message, "⚠️", False, "system", 0, True, "server_error")
         raise HTTPException(status_code=500, detail=error_message)
 
+@app.post("/api/chat/stream")
+async def stream_chat_message(request: Request):
+    data = await request.json()
+    message = data.get("message", "").strip()
+    
+    if not message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    if len(message) > 2000:
+        raise HTTPException(status_code=400, detail="Message too long (max 2000 characters)")
+    
+    use_cache = not cache_bypass_requested(request)
+    
+    async def event_stream():
+        async for event in stream_chat_events(message, use_cache):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/team")
 async def get_team_members_endpoint():
-    members = get_team_members_optimized()
+    members = await get_team_members_optimized()
     return {"members": members}
 
 @app.get("/api/files")
-async def get_files_endpoint():
-    files = get_files_optimized()
-    return {"files": files}
+async def get_files_endpoint(prefix: str = "", type: Optional[str] = None, limit: Optional[int] = None, offset: int = 0):
+    if limit is not None:
+        limit = max(1, limit)
+    return workspace_index.list_files(prefix, type, limit, max(0, offset))
+
+@app.get("/api/workspace/stats")
+async def get_workspace_stats(prefix: str = ""):
+    return {"directories": workspace_index.get_directory_stats(prefix)}
+
+@app.get("/api/download/{filename:path}")
+async def download_file(filename: str, request: Request, inline: bool = False):
+    file_path = resolve_workspace_path(filename)
+    try:
+        stat = os.stat(file_path) if file_path is not None else None
+    except OSError:
+        stat = None
+    if stat is None or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = file_etag(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "no-cache"
+    }
+    if is_not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    # FileResponse streams the file (or sendfile/pathsend where the server supports it) and serves Range requests
+    return FileResponse(
+        file_path,
+        headers=headers,
+        filename=os.path.basename(file_path),
+        content_disposition_type="inline" if inline else "attachment",
+        stat_result=stat
+    )
 
-@app.get("/api/files/{filename}")
+async def zip_response(entries: List[ZipEntry], archive_name: str, request: Request, compression: str):
+    """Stream a ZIP of entries, or serve the cached copy when one exists or a Range is requested"""
+    if compression not in COMPRESSION_METHODS:
+        raise HTTPException(status_code=400, detail=f"compression must be one of: {', '.join(COMPRESSION_METHODS)}")
+    if not entries:
+        raise HTTPException(status_code=404, detail="Nothing to export")
+
+    key = fingerprint(entries, compression)
+    cached_path = export_cache.get(key)
+    if cached_path is None and "range" in request.headers:
+        # Resuming needs a stable byte sequence, so finish the archive before serving part of it
+        cached_path = await export_cache.build(key, stream_zip(entries, compression))
+    etag = f'"{key[:32]}"'
+    if cached_path is not None:
+        if is_not_modified(request, etag, os.path.getmtime(cached_path)):
+            return Response(status_code=304, headers={"ETag": etag})
+        return FileResponse(cached_path, headers={"ETag": etag}, filename=archive_name, media_type="application/zip")
+
+    return StreamingResponse(
+        export_cache.tee(key, stream_zip(entries, compression)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}"', "ETag": etag}
+    )
+
+@app.get("/api/export/workspace/{directory:path}")
+async def export_workspace_directory(directory: str, request: Request, compression: str = "deflate"):
+    root = resolve_workspace_path(directory)
+    if root is None or not os.path.isdir(root):
+        raise HTTPException(status_code=404, detail="Directory not found")
+    if not workspace_index.watching:
+        # Without filesystem events the index misses files written outside the write hooks
+        entries = await asyncio.to_thread(directory_entries, root)
+        return await zip_response(entries, f"{os.path.basename(root)}.zip", request, compression)
+    prefix = os.path.relpath(root, os.path.realpath(WORK_DIR)) + os.sep
+    entries = []
+    for listed in workspace_index.list_files(prefix=prefix)["files"]:
+        name = listed["path"][len(prefix):]
+        try:
+            entries.append(file_entry(os.path.join(root, name), name))
+        except OSError:
+            continue  # deleted since it was indexed
+    return await zip_response(entries, f"{os.path.basename(root)}.zip", request, compression)
+
+@app.get("/api/export/tasks/{task_id}")
+async def export_task_files(task_id: str, request: Request, compression: str = "deflate"):
+    # Agent file contents live in the artifact store; each is read only when the archive reaches it
+    entries = [
+        loaded_entry(
+            file_info["name"],
+            file_info.get("size", 0),
+            datetime.fromisoformat(file_info["created_at"]).timestamp(),
+            lambda digest=file_info["content_hash"]: artifact_store.get(digest),
+            version=file_info["content_hash"]
+        )
+        for file_info in metagpt_integration.get_agent_files(task_id)
+    ]
+    return await zip_response(entries, f"{task_id}.zip", request, compression)
+
+@app.get("/api/files/{filename:path}")
 async def get_file_content_endpoint(filename: str):
     content = get_file_content(filename)
     if content is None:
@@ -879,6 +1289,61 @@ async def change_model(model_request: dict):
         "message": f"Model changed to {model} ({provider})"
     }
 
+@app.get("/api/providers/health")
+async def get_providers_health():
+    return {
+        "providers": health_monitor.snapshot(),
+        "latency": latency_tracker.snapshot()
+    }
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    return admission_controller.snapshot()
+
+@app.get("/api/database/stats")
+async def get_database_stats():
+    return db.get_stats()
+
+@app.get("/api/maintenance/stats")
+async def get_maintenance_stats():
+    return retention_manager.get_stats()
+
+@app.post("/api/maintenance/run")
+async def run_maintenance():
+    report = await retention_manager.run_once()
+    return {"success": not report.errors, "report": asdict(report)}
+
+@app.get("/api/websocket/stats")
+async def get_websocket_stats():
+    return websocket_manager.get_connection_stats()
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return result_cache.get_all_stats()
+
+@app.get("/api/routing/decisions")
+async def get_routing_decisions(limit: int = 20):
+    return {
+        "strategy": model_router.strategy,
+        "decisions": model_router.get_recent_decisions(limit),
+        "bandit": model_router.get_bandit_stats()
+    }
+
+@app.get("/api/cache/completions")
+async def get_completion_cache_stats():
+    return {
+        **completion_cache.get_stats(),
+        "coalescing": {
+            "ai": ai_flights.get_stats(),
+            "providers": provider_flights.get_stats()
+        }
+    }
+
+@app.delete("/api/cache/completions")
+async def clear_completion_cache():
+    await completion_cache.clear()
+    return {"success": True, "message": "Completion cache cleared"}
+
 @app.get("/api/models/available")
 async def get_available_models():
     return {
@@ -913,13 +1378,52 @@ async def get_available_models():
 # WebSocket endpoint
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    # Clients may subscribe up front with ?topics=workflow:<id>,agent:<role>,type:<message type>
+    topics = [topic for topic in websocket.query_params.get("topics", "").split(",") if topic]
+    # A reconnecting client passes ?last_seq=<seq of the last message it received> to get what it missed
+    last_seq = websocket.query_params.get("last_seq", "")
+    await websocket.accept()
+    await websocket_manager.connect(websocket, topics, int(last_seq) if last_seq.lstrip("-").isdigit() else None)
     try:
         while True:
             data = await websocket.receive_text()
-            await manager.send_personal_message(f"Message: {data}", websocket)
+            try:
+                control = json.loads(data)
+            except ValueError:
+                control = None
+            if isinstance(control, dict) and await websocket_manager.handle_client_message(websocket, control):
+                continue
+            websocket_manager.fanout.send_to(websocket, f"Message: {data}")
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        await websocket_manager.disconnect(websocket)
+
+@app.websocket("/ws/chat")
+async def chat_websocket_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                data = None
+            if not isinstance(data, dict):
+                await websocket.send_json({"type": "error", "error": "Expected a JSON object with a message"})
+                continue
+            message = data.get("message")
+            message = message.strip() if isinstance(message, str) else ""
+            
+            if not message or len(message) > 2000:
+                await websocket.send_json({"type": "error", "error": "Message must be between 1 and 2000 characters"})
+                continue
+            
+            async for event in stream_chat_events(message, not data.get("no_cache", False)):
+                await websocket.send_json(event)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Request Coalescing for Sumeru AI Platform
+
+This module deduplicates concurrent identical work: callers that ask for the
+same key while a call is in flight await that call instead of starting their
+own. Both plain coroutines and async generators (streams) are supported.
+"""
+
+import asyncio
+from typing import Dict, List, Any, AsyncIterator, Awaitable, Callable, Tuple
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class _SharedStream:
+    def __init__(self, factory: Callable[[], AsyncIterator[Any]]):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: BaseException = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(factory))
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def _pump(self, factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for item in factory():
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError as e:
+            self.error = e
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Replay everything produced so far, then follow the live stream"""
+        index = 0
+        self.subscribers += 1
+        try:
+            while True:
+                while index < len(self.items):
+                    yield self.items[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self.changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.task.cancel()
+
+class SingleFlight:
+    def __init__(self):
+        self.flights: Dict[str, _Flight] = {}
+        self.streams: Dict[str, _SharedStream] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "streams": 0, "coalesced_streams": 0}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run func once per key at a time and return (result, shared).
+
+        shared is False for the caller that started the work. The work is
+        cancelled only when every caller waiting on it has been cancelled.
+        """
+        flight = self.flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["calls"] += 1
+            flight = _Flight(asyncio.ensure_future(func()))
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._forget(self.flights, key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+            raise
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Share one underlying stream between every concurrent subscriber to key"""
+        shared = self.streams.get(key)
+        if shared is None or shared.done:
+            self.stats["streams"] += 1
+            shared = _SharedStream(factory)
+            self.streams[key] = shared
+            shared.task.add_done_callback(lambda task: self._forget(self.streams, key, shared))
+        else:
+            self.stats["coalesced_streams"] += 1
+
+        async for item in shared.subscribe():
+            yield item
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, entry: Any):
+        if registry.get(key) is entry:
+            del registry[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get call counts and how many were served by an in-flight call"""
+        return {**self.stats, "in_flight": len(self.flights), "in_flight_streams": len(self.streams)}
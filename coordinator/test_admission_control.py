@@ -0,0 +1,75 @@
+"""
+Tests for the priority gates in admission_control.py
+"""
+
+import asyncio
+
+from admission_control import AdmissionController, PrioritySemaphore
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def run():
+        gate = PrioritySemaphore(1)
+        await gate.acquire()
+        order = []
+
+        async def waiter(name, priority):
+            await gate.acquire(priority)
+            order.append(name)
+            gate.release()
+
+        tasks = [asyncio.create_task(waiter(name, priority)) for name, priority in [("late", 5), ("first", 0), ("second", 0)]]
+        await asyncio.sleep(0)
+        gate.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["first", "second", "late"]
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        gate = PrioritySemaphore(1)
+        await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        gate.release()
+        return gate.in_use, gate.queue_depth
+
+    assert asyncio.run(run()) == (0, 0)
+
+def test_is_queued_reports_global_and_provider_backlogs():
+    async def run():
+        controller = AdmissionController(2, {"groq": {"max_concurrency": 1}})
+        release = asyncio.Event()
+
+        async def hold(provider):
+            async with controller.admit(provider):
+                await release.wait()
+
+        first = asyncio.create_task(hold("groq"))
+        second = asyncio.create_task(hold("groq"))
+        await asyncio.sleep(0)
+        queued = (controller.is_queued(["groq"]), controller.is_queued(["gemini"]))
+        release.set()
+        await asyncio.gather(first, second)
+        return queued, controller.is_queued(["groq"])
+
+    assert asyncio.run(run()) == ((True, False), False)
+
+def test_rate_limited_provider_does_not_hold_global_slots():
+    async def run():
+        controller = AdmissionController(1, {"groq": {"rpm": 1}})
+        async with controller.admit("groq"):
+            pass
+        # groq's bucket is now empty; its next request waits about a minute
+        limited = asyncio.create_task(controller.admit("groq").__aenter__())
+        await asyncio.sleep(0.01)
+        held_global = controller.global_gate.in_use
+        async with controller.admit("gemini"):
+            admitted = True
+        limited.cancel()
+        await asyncio.gather(limited, return_exceptions=True)
+        return held_global, admitted, controller.provider_gates["groq"].in_use
+
+    assert asyncio.run(asyncio.wait_for(run(), 5)) == (0, True, 0)
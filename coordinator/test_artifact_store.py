@@ -0,0 +1,74 @@
+"""
+Tests for the content-addressed artifact store in artifact_store.py
+"""
+
+import os
+
+from artifact_store import ArtifactStore, COMPRESSION_NONE
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    first = store.put("hello world")
+    second = store.put(b"hello world")
+    assert first == second
+    assert store.get_info(first).refcount == 2
+    assert store.get_stats()["blobs"] == 1
+    assert store.get_stats()["deduplicated"] == 1
+    assert store.get_text(first) == "hello world"
+    store.close()
+
+def test_blob_is_deleted_with_its_last_reference(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    digest = store.put("content")
+    store.put("content")
+    assert store.release(digest) is False
+    assert os.path.exists(store.path_for(digest))
+    assert store.release(digest) is True
+    assert not os.path.exists(store.path_for(digest))
+    assert store.get(digest) is None
+    assert store.get_info(digest) is None
+    # Releasing past zero is a no-op
+    assert store.release(digest) is False
+    store.close()
+
+def test_large_content_round_trips(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    content = "line of generated code\n" * 1000
+    digest = store.put(content)
+    info = store.get_info(digest)
+    assert info.size == len(content)
+    assert store.get_text(digest) == content
+    if info.compression == COMPRESSION_NONE:
+        assert info.stored_size == info.size
+    else:
+        assert info.stored_size < info.size
+    store.close()
+
+def test_stats_count_references_and_saved_bytes(tmp_path):
+    store = ArtifactStore(str(tmp_path), compression=COMPRESSION_NONE)
+    store.put("a" * 100)
+    store.put("a" * 100)
+    store.put("b" * 50)
+    stats = store.get_stats()
+    assert stats["references"] == 3
+    assert stats["logical_bytes"] == 250
+    assert stats["stored_bytes"] == 150
+    assert stats["saved_bytes"] == 100
+    store.close()
+
+def test_reconcile_rebuilds_refcounts_and_deletes_unowned_blobs(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    kept = store.put("kept")
+    store.put("kept")
+    store.put("kept")
+    orphan = store.put("orphan")
+    store.close()
+
+    # After a restart only one owner of "kept" is still alive
+    store = ArtifactStore(str(tmp_path))
+    assert store.reconcile({kept: 1}) == 1
+    assert store.get_info(kept).refcount == 1
+    assert store.get_info(orphan) is None
+    assert not os.path.exists(store.path_for(orphan))
+    assert store.release(kept) is True
+    store.close()
@@ -0,0 +1,53 @@
+"""
+Tests for keyset paging of /api/chat/messages in server.py
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with TestClient(server.app) as client:
+        client.portal.call(server.save_message, "System", "anchor", "⚙️", False, "system")
+        client.start_id = client.get("/api/chat/messages", params={"limit": 1}).json()["messages"][0]["id"]
+        # Saved within the same second, so only the id orders them
+        for i in range(5):
+            client.portal.call(server.save_message, "User", f"message {i}", "👤", False, "user" if i % 2 else "assistant")
+        yield client
+
+def texts(page):
+    return [message["message"] for message in page["messages"]]
+
+def test_pages_back_newest_first_without_gaps(client):
+    first = client.get("/api/chat/messages", params={"limit": 2}).json()
+    assert texts(first) == ["message 4", "message 3"]
+    assert first["has_more"]
+    second = client.get("/api/chat/messages", params={"limit": 2, "before_id": first["next_cursor"]}).json()
+    assert texts(second) == ["message 2", "message 1"]
+
+def test_after_id_returns_the_next_messages_and_a_cursor_to_poll_from(client):
+    page = client.get("/api/chat/messages", params={"after_id": client.start_id, "limit": 2}).json()
+    assert texts(page) == ["message 1", "message 0"]
+    assert page["has_more"]
+    page = client.get("/api/chat/messages", params={"after_id": page["next_cursor"]}).json()
+    assert texts(page) == ["message 4", "message 3", "message 2"]
+    assert not page["has_more"]
+    idle = client.get("/api/chat/messages", params={"after_id": page["next_cursor"]}).json()
+    assert idle == {"messages": [], "next_cursor": page["next_cursor"], "has_more": False}
+
+def test_cursor_combines_with_a_type_filter(client):
+    page = client.get("/api/chat/messages", params={"message_type": "user", "after_id": client.start_id}).json()
+    assert texts(page) == ["message 3", "message 1"]
+
+def test_cursors_whose_rows_were_deleted_keep_paging(client):
+    first = client.get("/api/chat/messages", params={"limit": 2}).json()
+    poll = client.get("/api/chat/messages", params={"after_id": client.start_id, "limit": 2}).json()
+    # Retention archives or prunes the rows both cursors point at
+    client.portal.call(server.db.execute, "DELETE FROM messages WHERE id IN (?, ?)", (first["next_cursor"], poll["next_cursor"]))
+    older = client.get("/api/chat/messages", params={"limit": 2, "before_id": first["next_cursor"]}).json()
+    assert texts(older) == ["message 2", "message 0"]
+    newer = client.get("/api/chat/messages", params={"after_id": poll["next_cursor"]}).json()
+    assert texts(newer) == ["message 4", "message 2"]
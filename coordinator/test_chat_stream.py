@@ -0,0 +1,81 @@
+"""
+Tests for streamed chat over SSE (/api/chat/stream) and WebSocket (/ws/chat) in server.py
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def fake_stream(prompt, agent_role="Assistant", use_cache=True, priority=0):
+        if prompt == "fail":
+            raise RuntimeError("provider down")
+        yield {"type": "start", "provider": "groq", "model": "m"}
+        for word in ("Hello", " ", "world"):
+            yield {"type": "delta", "content": word}
+
+    monkeypatch.setattr(server, "stream_ai_api", fake_stream)
+    with TestClient(server.app) as client:
+        yield client
+
+def parse_sse(text):
+    events = []
+    for frame in text.split("\n\n"):
+        if not frame:
+            continue
+        lines = frame.split("\n")
+        assert lines[0].startswith("event: ") and lines[1].startswith("data: ")
+        data = json.loads(lines[1][len("data: "):])
+        assert lines[0][len("event: "):] == data["type"]
+        events.append(data)
+    return events
+
+def test_sse_frames_start_deltas_and_done(client):
+    response = client.post("/api/chat/stream", json={"message": "hi"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [event["type"] for event in events] == ["start", "delta", "delta", "delta", "done"]
+    assert len({event["stream_id"] for event in events}) == 1
+    assert "".join(event["content"] for event in events if event["type"] == "delta") == "Hello world"
+    assert (events[-1]["provider"], events[-1]["model"], events[-1]["files_created"]) == ("groq", "m", [])
+    saved = client.get("/api/chat/messages", params={"limit": 2}).json()["messages"]
+    assert [(m["sender"], m["message"]) for m in saved] == [("AI Assistant", "Hello world"), ("User", "hi")]
+
+def test_sse_reports_provider_failure_as_an_error_event(client):
+    events = parse_sse(client.post("/api/chat/stream", json={"message": "fail"}).text)
+    assert [event["type"] for event in events] == ["error"]
+    assert "provider down" in events[0]["error"]
+
+@pytest.mark.parametrize("body", [{}, {"message": "   "}, {"message": "x" * 2001}])
+def test_sse_rejects_empty_or_long_messages(client, body):
+    assert client.post("/api/chat/stream", json=body).status_code == 400
+
+def test_ws_clients_get_one_summary_per_exchange(client):
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_json()["type"] == "current_state"
+        client.post("/api/chat/stream", json={"message": "hi"})
+        client.post("/api/chat/stream", json={"message": "fail"})
+        done = ws.receive_json()
+        assert (done["type"], done["response"], done["provider"]) == ("chat_done", "Hello world", "groq")
+        assert ws.receive_json()["type"] == "chat_error"
+
+def test_ws_chat_streams_events_and_survives_bad_frames(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        for frame in ("[]", '"x"', "not json", json.dumps({"message": 5})):
+            ws.send_text(frame)
+            assert ws.receive_json()["type"] == "error"
+        ws.send_json({"message": ""})
+        assert ws.receive_json()["type"] == "error"
+
+        ws.send_json({"message": "hi"})
+        events = [ws.receive_json() for _ in range(5)]
+        assert [event["type"] for event in events] == ["start", "delta", "delta", "delta", "done"]
+
+        ws.send_json({"message": "fail"})
+        assert ws.receive_json()["type"] == "error"
@@ -0,0 +1,90 @@
+"""
+Tests for the group-committing writer in database.py
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from database import AsyncDatabase
+
+class Abort(BaseException):
+    """Escapes the per-request savepoint handling, so the whole batch fails"""
+
+@pytest.fixture
+def db(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "test.db"), commit_window=0.05)
+    db.start()
+    asyncio.run(db.execute("CREATE TABLE items (name TEXT)"))
+    yield db
+    db.close()
+
+def insert(name):
+    return lambda conn: conn.execute("INSERT INTO items (name) VALUES (?)", (name,)).lastrowid
+
+def names(db):
+    return [row["name"] for row in asyncio.run(db.fetch_all("SELECT name FROM items ORDER BY rowid"))]
+
+async def behind_a_busy_writer(db, funcs):
+    """Hold the writer on one request while funcs queue up, then let it go"""
+    started, release = threading.Event(), threading.Event()
+
+    def block(conn):
+        started.set()
+        release.wait(5)
+
+    blocker = asyncio.create_task(db.run_write(block))
+    await asyncio.to_thread(started.wait, 5)
+    waiters = [asyncio.create_task(db.run_write(func)) for func in funcs]
+    while db.write_queue.qsize() < len(funcs):
+        await asyncio.sleep(0.001)
+    release.set()
+    await blocker
+    return await asyncio.gather(*waiters, return_exceptions=True)
+
+def test_queued_writes_share_one_commit(db):
+    before = db.get_stats()["batches"]
+    results = asyncio.run(behind_a_busy_writer(db, [insert(f"row {i}") for i in range(5)]))
+    assert all(isinstance(row_id, int) for row_id in results)
+    assert names(db) == [f"row {i}" for i in range(5)]
+    stats = db.get_stats()
+    assert stats["batches"] - before == 2
+    assert stats["max_batch_size"] == 5
+
+def test_a_failed_batch_is_surfaced_to_every_waiter(db):
+    def abort(conn):
+        raise Abort()
+
+    results = asyncio.run(behind_a_busy_writer(db, [insert("a"), abort, insert("b")]))
+    assert [type(result) for result in results] == [Abort, Abort, Abort]
+    assert names(db) == []
+    assert db.get_stats()["failed_writes"] == 3
+
+def test_single_writes_count_as_batches_of_one(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "single.db"))
+    db.start()
+    try:
+        async def run():
+            await db.run_write(lambda conn: conn.execute("CREATE TABLE t (x)"))
+            await db.run_unbatched(lambda conn: conn.execute("VACUUM"))
+            await db.run_write(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+
+        asyncio.run(run())
+        stats = db.get_stats()
+        assert (stats["writes"], stats["batches"], stats["avg_batch_size"], stats["max_batch_size"]) == (3, 3, 1.0, 1)
+    finally:
+        db.close()
+
+def test_a_failed_request_rolls_back_only_its_own_statements(db):
+    def insert_then_fail(conn):
+        conn.execute("INSERT INTO items (name) VALUES ('half-written')")
+        raise ValueError("bad row")
+
+    before = db.get_stats()["batches"]
+    results = asyncio.run(behind_a_busy_writer(db, [insert("a"), insert_then_fail, insert("b")]))
+    assert isinstance(results[0], int) and isinstance(results[2], int)
+    assert isinstance(results[1], ValueError)
+    assert names(db) == ["a", "b"]
+    # All three shared one transaction
+    assert db.get_stats()["batches"] - before == 2
@@ -0,0 +1,71 @@
+"""
+Tests for Range and conditional requests on /api/download in server.py
+"""
+
+from email.utils import formatdate
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+CONTENT = b"0123456789abcdef"
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "workspace" / "docs").mkdir(parents=True)
+    (tmp_path / "workspace" / "docs" / "notes.txt").write_bytes(CONTENT)
+    with TestClient(server.app) as client:
+        yield client
+
+URL = "/api/download/docs/notes.txt"
+
+def test_full_download_carries_validators(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"].startswith('"')
+    assert "last-modified" in response.headers
+    assert response.headers["content-disposition"].startswith("attachment")
+    assert client.get(URL, params={"inline": True}).headers["content-disposition"].startswith("inline")
+
+@pytest.mark.parametrize("header, body, content_range", [
+    ("bytes=2-5", CONTENT[2:6], "bytes 2-5/16"),
+    ("bytes=10-", CONTENT[10:], "bytes 10-15/16"),
+    ("bytes=-3", CONTENT[-3:], "bytes 13-15/16"),
+])
+def test_range_requests_return_partial_content(client, header, body, content_range):
+    response = client.get(URL, headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == body
+    assert response.headers["content-range"] == content_range
+
+def test_unsatisfiable_range_is_rejected(client):
+    assert client.get(URL, headers={"Range": "bytes=100-"}).status_code == 416
+
+@pytest.mark.parametrize("make_header", [
+    lambda etag: etag,
+    lambda etag: f"W/{etag}",
+    lambda etag: f'"other", {etag}',
+    lambda etag: "*",
+])
+def test_matching_etag_is_not_modified(client, make_header):
+    etag = client.get(URL).headers["etag"]
+    response = client.get(URL, headers={"If-None-Match": make_header(etag)})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+def test_if_modified_since(client):
+    last_modified = client.get(URL).headers["last-modified"]
+    assert client.get(URL, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(URL, headers={"If-Modified-Since": formatdate(0, usegmt=True)}).status_code == 200
+    assert client.get(URL, headers={"If-Modified-Since": "not a date"}).status_code == 200
+    # If-None-Match takes precedence over If-Modified-Since
+    headers = {"If-None-Match": '"other"', "If-Modified-Since": last_modified}
+    assert client.get(URL, headers=headers).status_code == 200
+
+@pytest.mark.parametrize("path", ["docs/missing.txt", "docs", "../chat.db", "%2e%2e/chat.db"])
+def test_missing_or_outside_paths_are_not_found(client, path):
+    assert client.get(f"/api/download/{path}").status_code == 404
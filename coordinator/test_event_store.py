@@ -0,0 +1,95 @@
+"""
+Tests for the bounded, indexed event streams in event_store.py
+"""
+
+import threading
+
+from event_store import EventSpill, EventStream
+
+def make_event(i, role="engineer", task_id="t1", workflow_id="w1"):
+    return {"i": i, "agent_role": role, "task_id": task_id, "workflow_id": workflow_id}
+
+def test_recent_returns_newest_events_oldest_first():
+    stream = EventStream("messages", capacity=10)
+    for i in range(5):
+        stream.append(make_event(i))
+    assert [e["i"] for e in stream.recent(3)] == [2, 3, 4]
+
+def test_recent_filters_by_index_fields():
+    stream = EventStream("messages", capacity=10)
+    for i in range(6):
+        stream.append(make_event(i, role="engineer" if i % 2 else "qa", task_id=f"t{i % 3}"))
+    assert [e["i"] for e in stream.recent(10, agent_role="qa")] == [0, 2, 4]
+    assert [e["i"] for e in stream.recent(10, agent_role="qa", task_id="t2")] == [2]
+    assert stream.recent(10, agent_role="designer") == []
+
+def test_eviction_keeps_capacity_and_indexes_consistent():
+    stream = EventStream("messages", capacity=3)
+    for i in range(5):
+        stream.append(make_event(i, role="qa" if i == 0 else "engineer"))
+    assert len(stream) == 3
+    assert [e["i"] for e in stream.recent(10)] == [2, 3, 4]
+    assert stream.recent(10, agent_role="qa") == []
+    assert stream.get_stats()["evicted"] == 2
+
+def test_history_replays_spilled_events(tmp_path):
+    spill = EventSpill(str(tmp_path / "events.db"), batch_size=2)
+    stream = EventStream("messages", capacity=2, spill=spill)
+    for i in range(6):
+        stream.append(make_event(i, role="qa" if i % 2 else "engineer"))
+    assert [e["i"] for e in stream.history(10)] == [0, 1, 2, 3]
+    assert [e["i"] for e in stream.history(10, agent_role="qa")] == [1, 3]
+    assert [e["i"] for e in stream.history(2)] == [2, 3]
+    spill.close()
+
+def test_restart_does_not_overwrite_spilled_history(tmp_path):
+    path = str(tmp_path / "events.db")
+    spill = EventSpill(path, batch_size=1)
+    stream = EventStream("messages", capacity=1, spill=spill)
+    for i in range(3):
+        stream.append(make_event(i))
+    spill.close()
+
+    spill = EventSpill(path, batch_size=1)
+    stream = EventStream("messages", capacity=1, spill=spill)
+    for i in range(100, 103):
+        stream.append(make_event(i))
+    assert [e["i"] for e in stream.history(10)] == [0, 1, 100, 101]
+    spill.close()
+
+def test_streams_sharing_a_spill_number_independently(tmp_path):
+    spill = EventSpill(str(tmp_path / "events.db"), batch_size=1)
+    first = EventStream("a", capacity=1, spill=spill)
+    second = EventStream("b", capacity=1, spill=spill)
+    for i in range(3):
+        first.append(make_event(i))
+    second.append(make_event(50))
+    second.append(make_event(51))
+    assert [e["i"] for e in first.history(10)] == [0, 1]
+    assert [e["i"] for e in second.history(10)] == [50]
+    spill.close()
+
+def test_spill_writes_on_its_own_thread(tmp_path):
+    spill = EventSpill(str(tmp_path / "events.db"), batch_size=1)
+    writers = []
+    write = spill._write
+    spill._write = lambda batch: (writers.append(threading.current_thread().name), write(batch))
+    stream = EventStream("messages", capacity=1, spill=spill)
+    for i in range(3):
+        stream.append(make_event(i))
+    spill.flush()
+    assert writers == ["event-spill-writer"] * 2
+    spill.close()
+
+def test_spill_keeps_only_the_newest_events_per_stream(tmp_path):
+    spill = EventSpill(str(tmp_path / "events.db"), batch_size=2, max_rows=3)
+    first = EventStream("a", capacity=1, spill=spill)
+    second = EventStream("b", capacity=1, spill=spill)
+    for i in range(8):
+        first.append(make_event(i))
+    second.append(make_event(50))
+    second.append(make_event(51))
+    assert [e["i"] for e in first.history(10)] == [4, 5, 6]
+    assert [e["i"] for e in second.history(10)] == [50]
+    assert spill.pruned == 4
+    spill.close()
@@ -0,0 +1,90 @@
+"""
+Tests for generated-file bookkeeping and agent messages in metagpt_integration.py
+"""
+
+import asyncio
+import threading
+from collections import deque
+
+import pytest
+
+import metagpt_integration
+from artifact_store import ArtifactStore
+from metagpt_integration import MetaGPTIntegration
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    monkeypatch.setattr(metagpt_integration, "artifact_store", store)
+    yield store
+    store.close()
+
+def test_regenerating_a_file_keeps_one_reference(store):
+    integration = MetaGPTIntegration()
+    integration._create_mock_file("task_1", "notes.md", "first")
+    integration._create_mock_file("task_1", "notes.md", "first")
+    integration._create_mock_file("task_1", "notes.md", "second")
+    files = integration.get_agent_files("task_1", include_content=True)
+    assert [f["content"] for f in files] == ["second"]
+    stats = store.get_stats()
+    assert stats["blobs"] == 1
+    assert stats["references"] == 1
+
+def test_task_results_are_stored_once_and_released_with_the_task(store):
+    integration = MetaGPTIntegration()
+    result = integration.run_agent_task("product_manager", "Build a todo productivity app")
+    assert result["success"]
+    assert result["files_generated"]
+    assert all("content" not in f for f in result["files_generated"])
+    assert store.get_stats()["references"] == len(result["files_generated"])
+
+    assert integration.remove_task(result["task_id"])
+    assert integration.get_agent_files(result["task_id"]) == []
+    stats = store.get_stats()
+    assert stats["blobs"] == 0
+    assert stats["references"] == 0
+
+def test_finished_tasks_beyond_capacity_release_their_files(store, monkeypatch):
+    monkeypatch.setattr(metagpt_integration, "AGENT_TASK_CAPACITY", 2)
+    integration = MetaGPTIntegration()
+    task_ids = [integration.run_agent_task("product_manager", f"todo app {i}")["task_id"] for i in range(4)]
+    assert list(integration.tasks) == task_ids[-2:]
+    assert set(integration.agent_files) == set(task_ids[-2:])
+    assert store.get_stats()["references"] == sum(len(integration.agent_files[t]) for t in task_ids[-2:])
+
+def test_recent_messages_are_copies(monkeypatch):
+    monkeypatch.setattr(metagpt_integration, "consolidated_messages", {})
+    monkeypatch.setattr(metagpt_integration, "finished_consolidations", deque())
+    integration = MetaGPTIntegration()
+    integration.add_agent_message("engineer", "writing code", "start")
+
+    first = integration.get_recent_messages()
+    first[0]["message"] = "tampered"
+    first[0]["consolidated_steps"].append("tampered")
+    second = integration.get_recent_messages()
+    assert second[0]["message"] == "writing code"
+    assert second[0]["consolidated_steps"] == ["writing code"]
+
+    integration.add_agent_message("engineer", "running tests")
+    assert second[0]["consolidated_steps"] == ["writing code"]
+    assert integration.get_recent_messages()[0]["consolidated_steps"] == ["writing code", "running tests"]
+
+def test_simulated_task_files_are_stored_off_the_event_loop(store, monkeypatch):
+    integration = MetaGPTIntegration()
+    threads = []
+    put_many = store.put_many
+
+    def recording_put_many(contents):
+        threads.append(threading.current_thread() is threading.main_thread())
+        return put_many(contents)
+
+    monkeypatch.setattr(store, "put_many", recording_put_many)
+    asyncio.run(integration._store_agent_files("engineer", "todo app", "task_9"))
+    asyncio.run(integration._store_agent_files("engineer", "todo app v2", "task_9"))
+    assert threads == [False, False]
+    files = integration.get_agent_files("task_9", include_content=True)
+    assert [f["name"] for f in files] == ["code_implementation.py", "unit_tests.py"]
+    assert all("todo app v2" in f["content"] for f in files)
+    # The replaced versions were released, so only the live files hold references
+    assert store.get_stats()["references"] == 2
+    assert integration.content_references() == {f["content_hash"]: 1 for f in files}
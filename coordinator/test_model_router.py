@@ -0,0 +1,59 @@
+"""
+Tests for candidate ranking and the UCB1 bandit in model_router.py
+"""
+
+import math
+
+from model_router import AdaptiveRouter
+from provider_health import HealthMonitor
+from provider_stats import LatencyTracker
+
+CANDIDATES = [("groq", "fast"), ("gemini", "slow")]
+
+def make_router(strategy, **kwargs):
+    return AdaptiveRouter(LatencyTracker(), HealthMonitor(), {}, strategy=strategy, **kwargs)
+
+def test_static_strategy_keeps_the_configured_order():
+    router = make_router("static")
+    assert router.rank("code", list(reversed(CANDIDATES)), {}) == list(reversed(CANDIDATES))
+    assert router.get_recent_decisions() == []
+
+def test_score_strategy_prefers_the_faster_model():
+    router = make_router("score")
+    for _ in range(5):
+        router.latency_tracker.record("groq", "fast", 10.0)
+        router.latency_tracker.record("gemini", "slow", 0.5)
+    assert router.rank("code", CANDIDATES, {}) == [("gemini", "slow"), ("groq", "fast")]
+    decision = router.get_recent_decisions()[0]
+    assert (decision["provider"], decision["strategy"]) == ("gemini", "score")
+
+def test_score_strategy_falls_back_to_static_priority_without_samples():
+    router = make_router("score")
+    ranked = router.rank("code", list(reversed(CANDIDATES)), {})
+    assert ranked == list(reversed(CANDIDATES))
+    scores = router.get_recent_decisions()[0]["candidates"]
+    assert [score["prior"] for score in scores] == [1.0, 0.5]
+
+def test_bandit_tries_every_unexplored_arm_first():
+    router = make_router("bandit")
+    router.record_outcome("code", "groq", "fast", True, 0.1)
+    assert router.rank("code", CANDIDATES, {})[0] == ("gemini", "slow")
+
+def test_bandit_exploits_the_better_arm_once_both_are_sampled():
+    router = make_router("bandit", exploration=0.1)
+    for _ in range(10):
+        router.record_outcome("code", "groq", "fast", True, 0.5)
+        router.record_outcome("code", "gemini", "slow", False)
+    assert router.rank("code", CANDIDATES, {})[0] == ("groq", "fast")
+    # Arms are tracked per task category
+    router.record_outcome("chat", "groq", "fast", False)
+    assert router.rank("chat", CANDIDATES, {})[0] == ("gemini", "slow")
+
+def test_bandit_value_is_mean_reward_plus_ucb_bonus():
+    router = make_router("bandit", exploration=0.5)
+    router.record_outcome("code", "groq", "fast", True)
+    router.record_outcome("code", "groq", "fast", False)
+    router.record_outcome("code", "gemini", "slow", True)
+    expected = 0.5 + 0.5 * math.sqrt(math.log(3) / 2)
+    assert math.isclose(router._bandit_value("code", "groq", "fast"), expected)
+    assert router.get_bandit_stats()["code"]["groq/fast"] == {"pulls": 2, "mean_reward": 0.5}
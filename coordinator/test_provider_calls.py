@@ -0,0 +1,171 @@
+"""
+Tests for coalesced provider calls and their quota charging in server.py
+"""
+
+import asyncio
+
+import server
+
+def patch_provider(monkeypatch, delay=0.05):
+    calls = []
+    charges = []
+
+    async def fake_call(client, provider, prompt, agent_role, model):
+        calls.append((provider, model))
+        await asyncio.sleep(delay)
+        return f"reply to {prompt}"
+
+    monkeypatch.setattr(server, "execute_admitted_provider_call", fake_call)
+    monkeypatch.setattr(server, "increment_api_usage", lambda provider, model: charges.append((provider, model)))
+    return calls, charges
+
+def test_joined_call_is_charged_once(monkeypatch):
+    calls, charges = patch_provider(monkeypatch)
+
+    async def run():
+        return await asyncio.gather(*(server.call_provider_api("groq", "hi", model="m") for _ in range(3)))
+
+    assert asyncio.run(run()) == ["reply to hi"] * 3
+    assert calls == [("groq", "m")]
+    assert charges == [("groq", "m")]
+
+def test_call_joined_after_its_leader_is_cancelled_is_still_charged(monkeypatch):
+    calls, charges = patch_provider(monkeypatch)
+
+    async def run():
+        # A hedged loser starts the flight, a plain call joins it, then the loser is cancelled
+        leader = asyncio.create_task(server.call_provider_api("groq", "hi", model="m"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(server.call_provider_api("groq", "hi", model="m"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "reply to hi"
+    assert charges == [("groq", "m")]
+
+def test_failed_call_is_not_charged(monkeypatch):
+    _, charges = patch_provider(monkeypatch)
+
+    async def failing(client, provider, prompt, agent_role, model):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server, "execute_admitted_provider_call", failing)
+    try:
+        asyncio.run(server.call_provider_api("groq", "hi", model="m"))
+    except RuntimeError:
+        pass
+    assert charges == []
+
+def patch_hedging(monkeypatch, controller, delays):
+    launched = []
+
+    async def fake_call(client, provider, prompt, agent_role, model):
+        launched.append(provider)
+        await asyncio.sleep(delays[provider])
+        return provider
+
+    monkeypatch.setattr(server, "execute_admitted_provider_call", fake_call)
+    monkeypatch.setattr(server, "increment_api_usage", lambda provider, model: None)
+    monkeypatch.setattr(server, "admission_controller", controller)
+    monkeypatch.setattr(server, "get_candidate_models", lambda prompt: [("groq", "a"), ("gemini", "b")])
+    monkeypatch.setattr(server, "get_hedge_delay", lambda provider, model: 0.05)
+    return launched
+
+def test_slow_call_is_hedged(monkeypatch):
+    launched = patch_hedging(monkeypatch, server.AdmissionController(10, {}), {"groq": 0.2, "gemini": 0.01})
+    response, provider, _ = asyncio.run(server.call_ai_api_hedged("hedge me"))
+    assert (response, provider) == ("gemini", "gemini")
+    assert launched == ["groq", "gemini"]
+
+def test_no_hedge_while_requests_queue_for_admission(monkeypatch):
+    controller = server.AdmissionController(1, {})
+    launched = patch_hedging(monkeypatch, controller, {"groq": 0.01, "gemini": 0.01})
+
+    async def hold_slot(release):
+        async with controller.admit("other"):
+            await release.wait()
+
+    async def run():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(release))
+        await asyncio.sleep(0)
+        hedged = asyncio.create_task(server.call_ai_api_hedged("queued prompt"))
+        # Queued far past the hedge delay, the primary must not be hedged
+        await asyncio.sleep(0.2)
+        assert controller.global_gate.queue_depth == 1
+        release.set()
+        await holder
+        return await hedged
+
+    response, provider, _ = asyncio.run(run())
+    assert (response, provider) == ("groq", "groq")
+    assert launched == ["groq"]
+
+def test_sequential_path_falls_back_through_every_routed_candidate(monkeypatch):
+    attempts = []
+
+    async def fake_call(provider, prompt, agent_role="Assistant", model=None, priority=0):
+        attempts.append((provider, model))
+        if provider != "openrouter":
+            raise RuntimeError(f"{provider} down")
+        return "reply"
+
+    monkeypatch.setattr(server, "call_provider_api", fake_call)
+    monkeypatch.setattr(server, "AUTO_MODE_ENABLED", True)
+    # The router ranks a non-GPT-OSS model first; its failure must not end the fallback
+    monkeypatch.setattr(server, "get_candidate_models", lambda prompt: [("groq", "a"), ("gpt_oss", server.GPT_OSS_MODEL), ("openrouter", "b")])
+    assert asyncio.run(server.call_ai_api_sequential("hi")) == ("reply", "openrouter", "b")
+    assert attempts == [("gpt_oss", server.GPT_OSS_MODEL), ("groq", "a"), ("openrouter", "b")]
+
+def test_sequential_path_reports_the_last_error(monkeypatch):
+    async def fake_call(provider, prompt, agent_role="Assistant", model=None, priority=0):
+        raise RuntimeError(f"{provider} down")
+
+    monkeypatch.setattr(server, "call_provider_api", fake_call)
+    monkeypatch.setattr(server, "AUTO_MODE_ENABLED", True)
+    monkeypatch.setattr(server, "get_candidate_models", lambda prompt: [("groq", "a")])
+    try:
+        asyncio.run(server.call_ai_api_sequential("hi"))
+    except Exception as e:
+        assert "groq down" in str(e)
+    else:
+        raise AssertionError("expected every provider to fail")
+
+def test_hedged_loser_is_sampled_only_when_it_started_the_call(monkeypatch):
+    samples = []
+    monkeypatch.setattr(server.latency_tracker, "record", lambda provider, model, seconds: samples.append(provider))
+
+    async def run(join_existing):
+        launched = patch_hedging(monkeypatch, server.AdmissionController(10, {}), {"groq": 0.2, "gemini": 0.01})
+        # An earlier plain call already has the primary's provider call in flight
+        earlier = asyncio.create_task(server.call_provider_api("groq", "hedge me", model="a")) if join_existing else None
+        await asyncio.sleep(0)
+        result = await server.call_ai_api_hedged("hedge me")
+        if earlier is not None:
+            await earlier
+        return result, launched
+
+    (_, provider, _), _ = asyncio.run(run(join_existing=False))
+    assert (provider, samples) == ("gemini", ["groq"])
+    samples.clear()
+    (_, provider, _), launched = asyncio.run(run(join_existing=True))
+    assert (provider, samples) == ("gemini", [])
+    assert launched == ["groq", "gemini"]
+
+def test_completed_stream_records_a_latency_sample(monkeypatch):
+    samples = []
+    monkeypatch.setattr(server.latency_tracker, "record", lambda provider, model, seconds: samples.append((provider, model)))
+    monkeypatch.setattr(server, "increment_api_usage", lambda provider, model: None)
+
+    class FakeClient:
+        async def stream(self, prompt, agent_role, model):
+            for delta in ("a", "b"):
+                await asyncio.sleep(0)
+                yield delta
+
+    async def run():
+        return [delta async for delta in server.stream_admitted_provider_api(FakeClient(), "groq", "hi", "Assistant", "stream-model")]
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert samples == [("groq", "stream-model")]
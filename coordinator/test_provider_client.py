@@ -0,0 +1,144 @@
+"""
+Tests for the provider client layer in provider_client.py
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from provider_client import ProviderAPIError, ProviderClient, ProviderConfig, iter_sse_data
+
+class FakeContent:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for line in self.lines:
+            yield line
+
+class FakeResponse:
+    def __init__(self, status=200, body=None, lines=(), error=None):
+        self.status = status
+        self.body = body
+        self.content = FakeContent([line.encode("utf-8") for line in lines])
+        self.error = error
+
+    async def __aenter__(self):
+        if self.error is not None:
+            raise self.error
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.body
+
+    async def text(self):
+        return self.body if isinstance(self.body, str) else json.dumps(self.body)
+
+    async def read(self):
+        return b""
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+        self.closed = False
+
+    def post(self, url, headers=None, json=None):
+        self.requests.append(("POST", url, headers, json))
+        return self.response
+
+    def head(self, url, allow_redirects=True):
+        self.requests.append(("HEAD", url, None, None))
+        return self.response
+
+    async def close(self):
+        self.closed = True
+
+def make_client(response, api_format="openai", **overrides):
+    config = ProviderConfig(
+        name="groq", display_name="Groq", url="https://api.example.com/v1/chat",
+        stream_url="https://api.example.com/v1/stream", default_model="default-model",
+        api_format=api_format, api_key="secret", placeholder_key="your-key", **overrides
+    )
+    client = ProviderClient(config)
+    client.session = FakeSession(response)
+    return client
+
+async def collect(stream):
+    return [item async for item in stream]
+
+def test_iter_sse_data_skips_non_data_lines_and_stops_at_done():
+    response = FakeResponse(lines=[": keep-alive\n", "event: message\n", "data: {\"a\": 1}\n", "\n", "data:{\"b\": 2}\n", "data: [DONE]\n", "data: {\"late\": 3}\n"])
+    assert asyncio.run(collect(iter_sse_data(response))) == ['{"a": 1}', '{"b": 2}']
+
+def test_stream_yields_openai_deltas_from_the_stream_url():
+    chunks = [
+        {"choices": [{"delta": {"role": "assistant"}}]},
+        {"choices": [{"delta": {"content": "Hel"}}]},
+        {"choices": []},
+        {"choices": [{"delta": {"content": "lo"}}]},
+    ]
+    client = make_client(FakeResponse(lines=[f"data: {json.dumps(chunk)}\n" for chunk in chunks] + ["data: [DONE]\n"]))
+    assert asyncio.run(collect(client.stream("hi", model="m"))) == ["Hel", "lo"]
+    method, url, _, body = client.session.requests[0]
+    assert (method, url, body["stream"], body["model"]) == ("POST", "https://api.example.com/v1/stream", True, "m")
+
+def test_stream_yields_gemini_parts():
+    chunk = {"candidates": [{"content": {"parts": [{"text": "a"}, {"text": ""}, {"text": "b"}]}}]}
+    client = make_client(FakeResponse(lines=[f"data: {json.dumps(chunk)}\n"]), api_format="gemini")
+    assert asyncio.run(collect(client.stream("hi"))) == ["a", "b"]
+
+def test_stream_raises_provider_error_with_status():
+    client = make_client(FakeResponse(status=429, body="slow down"))
+    with pytest.raises(ProviderAPIError) as error:
+        asyncio.run(collect(client.stream("hi")))
+    assert error.value.status == 429
+    assert "slow down" in str(error.value)
+
+def test_openai_request_carries_bearer_key_and_chat_messages():
+    client = make_client(FakeResponse(body={"choices": [{"message": {"content": "ok"}}]}), max_tokens=50)
+    assert asyncio.run(client.complete("hi", agent_role="Engineer")) == "ok"
+    method, url, headers, body = client.session.requests[0]
+    assert (method, url, headers["Authorization"]) == ("POST", "https://api.example.com/v1/chat", "Bearer secret")
+    assert body["model"] == "default-model" and body["max_tokens"] == 50 and "stream" not in body
+    assert [message["role"] for message in body["messages"]] == ["system", "user"]
+    assert "Engineer" in body["messages"][0]["content"]
+
+def test_gemini_request_and_response_use_their_own_shape():
+    client = make_client(FakeResponse(body={"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}), api_format="gemini")
+    assert asyncio.run(client.complete("hi")) == "ok"
+    _, _, headers, body = client.session.requests[0]
+    assert "Authorization" not in headers
+    assert body["contents"][0]["parts"][0]["text"].endswith("User: hi")
+    assert body["generationConfig"]["maxOutputTokens"] == 2000
+
+def test_complete_maps_non_200_to_provider_error():
+    client = make_client(FakeResponse(status=503, body="overloaded"))
+    with pytest.raises(ProviderAPIError) as error:
+        asyncio.run(client.complete("hi"))
+    assert error.value.status == 503
+    assert str(error.value) == "Groq API error: 503 - overloaded"
+
+def test_placeholder_key_is_rejected_before_any_request():
+    client = make_client(FakeResponse(body={}))
+    client.config.api_key = "your-key"
+    with pytest.raises(Exception, match="Groq API key not configured"):
+        asyncio.run(client.complete("hi"))
+    assert client.session.requests == []
+
+def test_warm_heads_the_provider_origin():
+    client = make_client(FakeResponse())
+    asyncio.run(client.warm())
+    assert client.session.requests == [("HEAD", "https://api.example.com/", None, None)]
+
+def test_warm_failure_is_reported_not_raised(capsys):
+    client = make_client(FakeResponse(error=OSError("no route")))
+    asyncio.run(client.warm())
+    assert "Warming Groq connection pool failed: no route" in capsys.readouterr().out
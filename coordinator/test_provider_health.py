@@ -0,0 +1,68 @@
+"""
+Tests for the per-model circuit breaker in provider_health.py
+"""
+
+import provider_health
+from provider_health import HealthMonitor
+
+def make_monitor(monkeypatch, **kwargs):
+    clock = [1000.0]
+    monkeypatch.setattr(provider_health.time, "monotonic", lambda: clock[0])
+    return HealthMonitor(open_cooldown=30.0, **kwargs), clock
+
+def state(monitor):
+    return monitor.models[("groq", "m")].state
+
+def test_consecutive_failures_open_the_breaker(monkeypatch):
+    monitor, _ = make_monitor(monkeypatch, consecutive_failure_threshold=3)
+    for _ in range(2):
+        monitor.record_failure("groq", "m", 500)
+    assert state(monitor) == "closed"
+    monitor.record_failure("groq", "m", 429)
+    assert state(monitor) == "open"
+    assert not monitor.allow_request("groq", "m")
+    assert not monitor.is_available("groq", "m")
+    snapshot = monitor.snapshot()["groq/m"]
+    assert (snapshot["server_errors"], snapshot["rate_limited"], snapshot["retry_in"]) == (2, 1, 30.0)
+
+def test_error_rate_trips_only_after_min_calls(monkeypatch):
+    monitor, _ = make_monitor(monkeypatch, min_calls=4, error_rate_threshold=0.5, consecutive_failure_threshold=10)
+    monitor.record_failure("groq", "m")
+    monitor.record_success("groq", "m", 1.0)
+    monitor.record_failure("groq", "m")
+    assert state(monitor) == "closed"
+    monitor.record_success("groq", "m", 1.0)
+    monitor.record_failure("groq", "m")
+    assert state(monitor) == "open"
+
+def test_half_open_admits_one_probe_and_closes_on_success(monkeypatch):
+    monitor, clock = make_monitor(monkeypatch, consecutive_failure_threshold=1)
+    monitor.record_failure("groq", "m")
+    clock[0] += 30
+    assert monitor.is_available("groq", "m")
+    assert monitor.allow_request("groq", "m")
+    assert state(monitor) == "half_open"
+    assert not monitor.allow_request("groq", "m")
+    monitor.record_success("groq", "m", 1.0)
+    assert state(monitor) == "closed"
+    assert monitor.success_rate("groq", "m") == 1.0
+    assert monitor.allow_request("groq", "m") and monitor.allow_request("groq", "m")
+
+def test_failed_probe_reopens_with_a_fresh_cooldown(monkeypatch):
+    monitor, clock = make_monitor(monkeypatch, consecutive_failure_threshold=1)
+    monitor.record_failure("groq", "m")
+    clock[0] += 30
+    assert monitor.allow_request("groq", "m")
+    monitor.record_failure("groq", "m")
+    assert state(monitor) == "open"
+    clock[0] += 29
+    assert not monitor.allow_request("groq", "m")
+
+def test_cancelled_probe_lets_the_next_one_through(monkeypatch):
+    monitor, clock = make_monitor(monkeypatch, consecutive_failure_threshold=1)
+    monitor.record_failure("groq", "m")
+    clock[0] += 30
+    assert monitor.allow_request("groq", "m")
+    monitor.record_cancelled("groq", "m")
+    assert state(monitor) == "half_open"
+    assert monitor.allow_request("groq", "m")
@@ -0,0 +1,89 @@
+"""
+Tests for the in-memory usage counters in quota_ledger.py
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import quota_ledger
+import server
+from database import AsyncDatabase
+from quota_ledger import QuotaLedger
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [datetime(2026, 3, 31, 23, 0)]
+    monkeypatch.setattr(quota_ledger, "_utc_now", lambda: now[0])
+    return now
+
+@pytest.fixture
+def db(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "usage.db"))
+    db.start()
+    asyncio.run(db.run_write(server.init_db))
+    yield db
+    db.close()
+
+def usage(db, model):
+    return asyncio.run(db.fetch_one(
+        'SELECT daily_used, monthly_used FROM api_usage WHERE provider = ? AND model = ?', ("groq", model)
+    ))
+
+def test_daily_and_monthly_windows_roll_over(db, clock):
+    ledger = QuotaLedger(db)
+    ledger.increment("groq", "m", 3)
+    clock[0] = datetime(2026, 4, 1, 0, 30)
+    assert ledger.snapshot()["groq"]["m"]["daily"]["used"] == 0
+    assert ledger.snapshot()["groq"]["m"]["monthly"]["used"] == 0
+
+    ledger.increment("groq", "m", 2)
+    clock[0] = datetime(2026, 4, 2, 9, 0)
+    credits = ledger.snapshot()["groq"]["m"]
+    assert (credits["daily"]["used"], credits["monthly"]["used"]) == (0, 2)
+
+def test_load_resets_a_day_that_ended_while_stopped(db, clock):
+    ledger = QuotaLedger(db)
+    ledger.increment("groq", "m", 4)
+    assert asyncio.run(ledger.flush()) == 1
+
+    clock[0] = datetime(2026, 4, 1, 8, 0)
+    restarted = QuotaLedger(db)
+    asyncio.run(restarted.load())
+    assert restarted.remaining_fraction("groq", "m") == 1.0
+    # The reset is written back on the next flush
+    asyncio.run(restarted.flush())
+    assert usage(db, "m") == {"daily_used": 0, "monthly_used": 0}
+
+def test_failed_flush_keeps_every_increment_for_the_retry(db, clock, monkeypatch):
+    ledger = QuotaLedger(db)
+    run_write = db.run_write
+    calls = []
+
+    async def failing_once(func, *args):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return await run_write(func, *args)
+
+    monkeypatch.setattr(db, "run_write", failing_once)
+    ledger.increment("groq", "m", 2)
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(ledger.flush())
+    assert usage(db, "m") is None
+
+    ledger.increment("groq", "m", 1)
+    assert asyncio.run(ledger.flush()) == 1
+    assert usage(db, "m") == {"daily_used": 3, "monthly_used": 3}
+    assert asyncio.run(ledger.flush()) == 0
+
+def test_counts_are_flushed_on_shutdown(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with TestClient(server.app):
+        server.quota_ledger.increment("groq", "shutdown-model", 7)
+    with sqlite3.connect(tmp_path / "chat.db") as conn:
+        row = conn.execute("SELECT daily_used FROM api_usage WHERE provider = 'groq' AND model = 'shutdown-model'").fetchone()
+    assert row == (7,)
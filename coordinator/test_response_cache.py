@@ -0,0 +1,95 @@
+"""
+Tests for the two-tier completion cache in response_cache.py
+"""
+
+import asyncio
+import threading
+
+from response_cache import CompletionCache
+
+def test_memory_hit_and_miss():
+    async def run():
+        cache = CompletionCache()
+        await cache.set("a", "reply")
+        return await cache.get("a"), await cache.get("b"), cache.get_stats()
+
+    hit, miss, stats = asyncio.run(run())
+    assert (hit, miss) == ("reply", None)
+    assert (stats["hits"], stats["misses"], stats["persistent"]) == (1, 1, False)
+
+def test_expired_entries_are_dropped():
+    async def run():
+        cache = CompletionCache()
+        await cache.set("a", "reply", ttl=-1)
+        return await cache.get("a"), cache.get_stats()["expirations"]
+
+    assert asyncio.run(run()) == (None, 1)
+
+def test_persistent_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        cache = CompletionCache(db_path=path)
+        await cache.set("a", "reply")
+        cache.close()
+        cache = CompletionCache(db_path=path)
+        value = await cache.get("a")
+        stats = cache.get_stats()
+        cache.close()
+        return value, stats["disk_hits"]
+
+    assert asyncio.run(run()) == ("reply", 1)
+
+def test_candidates_are_read_in_one_query_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    queries = []
+
+    async def run():
+        writer = CompletionCache(db_path=path)
+        await writer.set("b", "second choice")
+        await writer.set("c", "third choice")
+        writer.close()
+
+        cache = CompletionCache(db_path=path)
+        load_many = cache._load_many
+
+        def recording_load_many(keys, now):
+            queries.append((list(keys), threading.current_thread() is threading.main_thread()))
+            return load_many(keys, now)
+
+        monkeypatch.setattr(cache, "_load_many", recording_load_many)
+        found = await cache.get_first(["a", "b", "c"])
+        cache.close()
+        return found
+
+    assert asyncio.run(run()) == (1, "second choice")
+    assert queries == [(["a", "b", "c"], False)]
+
+def test_earlier_disk_entry_beats_later_memory_entry(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        writer = CompletionCache(db_path=path)
+        await writer.set("a", "first choice")
+        writer.close()
+
+        cache = CompletionCache(db_path=path)
+        cache._store_memory("b", "second choice", float("inf"))
+        found = await cache.get_first(["a", "b"])
+        # A memory hit on the first candidate needs no disk read at all
+        cache.close()
+        return found, await cache.get_first(["a", "b"])
+
+    assert asyncio.run(run()) == ((0, "first choice"), (0, "first choice"))
+
+def test_clear_empties_both_tiers(tmp_path):
+    async def run():
+        cache = CompletionCache(db_path=str(tmp_path / "cache.db"))
+        await cache.set("a", "reply")
+        await cache.clear()
+        cache.entries.clear()
+        value = await cache.get("a")
+        cache.close()
+        return value
+
+    assert asyncio.run(run()) is None
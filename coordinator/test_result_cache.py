@@ -0,0 +1,120 @@
+"""
+Tests for the tagged, stale-while-revalidate result cache in result_cache.py
+"""
+
+import asyncio
+import threading
+import time
+
+import result_cache
+from result_cache import ResultCache, cached
+
+def make_loader(results):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return results[len(calls) - 1]
+    return loader, calls
+
+def test_hit_after_one_load_for_concurrent_misses():
+    cache = ResultCache("test_hits", ttl=60)
+    loader, calls = make_loader(["a", "b"])
+
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(3)))
+        return first, await cache.get_or_load("k", loader)
+
+    assert asyncio.run(run()) == (["a", "a", "a"], "a")
+    assert calls == [1]
+    stats = cache.get_stats()
+    assert (stats["loads"], stats["hits"], stats["misses"]) == (1, 1, 3)
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    cache = ResultCache("test_stale", ttl=0.3, stale_ttl=30)
+    loader, calls = make_loader(["old", "new"])
+
+    async def run():
+        await cache.get_or_load("k", loader)
+        await asyncio.sleep(0.35)
+        stale = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(3)))
+        await asyncio.sleep(0.05)
+        return stale, await cache.get_or_load("k", loader)
+
+    assert asyncio.run(run()) == (["old", "old", "old"], "new")
+    assert calls == [1, 1]
+    assert cache.get_stats()["refreshes"] == 1
+
+def test_expired_past_the_stale_window_loads_again():
+    cache = ResultCache("test_expired", ttl=0.02, stale_ttl=0.02)
+    loader, _ = make_loader(["old", "new"])
+
+    async def run():
+        await cache.get_or_load("k", loader)
+        await asyncio.sleep(0.05)
+        return await cache.get_or_load("k", loader)
+
+    assert asyncio.run(run()) == "new"
+    assert cache.get_stats()["expirations"] == 1
+
+def test_invalidating_a_tag_drops_only_its_entries():
+    cache = ResultCache("test_tags", ttl=60)
+
+    async def run():
+        await cache.get_or_load("team", lambda: asyncio.sleep(0, "members"), tags=("team",))
+        await cache.get_or_load("other", lambda: asyncio.sleep(0, "x"), tags=("other",))
+        dropped = cache.invalidate_tags("team")
+        return dropped, await cache.get_or_load("team", lambda: asyncio.sleep(0, "edited"), tags=("team",))
+
+    assert asyncio.run(run()) == (1, "edited")
+    assert set(cache.entries) == {"team", "other"}
+
+def test_load_started_before_an_invalidation_is_not_stored():
+    cache = ResultCache("test_generation", ttl=60)
+
+    async def run():
+        started = asyncio.Event()
+
+        async def slow_loader():
+            started.set()
+            await asyncio.sleep(0.02)
+            return "before edit"
+
+        load = asyncio.create_task(cache.get_or_load("k", slow_loader, tags=("team",)))
+        await started.wait()
+        cache.invalidate_tags("team")
+        return await load
+
+    assert asyncio.run(run()) == "before edit"
+    assert "k" not in cache.entries
+
+def test_sync_loader_runs_once_across_threads():
+    cache = ResultCache("test_sync", ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.02)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load_sync("k", loader))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["value"] * 4
+    assert calls == [1]
+    assert cache.key_locks == {}
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ResultCache("test_lru", maxsize=2, ttl=60)
+
+    @cached(cache)
+    def square(n):
+        return n * n
+
+    square(1), square(2), square(1), square(3)
+    assert sorted(cache.entries) == sorted(result_cache.make_key(square.__wrapped__, (n,), {}) for n in (1, 3))
+    assert cache.get_stats()["evictions"] == 1
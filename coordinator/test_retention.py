@@ -0,0 +1,90 @@
+"""
+Tests for pruning, archiving and vacuuming chat.db in retention.py
+"""
+
+import asyncio
+import gzip
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from database import AsyncDatabase
+from retention import RetentionManager, RetentionPolicy
+
+@pytest.fixture
+def db(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "chat.db"))
+    db.start()
+    asyncio.run(db.run_write(server.init_db))
+    yield db
+    db.close()
+
+def days_ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+def add_messages(db, rows):
+    def insert(conn):
+        conn.executemany(
+            "INSERT INTO messages (sender, message, timestamp, message_type, is_error) VALUES ('s', ?, ?, ?, ?)",
+            rows
+        )
+    asyncio.run(db.run_write(insert))
+
+def remaining(db):
+    return [row["message"] for row in asyncio.run(db.fetch_all("SELECT message FROM messages ORDER BY id"))]
+
+def archived(archive_dir):
+    messages = []
+    for path in sorted(archive_dir.glob("messages-*.jsonl.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            messages += [json.loads(line)["message"] for line in f]
+    return messages
+
+def test_old_system_and_error_rows_are_pruned_by_age(db, tmp_path):
+    add_messages(db, [
+        ("old system", days_ago(10), "system", 0),
+        ("old error", days_ago(10), "assistant", 1),
+        ("old user", days_ago(10), "user", 0),
+        ("new system", days_ago(1), "system", 0),
+    ])
+    manager = RetentionManager(db, RetentionPolicy(prune_after_days=7, archive_dir=str(tmp_path / "archive")))
+    report = asyncio.run(manager.run_once())
+    assert (report.pruned, report.archived, report.errors) == (2, 0, [])
+    assert remaining(db) == ["old user", "new system"]
+
+def test_messages_past_the_window_are_archived_then_deleted(db, tmp_path):
+    add_messages(db, [("ancient", days_ago(40), "user", 0), ("recent", days_ago(2), "user", 0)])
+    manager = RetentionManager(db, RetentionPolicy(archive_after_days=30, archive_dir=str(tmp_path / "archive")))
+    report = asyncio.run(manager.run_once())
+    assert report.archived == 1 and report.archive_bytes > 0
+    assert remaining(db) == ["recent"]
+    assert archived(tmp_path / "archive") == ["ancient"]
+
+def test_oldest_rows_beyond_the_cap_are_archived(db, tmp_path):
+    add_messages(db, [(f"message {i}", days_ago(1), "user", 0) for i in range(7)])
+    manager = RetentionManager(db, RetentionPolicy(max_messages=3, batch_size=2, archive_dir=str(tmp_path / "archive")))
+    report = asyncio.run(manager.run_once())
+    assert report.archived == 4
+    assert remaining(db) == ["message 4", "message 5", "message 6"]
+    assert archived(tmp_path / "archive") == [f"message {i}" for i in range(4)]
+
+def test_new_databases_start_in_incremental_vacuum_mode(db):
+    assert asyncio.run(db.fetch_one("PRAGMA auto_vacuum"))["auto_vacuum"] == 2
+
+def test_an_older_database_is_switched_by_maintenance_not_at_startup(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE legacy (x)")
+    db = AsyncDatabase(str(path))
+    db.start()
+    try:
+        asyncio.run(db.run_write(server.init_db))
+        assert asyncio.run(db.fetch_one("PRAGMA auto_vacuum"))["auto_vacuum"] == 0
+        manager = RetentionManager(db, RetentionPolicy(archive_dir=str(tmp_path / "archive")))
+        assert asyncio.run(manager.run_once()).errors == []
+        assert asyncio.run(db.run_unbatched(lambda conn: conn.execute("PRAGMA auto_vacuum").fetchone()[0])) == 2
+    finally:
+        db.close()
@@ -0,0 +1,70 @@
+"""
+Tests for queueing and flushing documents in search_index.py
+"""
+
+import asyncio
+
+import pytest
+
+from database import AsyncDatabase
+from search_index import SearchIndex, SOURCE_AGENT, build_match_query
+
+@pytest.fixture
+def db(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "search.db"))
+    conn = db.connect()
+    conn.execute('''
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT DEFAULT 'User', message TEXT NOT NULL,
+            avatar TEXT DEFAULT '👤', timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, message_type TEXT DEFAULT 'user'
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    db.start()
+    yield db
+    db.close()
+
+def test_documents_are_dropped_until_the_index_is_started():
+    index = SearchIndex()
+    index.queue_document(SOURCE_AGENT, "task_1/notes.md", "notes.md", "x" * 10000)
+    index.queue_removal(SOURCE_AGENT, "task_1/old.md")
+    assert index.pending == {}
+
+def test_flush_without_fts_discards_pending_documents():
+    index = SearchIndex()
+    index.pending[(SOURCE_AGENT, "task_1/notes.md")] = {"name": "notes.md", "content": "x"}
+    assert asyncio.run(index.flush()) == 0
+    assert index.pending == {}
+
+def test_queued_documents_are_searchable_after_flush(db):
+    async def run():
+        index = SearchIndex()
+        await index.start(db)
+        assert index.available
+        index.queue_document(SOURCE_AGENT, "task_1/plan.md", "plan.md", "roadmap for the payments service", task_id="task_1")
+        assert await index.flush() == 1
+        assert index.pending == {}
+        results = await index.search_documents("payments")
+        assert [r["path"] for r in results] == ["task_1/plan.md"]
+        index.queue_removal(SOURCE_AGENT, "task_1/plan.md")
+        assert await index.search_documents("payments") == []
+    asyncio.run(run())
+
+def test_build_match_query_quotes_terms():
+    assert build_match_query('say "hi" pay*') == '"say" """hi""" "pay"*'
+    assert build_match_query("   ") is None
+
+def test_highlights_escape_the_indexed_text(db):
+    async def run():
+        index = SearchIndex()
+        await index.start(db)
+        index.queue_document(SOURCE_AGENT, "task_1/<b>.html", "<b>payments</b>.html", "<script>alert(1)</script> payments & more")
+        await index.flush()
+        await db.execute("INSERT INTO messages (message) VALUES (?)", ('<img src=x onerror=alert(1)> payments',))
+        return (await index.search_documents("payments"))[0], (await index.search_messages("payments"))[0]
+
+    document, message = asyncio.run(run())
+    assert document["snippet"] == "&lt;script&gt;alert(1)&lt;/script&gt; <mark>payments</mark> &amp; more"
+    assert document["name_highlight"] == "&lt;b&gt;<mark>payments</mark>&lt;/b&gt;.html"
+    assert message["snippet"] == "&lt;img src=x onerror=alert(1)&gt; <mark>payments</mark>"
@@ -0,0 +1,123 @@
+"""
+Tests for request coalescing in single_flight.py
+"""
+
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_run():
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(3)))
+        return results, flights.get_stats()
+
+    results, stats = asyncio.run(run())
+    assert sorted(results, key=lambda r: r[1]) == [("result", False), ("result", True), ("result", True)]
+    assert runs == [1]
+    assert (stats["calls"], stats["coalesced"], stats["in_flight"]) == (1, 2, 0)
+
+def test_finished_flight_is_not_reused():
+    runs = []
+
+    async def work():
+        runs.append(1)
+        return len(runs)
+
+    async def run():
+        flights = SingleFlight()
+        return [await flights.do("key", work) for _ in range(2)]
+
+    assert asyncio.run(run()) == [(1, False), (2, False)]
+
+def test_errors_reach_every_caller():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(2)), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(run())] == ["boom", "boom"]
+
+def test_work_survives_until_the_last_caller_is_cancelled():
+    async def run():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.create_task(flights.do("key", work))
+        second = asyncio.create_task(flights.do("key", work))
+        await started.wait()
+        first.cancel()
+        result = await second
+
+        third = asyncio.create_task(flights.do("other", work))
+        await asyncio.sleep(0.01)
+        flight = flights.flights["other"]
+        third.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await third
+        await asyncio.sleep(0)
+        return result, flight.task.cancelled()
+
+    assert asyncio.run(run()) == (("result", True), True)
+
+def test_late_stream_subscriber_replays_earlier_items():
+    runs = []
+
+    async def produce():
+        runs.append(1)
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def consume(flights, delay):
+        await asyncio.sleep(delay)
+        return [item async for item in flights.stream("key", produce)]
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(consume(flights, 0), consume(flights, 0.015)), flights.get_stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [[0, 1, 2], [0, 1, 2]]
+    assert runs == [1]
+    assert (stats["streams"], stats["coalesced_streams"]) == (1, 1)
+
+def test_stream_is_cancelled_when_its_last_subscriber_leaves():
+    cancelled = []
+
+    async def produce():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield "item"
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        flights = SingleFlight()
+        stream = flights.stream("key", produce)
+        assert await stream.__anext__() == "item"
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        return flights.get_stats()["in_flight_streams"]
+
+    assert asyncio.run(run()) == 0
+    assert cancelled == [1]
@@ -0,0 +1,54 @@
+"""
+Tests for the /ws endpoint in server.py
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from websocket_manager import websocket_manager
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with TestClient(server.app) as client:
+        yield client
+
+def test_control_messages_and_echo(client):
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_json()["type"] == "current_state"
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json()["type"] == "pong"
+        ws.send_json({"type": "subscribe", "topics": ["workflow:w1"]})
+        assert ws.receive_json() == {"type": "subscribed", "topics": ["workflow:w1"]}
+        assert ws.receive_json()["type"] == "current_state"
+        ws.send_text("hello")
+        assert ws.receive_text() == "Message: hello"
+
+@pytest.mark.parametrize("control", [
+    {"type": "subscribe", "topics": 5},
+    {"type": "subscribe", "topics": None},
+    {"type": "unsubscribe", "topics": "agents"},
+    {"type": "resume", "last_seq": "abc"},
+])
+def test_malformed_control_messages_get_an_error_and_keep_the_connection(client, control):
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_json(control)
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json()["type"] == "pong"
+
+def test_connection_is_unregistered_when_the_client_leaves(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_json()
+        assert len(websocket_manager.fanout) == 1
+    client.get("/api/websocket/stats")
+    assert len(websocket_manager.fanout) == 0
+
+def test_reconnect_with_last_seq_skips_the_snapshot(client):
+    with client.websocket_connect(f"/ws?last_seq={websocket_manager.fanout.last_seq}") as ws:
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json()["type"] == "pong"
+    with client.websocket_connect("/ws?last_seq=1") as ws:
+        assert ws.receive_json()["type"] == "current_state"
@@ -0,0 +1,268 @@
+"""
+Tests for per-connection WebSocket delivery in websocket_fanout.py
+"""
+
+import asyncio
+import json
+
+from websocket_fanout import (
+    WebSocketFanout, CLOSE_INTERNAL_ERROR, CLOSE_TRY_AGAIN_LATER, POLICY_COALESCE, POLICY_DISCONNECT
+)
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+    def messages(self):
+        """Received messages with batches unpacked"""
+        flat = []
+        for message in self.sent:
+            flat.extend(message["updates"] if message.get("type") == "batch" else [message])
+        return flat
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_every_client_gets_every_broadcast_in_order():
+    async def scenario():
+        fanout = WebSocketFanout()
+        clients = [FakeWebSocket() for _ in range(3)]
+        for ws in clients:
+            fanout.register(ws)
+        seqs = [fanout.publish({"type": "x", "i": i}) for i in range(10)]
+        await settle()
+        for ws in clients:
+            assert [m["i"] for m in ws.messages()] == list(range(10))
+            assert [m["seq"] for m in ws.messages()] == seqs
+        fanout.close_all()
+    run(scenario())
+
+def test_direct_message_waits_for_broadcasts_queued_before_it():
+    async def scenario():
+        fanout = WebSocketFanout()
+        ws = FakeWebSocket()
+        fanout.register(ws)
+        fanout.publish({"type": "update", "i": 0})
+        fanout.send_to(ws, json.dumps({"type": "snapshot"}))
+        fanout.publish({"type": "update", "i": 1})
+        await settle()
+        assert [m["type"] for m in ws.sent] == ["update", "snapshot", "update"]
+        fanout.close_all()
+    run(scenario())
+
+def test_direct_message_waits_for_routed_topic_messages():
+    async def scenario():
+        fanout = WebSocketFanout()
+        ws = FakeWebSocket()
+        fanout.register(ws)
+        fanout.subscribe(ws, ["workflow:1"])
+        fanout.publish({"type": "update", "i": 0}, topics=["workflow:1"])
+        fanout.send_to(ws, json.dumps({"type": "snapshot"}))
+        await settle()
+        assert [m["type"] for m in ws.sent] == ["update", "snapshot"]
+        fanout.close_all()
+    run(scenario())
+
+def test_failed_send_closes_the_socket():
+    async def scenario():
+        fanout = WebSocketFanout()
+        ws = FakeWebSocket(fail=True)
+        fanout.register(ws)
+        fanout.publish({"type": "x"})
+        await settle()
+        assert ws.closed_with == CLOSE_INTERNAL_ERROR
+        assert len(fanout) == 0
+    run(scenario())
+
+def test_send_timeout_closes_the_socket_as_slow():
+    async def scenario():
+        fanout = WebSocketFanout(send_timeout=0.01)
+        ws = FakeWebSocket(delay=1.0)
+        fanout.register(ws)
+        fanout.publish({"type": "x"})
+        await asyncio.sleep(0.1)
+        assert ws.closed_with == CLOSE_TRY_AGAIN_LATER
+        assert fanout.disconnected_slow == 1
+        assert len(fanout) == 0
+    run(scenario())
+
+def test_slow_client_does_not_delay_others_and_drops_oldest():
+    async def scenario():
+        fanout = WebSocketFanout(capacity=64, max_queue=8)
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=0.05)
+        fanout.register(fast)
+        fanout.register(slow)
+        for i in range(40):
+            fanout.publish({"type": "x", "i": i})
+            await asyncio.sleep(0.001)
+        await settle()
+        assert len(fast.sent) == 40
+        await asyncio.sleep(0.6)
+        received = [m["i"] for m in slow.sent]
+        assert received[-1] == 39
+        assert len(received) < 40
+        assert fanout.connections[slow].stats.dropped > 0
+        fanout.close_all()
+    run(scenario())
+
+def test_disconnect_policy_closes_lagging_clients():
+    async def scenario():
+        fanout = WebSocketFanout(capacity=64, max_queue=4, policy=POLICY_DISCONNECT)
+        slow = FakeWebSocket(delay=0.05)
+        fanout.register(slow)
+        for i in range(20):
+            fanout.publish({"type": "x", "i": i})
+        await asyncio.sleep(0.2)
+        assert slow.closed_with == CLOSE_TRY_AGAIN_LATER
+        fanout.close_all()
+    run(scenario())
+
+def test_coalesce_policy_keeps_latest_keyed_update():
+    async def scenario():
+        fanout = WebSocketFanout(capacity=64, max_queue=4, policy=POLICY_COALESCE)
+        slow = FakeWebSocket(delay=0.02)
+        fanout.register(slow)
+        for i in range(30):
+            fanout.publish({"type": "progress", "i": i}, key="agent:1")
+        await asyncio.sleep(0.5)
+        received = [m["i"] for m in slow.sent]
+        assert received[-1] == 29
+        assert fanout.connections[slow].stats.coalesced > 0
+        fanout.close_all()
+    run(scenario())
+
+def test_topic_subscribers_only_get_their_topics_and_untopiced_messages():
+    async def scenario():
+        fanout = WebSocketFanout()
+        everything, w1 = FakeWebSocket(), FakeWebSocket()
+        fanout.register(everything)
+        fanout.register(w1)
+        assert fanout.subscribe(w1, ["workflow:1"]) == {"workflow:1"}
+        fanout.publish({"type": "a"}, topics=["workflow:1"])
+        fanout.publish({"type": "b"}, topics=["workflow:2"])
+        fanout.publish({"type": "c"})
+        await settle()
+        assert [m["type"] for m in everything.sent] == ["a", "b", "c"]
+        assert [m["type"] for m in w1.sent] == ["a", "c"]
+        fanout.close_all()
+    run(scenario())
+
+def test_consecutive_batchable_messages_share_a_frame():
+    async def scenario():
+        fanout = WebSocketFanout()
+        ws = FakeWebSocket()
+        fanout.register(ws)
+        for i in range(5):
+            fanout.publish({"type": "status", "i": i}, batchable=True)
+        fanout.publish({"type": "done"})
+        await settle()
+        assert [m["type"] for m in ws.sent] == ["batch", "done"]
+        assert [m["i"] for m in ws.sent[0]["updates"]] == list(range(5))
+        fanout.close_all()
+    run(scenario())
+
+def test_unsubscribing_from_every_topic_returns_to_the_ring():
+    async def scenario():
+        fanout = WebSocketFanout()
+        ws = FakeWebSocket()
+        fanout.register(ws)
+        fanout.subscribe(ws, ["workflow:1"])
+        await settle()
+        assert fanout.unsubscribe(ws) == set()
+        fanout.publish({"type": "d"}, topics=["workflow:2"])
+        await settle()
+        assert [m["type"] for m in ws.sent] == ["d"]
+        fanout.close_all()
+    run(scenario())
+
+def test_resume_replays_missed_messages_before_live_ones():
+    async def scenario():
+        fanout = WebSocketFanout()
+        first = FakeWebSocket()
+        fanout.register(first)
+        for i in range(3):
+            fanout.publish({"type": "x", "i": i})
+        await settle()
+        last_seq = first.sent[-1]["seq"]
+        fanout.unregister(first)
+        for i in range(3, 6):
+            fanout.publish({"type": "x", "i": i})
+
+        ws = FakeWebSocket()
+        fanout.register(ws)
+        assert fanout.resume(ws, last_seq)
+        fanout.publish({"type": "x", "i": 6})
+        await settle()
+        assert [m["i"] for m in ws.sent] == [3, 4, 5, 6]
+        fanout.close_all()
+    run(scenario())
+
+def test_resume_mid_stream_keeps_direct_messages_after_replayed_broadcasts():
+    async def scenario():
+        fanout = WebSocketFanout()
+        ws = FakeWebSocket(delay=0.02)
+        fanout.register(ws)
+        first = fanout.publish({"type": "x", "i": 0}, batchable=True)
+        fanout.publish({"type": "x", "i": 1}, batchable=True)
+        fanout.send_to(ws, json.dumps({"type": "snapshot"}))
+        await asyncio.sleep(0.005)
+        # The batch is on the wire; the client says it never got it and resumes from before it
+        assert fanout.resume(ws, first - 1)
+        await asyncio.sleep(0.2)
+        assert [m["type"] for m in ws.sent] == ["batch", "batch", "snapshot"]
+        fanout.close_all()
+    run(scenario())
+
+def test_topic_resume_replays_only_subscribed_topics():
+    async def scenario():
+        fanout = WebSocketFanout()
+        last_seq = fanout.publish({"type": "x", "i": 0}, topics=["workflow:1"])
+        fanout.publish({"type": "x", "i": 1}, topics=["workflow:1"])
+        fanout.publish({"type": "x", "i": 2}, topics=["workflow:2"])
+        fanout.publish({"type": "x", "i": 3})
+        ws = FakeWebSocket()
+        fanout.register(ws)
+        fanout.subscribe(ws, ["workflow:1"])
+        assert fanout.resume(ws, last_seq)
+        fanout.publish({"type": "x", "i": 4}, topics=["workflow:1"])
+        await settle()
+        assert [m["i"] for m in ws.sent] == [1, 3, 4]
+        fanout.close_all()
+    run(scenario())
+
+def test_resume_falls_back_when_messages_are_gone_or_from_another_process():
+    async def scenario():
+        fanout = WebSocketFanout(capacity=8, max_queue=8, replay_size=4)
+        last_seq = fanout.publish({"type": "x"}, topics=["workflow:1"])
+        for i in range(10):
+            fanout.publish({"type": "x", "i": i}, topics=["workflow:1"])
+        wildcard, subscribed = FakeWebSocket(), FakeWebSocket()
+        fanout.register(wildcard)
+        fanout.register(subscribed)
+        fanout.subscribe(subscribed, ["workflow:1"])
+        assert not fanout.resume(wildcard, last_seq)
+        assert not fanout.resume(subscribed, last_seq)
+        # Sequence numbers from before this fanout started, or not issued yet
+        assert not fanout.resume(wildcard, fanout.start_seq - 10)
+        assert not fanout.resume(wildcard, fanout.last_seq + 1)
+        assert fanout.resume(wildcard, fanout.last_seq)
+        fanout.close_all()
+    run(scenario())
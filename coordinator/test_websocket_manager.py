@@ -0,0 +1,123 @@
+"""
+Tests for the WebSocket control protocol and agent update delivery in websocket_manager.py
+"""
+
+import asyncio
+
+import pytest
+
+from websocket_fanout import WebSocketFanout
+from websocket_manager import WebSocketManager, message_topics
+from test_websocket_fanout import FakeWebSocket, settle
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_message_topics_cover_type_workflow_and_role():
+    message = {"type": "agent_status_update", "agent": {"role": "engineer", "workflow_id": "w1"}}
+    assert message_topics(message) == ["type:agent_status_update", "workflow:w1", "agent:engineer"]
+    assert message_topics({"type": "chat_done", "response": "hi"}) is None
+
+@pytest.mark.parametrize("topics", [5, None, "agents", ["ok", 3]])
+def test_malformed_topics_get_an_error_frame(topics):
+    async def scenario():
+        manager = WebSocketManager(WebSocketFanout())
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        assert await manager.handle_client_message(ws, {"type": "subscribe", "topics": topics})
+        await settle()
+        assert ws.sent[-1]["type"] == "error"
+        assert manager.fanout.connections[ws].topics == set()
+        manager.fanout.close_all()
+    run(scenario())
+
+def test_non_control_messages_are_left_to_the_caller():
+    async def scenario():
+        manager = WebSocketManager(WebSocketFanout())
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        assert not await manager.handle_client_message(ws, {"type": "chat", "text": "hello"})
+        assert await manager.handle_client_message(ws, {"type": "ping"})
+        await settle()
+        assert [m["type"] for m in ws.sent] == ["current_state", "pong"]
+        manager.fanout.close_all()
+    run(scenario())
+
+def test_subscribe_is_acknowledged_and_filters_updates():
+    async def scenario():
+        manager = WebSocketManager(WebSocketFanout(), frame_rate=1000)
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        await manager.handle_client_message(ws, {"type": "subscribe", "topics": ["workflow:w1"]})
+        await manager.update_agent_status("a1", "A", "engineer", "completed", "t", 100, workflow_id="w1")
+        await manager.update_agent_status("a2", "B", "qa", "completed", "t", 100, workflow_id="w2")
+        await settle()
+        types = [m["type"] for m in ws.messages()]
+        assert types == ["current_state", "subscribed", "current_state", "agent_status_update"]
+        assert ws.messages()[-1]["agent"]["agent_id"] == "a1"
+        manager.fanout.close_all()
+    run(scenario())
+
+def test_chat_events_reach_topic_subscribed_clients():
+    async def scenario():
+        manager = WebSocketManager(WebSocketFanout(), frame_rate=1000)
+        ws = FakeWebSocket()
+        await manager.connect(ws, topics=["workflow:w1"])
+        await manager.broadcast({"type": "chat_done", "response": "hi"})
+        await settle()
+        assert [m["type"] for m in ws.messages()] == ["current_state", "chat_done"]
+        manager.fanout.close_all()
+    run(scenario())
+
+def test_progress_updates_are_coalesced_per_agent():
+    async def scenario():
+        manager = WebSocketManager(WebSocketFanout(), frame_rate=20)
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        for progress in range(0, 100, 5):
+            await manager.update_agent_status("a1", "A", "engineer", "working", "t", progress)
+        await asyncio.sleep(0.2)
+        updates = [m for m in ws.messages() if m["type"] == "agent_status_update"]
+        assert updates[-1]["agent"]["progress"] == 95
+        assert len(updates) < 20
+        manager.fanout.close_all()
+    run(scenario())
+
+def test_only_progress_messages_are_coalesced():
+    async def scenario():
+        manager = WebSocketManager(WebSocketFanout(), frame_rate=20)
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        await manager.send_agent_message("a1", "A", "engineer", "10%")
+        await manager.send_agent_message("a1", "A", "engineer", "50%")
+        await manager.send_agent_message("a1", "A", "engineer", "wrote app.py", "info")
+        await manager.send_agent_message("a1", "A", "engineer", "wrote test.py", "info")
+        await asyncio.sleep(0.2)
+        messages = [m["message"] for m in ws.messages() if m["type"] == "agent_message"]
+        assert messages == ["50%", "wrote app.py", "wrote test.py"]
+        manager.fanout.close_all()
+    run(scenario())
+
+def test_reconnect_with_last_seq_gets_deltas_not_a_snapshot():
+    async def scenario():
+        manager = WebSocketManager(WebSocketFanout(), frame_rate=1000)
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        await manager.update_agent_status("a1", "A", "engineer", "working", "t", 10)
+        await settle()
+        last_seq = max(m["seq"] for m in ws.messages())
+        await manager.disconnect(ws)
+        await manager.update_agent_status("a1", "A", "engineer", "completed", "t", 100)
+        await manager.send_agent_message("a1", "A", "engineer", "done", "complete")
+
+        resumed = FakeWebSocket()
+        await manager.connect(resumed, last_seq=last_seq)
+        await settle()
+        assert [m["type"] for m in resumed.messages()] == ["agent_status_update", "agent_message"]
+
+        stale = FakeWebSocket()
+        await manager.connect(stale, last_seq=1)
+        await settle()
+        assert [m["type"] for m in stale.messages()] == ["current_state"]
+        manager.fanout.close_all()
+    run(scenario())
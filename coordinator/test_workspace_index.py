@@ -0,0 +1,57 @@
+"""
+Tests for the in-memory workspace file index in workspace_index.py
+"""
+
+import os
+
+from workspace_index import WorkspaceIndex
+
+def make_index(tmp_path, files):
+    for path, mtime in files.items():
+        full_path = tmp_path / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        full_path.write_text(path)
+        os.utime(full_path, (mtime, mtime))
+    index = WorkspaceIndex(str(tmp_path), lambda name: name.rsplit(".", 1)[-1], lambda file_type: "")
+    index.build()
+    return index
+
+def listed(index, prefix):
+    return [entry["path"] for entry in index.list_files(prefix)["files"]]
+
+def test_prefix_matches_whole_path_segments(tmp_path):
+    index = make_index(tmp_path, {"proj/a.py": 1, "project2/b.py": 1, "proj.txt": 1})
+    assert listed(index, "proj") == [os.path.join("proj", "a.py")]
+    assert listed(index, "proj/") == [os.path.join("proj", "a.py")]
+    assert listed(index, ".") == listed(index, "")
+    assert len(listed(index, "")) == 3
+    assert list(index.get_directory_stats("proj")) == ["proj"]
+
+def test_list_files_filters_by_type_and_pages(tmp_path):
+    index = make_index(tmp_path, {"a.py": 1, "b.md": 1, "c.py": 1, "d.py": 1})
+    page = index.list_files(file_type="py", limit=2, offset=1)
+    assert [entry["path"] for entry in page["files"]] == ["c.py", "d.py"]
+    assert page["total"] == 3
+
+def test_deleting_the_newest_file_recomputes_directory_mtime(tmp_path):
+    index = make_index(tmp_path, {"src/old.py": 100, "src/new.py": 200, "top.py": 150})
+    (tmp_path / "src" / "new.py").unlink()
+    index.record_delete(str(tmp_path / "src" / "new.py"))
+    stats = index.get_directory_stats()
+    assert stats["src"]["mtime"] == 100
+    assert stats["."]["mtime"] == 150
+    assert (stats["src"]["files"], stats["."]["files"]) == (1, 2)
+
+def test_rewriting_a_file_with_an_older_mtime_lowers_directory_mtime(tmp_path):
+    index = make_index(tmp_path, {"src/a.py": 100, "src/b.py": 200})
+    os.utime(tmp_path / "src" / "b.py", (50, 50))
+    index.record_write(str(tmp_path / "src" / "b.py"))
+    assert index.get_directory_stats("src")["src"]["mtime"] == 100
+
+def test_deleting_a_directory_drops_its_files_and_stats(tmp_path):
+    index = make_index(tmp_path, {"src/pkg/a.py": 300, "src/b.py": 100})
+    index.record_delete(str(tmp_path / "src" / "pkg"))
+    stats = index.get_directory_stats()
+    assert listed(index, "") == [os.path.join("src", "b.py")]
+    assert os.path.join("src", "pkg") not in stats
+    assert stats["src"]["mtime"] == stats["."]["mtime"] == 100
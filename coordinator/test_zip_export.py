@@ -0,0 +1,63 @@
+"""
+Tests for streaming ZIP archives and the export cache in zip_export.py
+"""
+
+import asyncio
+import io
+import os
+import time
+import zipfile
+
+from zip_export import ExportCache, bytes_entry, directory_entries, file_entry, fingerprint, loaded_entry, stream_zip
+
+async def collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+def test_stream_zip_round_trips_members():
+    entries = [
+        bytes_entry("a.txt", b"alpha" * 50000, 1700000000.0),
+        loaded_entry("dir/b.md", 4, 1700000000.0, lambda: b"beta"),
+    ]
+    for compression in ("deflate", "store"):
+        archive = zipfile.ZipFile(io.BytesIO(asyncio.run(collect(stream_zip(entries, compression)))))
+        assert archive.namelist() == ["a.txt", "dir/b.md"]
+        assert archive.read("a.txt") == b"alpha" * 50000
+        assert archive.read("dir/b.md") == b"beta"
+
+def test_directory_entries_walk_files_not_seen_by_any_index(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.txt").write_text("b")
+    (tmp_path / "a.txt").write_text("a")
+    assert [entry.name for entry in directory_entries(str(tmp_path))] == ["a.txt", os.path.join("sub", "b.txt")]
+
+def test_fingerprint_changes_with_contents_and_compression():
+    entries = [bytes_entry("a.txt", b"a", 1.0)]
+    assert fingerprint(entries, "deflate") == fingerprint([bytes_entry("a.txt", b"a", 1.0)], "deflate")
+    # Same size and mtime, different bytes
+    assert fingerprint(entries, "deflate") != fingerprint([bytes_entry("a.txt", b"b", 1.0)], "deflate")
+    assert fingerprint(entries, "deflate") != fingerprint(entries, "store")
+    assert fingerprint(entries, "deflate") != fingerprint([bytes_entry("a.txt", b"ab", 1.0)], "deflate")
+
+def test_fingerprint_sees_a_rewrite_that_keeps_size_and_mtime(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("a")
+    os.utime(path, (1700000000.0, 1700000000.0))
+    before = fingerprint([file_entry(str(path), "a.txt")], "deflate")
+    assert fingerprint([file_entry(str(path), "a.txt")], "deflate") == before
+    # File timestamps can be as coarse as a kernel tick
+    time.sleep(0.05)
+    path.write_text("b")
+    os.utime(path, (1700000000.0, 1700000000.0))
+    assert fingerprint([file_entry(str(path), "a.txt")], "deflate") != before
+
+def test_export_cache_creates_its_directory_only_when_writing(tmp_path):
+    directory = tmp_path / "exports"
+    cache = ExportCache(str(directory), max_entries=1)
+    assert not directory.exists()
+    assert cache.get("missing") is None
+
+    data = asyncio.run(collect(cache.tee("first", stream_zip([bytes_entry("a.txt", b"a", 1.0)]))))
+    with open(cache.get("first"), "rb") as f:
+        assert f.read() == data
+    asyncio.run(cache.build("second", stream_zip([bytes_entry("b.txt", b"b", 1.0)])))
+    assert sorted(os.listdir(directory)) == ["second.zip"]
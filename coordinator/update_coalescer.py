@@ -0,0 +1,60 @@
+"""
+Update Coalescing for Sumeru AI Platform
+
+This module rate-limits high-frequency status updates. Updates are held by
+key and a newer one replaces an older one that has not gone out yet; pending
+updates are built and handed to the publisher together, at most frame_rate
+times a second. Terminal updates flush immediately, so a final state is never
+held back or replaced. Building and serializing updates therefore costs in
+proportion to the frame rate, not to how often producers report progress.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Any, Callable, Hashable
+
+class UpdateCoalescer:
+    def __init__(self, publish: Callable[[List[Dict[str, Any]]], Any], frame_rate: float = 10.0):
+        self.publish = publish
+        self.frame_interval = 1.0 / frame_rate if frame_rate > 0 else 0.0
+        # key -> zero-argument function building the update; insertion order is delivery order
+        self.pending: Dict[Hashable, Callable[[], Dict[str, Any]]] = {}
+        self.last_flush = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"submitted": 0, "coalesced": 0, "frames": 0, "delivered": 0, "terminal": 0}
+
+    def submit(self, key: Hashable, build: Callable[[], Dict[str, Any]], terminal: bool = False):
+        """Queue an update for key, replacing any pending one; terminal updates are delivered at once"""
+        self.stats["submitted"] += 1
+        if key in self.pending:
+            self.stats["coalesced"] += 1
+        self.pending[key] = build
+        if terminal:
+            self.stats["terminal"] += 1
+            self.flush()
+        elif self.timer is None:
+            delay = max(0.0, self.last_flush + self.frame_interval - time.monotonic())
+            self.timer = asyncio.get_running_loop().call_later(delay, self.flush)
+
+    def flush(self) -> int:
+        """Build and publish every pending update as one frame now; returns how many went out"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+        updates = [build() for build in pending.values()]
+        self.last_flush = time.monotonic()
+        self.stats["frames"] += 1
+        self.stats["delivered"] += len(updates)
+        self.publish(updates)
+        return len(updates)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get submitted, coalesced and delivered counts"""
+        return {
+            **self.stats,
+            "pending": len(self.pending),
+            "frame_rate": round(1.0 / self.frame_interval, 3) if self.frame_interval else None
+        }
@@ -0,0 +1,517 @@
+"""
+WebSocket Fan-Out for Sumeru AI Platform
+
+This module delivers broadcasts to WebSocket clients without letting one slow
+client hold up the others. A broadcast is written once to a shared ring of
+recent messages and returns immediately; every connection has its own writer
+task that reads the ring from its own cursor. A connection that falls more
+than max_queue messages behind is handled by its overflow policy: skip the
+oldest messages, skip updates superseded by newer ones with the same key, or
+disconnect.
+
+Connections may instead subscribe to topics. Subscribed connections stop
+reading the ring; a topic index hands them only the messages published on
+their topics, so those cost work in proportion to the clients that want them.
+
+Every broadcast is stamped with a sequence number, and the newest messages of
+each topic are kept in a bounded replay ring. A client that reconnects with
+the last sequence number it saw is resumed with just the messages it missed;
+only when those are no longer held does it need a full snapshot.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque, OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any, Deque, Iterable, Set, Tuple
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_COALESCE = "coalesce"
+POLICY_DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (POLICY_DROP_OLDEST, POLICY_COALESCE, POLICY_DISCONNECT)
+
+# Close codes for clients disconnected for falling behind ("try again later")
+# and for a writer that failed; either way the client should reconnect and resume
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_INTERNAL_ERROR = 1011
+
+# Replay ring for messages published without topics, which every connection gets
+ALL_TOPICS = "*"
+
+# Consecutive batchable messages a writer may combine into one frame
+MAX_BATCH_SIZE = 64
+
+@dataclass
+class _Message:
+    seq: int
+    key: Optional[str]
+    text: str
+    published_at: float
+    batchable: bool = False
+
+@dataclass
+class _TopicReplay:
+    messages: Deque[_Message]
+    # Newest sequence number evicted from this topic's ring; a resume from before it has a gap
+    evicted_seq: int = -1
+
+@dataclass
+class ConnectionStats:
+    sent: int = 0
+    bytes_sent: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    max_lag: int = 0
+    send_time_total: float = 0.0
+    send_time_max: float = 0.0
+
+class FanoutConnection:
+    def __init__(self, fanout: "WebSocketFanout", websocket: Any, max_queue: int, policy: str, send_timeout: float):
+        self.fanout = fanout
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.cursor = fanout.next_seq
+        # Messages for this connection only, each with the next_seq at the time it was queued;
+        # it is sent once every broadcast published before it has been
+        self.direct: Deque[Tuple[int, _Message]] = deque()
+        # Broadcasts routed here by topic once the connection subscribes to any
+        self.topics: Set[str] = set()
+        self.inbox: Deque[_Message] = deque()
+        # Messages from this sequence number on are routed to the inbox live
+        self.routed_from = fanout.next_seq
+        self.ready = asyncio.get_running_loop().create_future()
+        self.stats = ConnectionStats()
+        self.connected_at = time.time()
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+
+    def send(self, text: str) -> bool:
+        """Queue a message for this connection only, after the broadcasts already queued for it.
+
+        Returns False if the connection is closed or full.
+        """
+        if self.closed or len(self.direct) >= self.max_queue:
+            return False
+        self.direct.append((self.fanout.next_seq, _Message(-1, None, text, time.monotonic())))
+        self._wake()
+        return True
+
+    def deliver(self, message: _Message):
+        """Queue a broadcast routed to this connection by topic, applying the overflow policy when full"""
+        if self.closed:
+            return
+        if len(self.inbox) >= self.max_queue:
+            if self.policy == POLICY_DISCONNECT:
+                self._disconnect_slow()
+                return
+            superseded = None
+            if self.policy == POLICY_COALESCE:
+                superseded = next((
+                    queued for queued in self.inbox
+                    if queued.key is not None and self.fanout.latest_by_key.get(queued.key, queued.seq) != queued.seq
+                ), None)
+            if superseded is not None:
+                self.inbox.remove(superseded)
+                self.stats.coalesced += 1
+            else:
+                self.inbox.popleft()
+                self.stats.dropped += 1
+        self.inbox.append(message)
+        self.stats.max_lag = max(self.stats.max_lag, len(self.inbox))
+        self._wake()
+
+    def _wake(self):
+        if not self.ready.done():
+            self.ready.set_result(None)
+
+    def _disconnect_slow(self):
+        self.closed = True
+        self.fanout.disconnected_slow += 1
+        asyncio.create_task(self._close(CLOSE_TRY_AGAIN_LATER))
+
+    @property
+    def lag(self) -> int:
+        behind = 0 if self.topics else self.fanout.next_seq - self.cursor
+        return behind + len(self.inbox) + len(self.direct)
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                message = self._next_message()
+                if message is not None:
+                    await self._send(self._take_batch(message))
+                    continue
+                if self.closed:
+                    break
+                if self.ready.done():
+                    self.ready = asyncio.get_running_loop().create_future()
+                if self.topics:
+                    await self.ready
+                else:
+                    await asyncio.wait((self.fanout.changed(), self.ready), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            pass
+        except TimeoutError:
+            # Close the socket too, so the client notices, reconnects and resumes
+            print(f"WebSocket client did not take a message within {self.send_timeout}s; disconnecting")
+            self.closed = True
+            self.fanout.disconnected_slow += 1
+            await self._close(CLOSE_TRY_AGAIN_LATER)
+        except Exception as e:
+            print(f"WebSocket client dropped: {e}")
+            self.closed = True
+            await self._close(CLOSE_INTERNAL_ERROR)
+        finally:
+            self.closed = True
+            self.fanout._forget(self)
+
+    def _next_message(self, consume: bool = True) -> Optional[_Message]:
+        """Get the next message to send, in wire order; with consume=False it stays queued"""
+        if self.direct and self._direct_due(self.direct[0][0]):
+            return (self.direct.popleft() if consume else self.direct[0])[1]
+        if self.inbox:
+            return self.inbox.popleft() if consume else self.inbox[0]
+        return None if self.topics else self._next_broadcast(consume)
+
+    def _direct_due(self, queued_at_seq: int) -> bool:
+        """Whether every broadcast published before a direct message was queued has been taken"""
+        if self.inbox:
+            return self.inbox[0].seq >= queued_at_seq
+        return bool(self.topics) or self.cursor >= queued_at_seq
+
+    def _take_batch(self, message: _Message) -> str:
+        """Get the text to send for message, joined by any batchable messages queued right behind it"""
+        if not message.batchable:
+            return message.text
+        batch = [message.text]
+        while len(batch) < MAX_BATCH_SIZE:
+            # Look before taking, so a message that cannot join stays in its place in line
+            following = self._next_message(consume=False)
+            if following is None or not following.batchable:
+                break
+            self._next_message()
+            batch.append(following.text)
+        if len(batch) == 1:
+            return batch[0]
+        # The messages are already serialized, so the frame is built without decoding them
+        return '{"type": "batch", "updates": [' + ", ".join(batch) + "]}"
+
+    def _next_broadcast(self, consume: bool = True) -> Optional[_Message]:
+        fanout = self.fanout
+        if self.cursor < fanout.first_seq:
+            # Overwritten in the ring before this connection got to them
+            self.stats.dropped += fanout.first_seq - self.cursor
+            self.cursor = fanout.first_seq
+        behind = fanout.next_seq - self.cursor
+        self.stats.max_lag = max(self.stats.max_lag, behind)
+
+        if behind > self.max_queue:
+            if self.policy == POLICY_DISCONNECT:
+                self._disconnect_slow()
+                return None
+            if self.policy == POLICY_DROP_OLDEST:
+                self.stats.dropped += behind - self.max_queue
+                self.cursor = fanout.next_seq - self.max_queue
+
+        while self.cursor < fanout.next_seq:
+            message = fanout.ring[self.cursor % fanout.capacity]
+            # While behind, a keyed update that a newer one replaces is not worth sending
+            if (self.policy == POLICY_COALESCE and message.key is not None
+                    and fanout.next_seq - self.cursor - 1 >= self.max_queue
+                    and fanout.latest_by_key.get(message.key, message.seq) != message.seq):
+                self.cursor += 1
+                self.stats.coalesced += 1
+                continue
+            if consume:
+                self.cursor += 1
+            return message
+        return None
+
+    async def _send(self, text: str):
+        started = time.monotonic()
+        async with asyncio.timeout(self.send_timeout):
+            await self.websocket.send_text(text)
+        elapsed = time.monotonic() - started
+        self.stats.sent += 1
+        self.stats.bytes_sent += len(text)
+        self.stats.send_time_total += elapsed
+        self.stats.send_time_max = max(self.stats.send_time_max, elapsed)
+
+    async def _close(self, code: int):
+        try:
+            async with asyncio.timeout(self.send_timeout):
+                await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop the writer; the socket itself belongs to the endpoint"""
+        self.closed = True
+        self.task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get delivery counters and how far behind the broadcast stream this connection is"""
+        if self.topics:
+            oldest = self.inbox[0] if self.inbox else None
+        else:
+            oldest = self.fanout.ring[self.cursor % self.fanout.capacity] if self.cursor < self.fanout.next_seq else None
+        stats = asdict(self.stats)
+        stats["avg_send_ms"] = round(stats.pop("send_time_total") / self.stats.sent * 1000, 3) if self.stats.sent else 0.0
+        stats["max_send_ms"] = round(stats.pop("send_time_max") * 1000, 3)
+        return {
+            **stats,
+            "lag": self.lag,
+            "lag_seconds": round(time.monotonic() - oldest.published_at, 3) if oldest else 0.0,
+            "policy": self.policy,
+            "max_queue": self.max_queue,
+            "topics": sorted(self.topics),
+            "connected_at": self.connected_at
+        }
+
+class WebSocketFanout:
+    def __init__(self, capacity: int = 1024, max_queue: int = 256, policy: str = POLICY_DROP_OLDEST,
+                 send_timeout: float = 10.0, replay_size: int = 256, max_replay_topics: int = 256):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}; expected one of {', '.join(OVERFLOW_POLICIES)}")
+        # The ring has to hold a full queue's worth of messages for every connection
+        self.capacity = max(capacity, max_queue)
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.ring: List[Optional[_Message]] = [None] * self.capacity
+        # Start from the clock in microseconds so a restarted server never reuses a sequence number a
+        # client saw before; clients resuming from the old process fall back to a snapshot instead
+        self.start_seq = time.time_ns() // 1000
+        self.next_seq = self.start_seq
+        self.replay_size = replay_size
+        self.max_replay_topics = max_replay_topics
+        # topic -> its newest messages, least recently published topic first
+        self.replay: "OrderedDict[str, _TopicReplay]" = OrderedDict()
+        # Newest sequence number in any topic ring dropped to make room for another topic
+        self.replay_evicted_seq = -1
+        self.latest_by_key: Dict[str, int] = {}
+        self.connections: Dict[Any, FanoutConnection] = {}
+        self.topic_index: Dict[str, Set[FanoutConnection]] = {}
+        self.subscribed: Set[FanoutConnection] = set()
+        self.published = 0
+        self.routed = 0
+        self.resumed = 0
+        self.replayed = 0
+        self.resume_gaps = 0
+        self.disconnected_slow = 0
+        self._changed: Optional[asyncio.Future] = None
+
+    @property
+    def first_seq(self) -> int:
+        return max(self.start_seq, self.next_seq - self.capacity)
+
+    @property
+    def last_seq(self) -> int:
+        """The sequence number of the newest message, or start_seq - 1 before the first one"""
+        return self.next_seq - 1
+
+    def changed(self) -> asyncio.Future:
+        """Get a future resolved by the next publish"""
+        if self._changed is None or self._changed.done():
+            self._changed = asyncio.get_running_loop().create_future()
+        return self._changed
+
+    def publish(self, event: Dict[str, Any], key: Optional[str] = None, topics: Optional[Iterable[str]] = None,
+                batchable: bool = False) -> int:
+        """Queue event, stamped with its sequence number as "seq", for every interested connection.
+
+        Returns the sequence number; never waits on a client. Unsubscribed
+        connections get every message. Subscribed ones get messages on any of
+        their topics, and messages published without topics. Messages
+        published with the same key are successive versions of one update, so
+        a lagging connection on the coalesce policy only gets the latest.
+        Writers send consecutive batchable messages as one "batch" frame.
+        Must be called on the event loop thread.
+        """
+        seq = self.next_seq
+        slot = seq % self.capacity
+        replaced = self.ring[slot]
+        if replaced is not None and replaced.key is not None and self.latest_by_key.get(replaced.key) == replaced.seq:
+            del self.latest_by_key[replaced.key]
+        message = _Message(seq, key, json.dumps({**event, "seq": seq}), time.monotonic(), batchable)
+        self.ring[slot] = message
+        if key is not None:
+            self.latest_by_key[key] = seq
+        self.next_seq += 1
+        self.published += 1
+        topics = list(topics) if topics is not None else None
+        for topic in topics or (ALL_TOPICS,):
+            self._remember(topic, message)
+        if self._changed is not None and not self._changed.done():
+            self._changed.set_result(None)
+        if self.subscribed:
+            for connection in self.subscribed if topics is None else self.subscribers_for(topics):
+                connection.deliver(message)
+                self.routed += 1
+        return seq
+
+    def _remember(self, topic: str, message: _Message):
+        replay = self.replay.get(topic)
+        if replay is None:
+            if len(self.replay) >= self.max_replay_topics:
+                _, dropped = self.replay.popitem(last=False)
+                self.replay_evicted_seq = max(self.replay_evicted_seq, dropped.messages[-1].seq)
+            replay = self.replay[topic] = _TopicReplay(deque())
+        else:
+            self.replay.move_to_end(topic)
+        if len(replay.messages) >= self.replay_size:
+            replay.evicted_seq = replay.messages.popleft().seq
+        replay.messages.append(message)
+
+    def resume(self, websocket: Any, last_seq: int) -> bool:
+        """Queue the messages a reconnecting client missed since last_seq, before any newer ones.
+
+        Call right after register and subscribe. Returns False, queueing
+        nothing, when the missed messages are no longer all held or would
+        overflow the connection's queue; the client then needs a snapshot.
+        """
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return False
+        if not self.start_seq - 1 <= last_seq <= self.last_seq:
+            # From another server process, or from the future
+            self.resume_gaps += 1
+            return False
+
+        if not connection.topics:
+            resume_from = last_seq + 1
+            if resume_from < self.first_seq or self.next_seq - resume_from > connection.max_queue:
+                self.resume_gaps += 1
+                return False
+            self.replayed += max(0, connection.cursor - resume_from)
+            connection.cursor = min(connection.cursor, resume_from)
+        else:
+            missed: Dict[int, _Message] = {}
+            for topic in (*connection.topics, ALL_TOPICS):
+                replay = self.replay.get(topic)
+                evicted_seq = replay.evicted_seq if replay is not None else self.replay_evicted_seq
+                if evicted_seq > last_seq:
+                    self.resume_gaps += 1
+                    return False
+                if replay is None:
+                    continue
+                for message in reversed(replay.messages):
+                    if message.seq <= last_seq:
+                        break
+                    if message.seq < connection.routed_from:
+                        missed[message.seq] = message
+            if len(missed) + len(connection.inbox) > connection.max_queue:
+                self.resume_gaps += 1
+                return False
+            connection.inbox.extendleft(missed[seq] for seq in sorted(missed, reverse=True))
+            connection.routed_from = last_seq + 1
+            self.replayed += len(missed)
+        connection._wake()
+        self.resumed += 1
+        return True
+
+    def subscribers_for(self, topics: Iterable[str]) -> Set[FanoutConnection]:
+        """Get the subscribed connections following any of topics"""
+        connections: Set[FanoutConnection] = set()
+        for topic in topics:
+            connections.update(self.topic_index.get(topic, ()))
+        return connections
+
+    def subscribe(self, websocket: Any, topics: Iterable[str]) -> Set[str]:
+        """Add topics to a connection, which from then on only gets messages on its topics"""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return set()
+        if not connection.topics:
+            connection.routed_from = self.next_seq
+        for topic in topics:
+            connection.topics.add(topic)
+            self.topic_index.setdefault(topic, set()).add(connection)
+        if connection.topics:
+            self.subscribed.add(connection)
+        return set(connection.topics)
+
+    def unsubscribe(self, websocket: Any, topics: Optional[Iterable[str]] = None) -> Set[str]:
+        """Remove some or all of a connection's topics; with none left it gets every message again"""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return set()
+        self._unsubscribe(connection, list(connection.topics) if topics is None else topics)
+        if not connection.topics:
+            # Back on the ring, starting from the next message; the writer was only waiting on its inbox
+            connection.cursor = self.next_seq
+            connection._wake()
+        return set(connection.topics)
+
+    def _unsubscribe(self, connection: FanoutConnection, topics: Iterable[str]):
+        for topic in topics:
+            connection.topics.discard(topic)
+            followers = self.topic_index.get(topic)
+            if followers is not None:
+                followers.discard(connection)
+                if not followers:
+                    del self.topic_index[topic]
+        if not connection.topics:
+            self.subscribed.discard(connection)
+
+    def register(self, websocket: Any, max_queue: Optional[int] = None, policy: Optional[str] = None) -> FanoutConnection:
+        """Start delivering broadcasts to an accepted websocket, beginning with the next one published"""
+        policy = policy or self.policy
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}; expected one of {', '.join(OVERFLOW_POLICIES)}")
+        self.unregister(websocket)
+        connection = FanoutConnection(
+            self, websocket, min(max_queue or self.max_queue, self.capacity), policy, self.send_timeout
+        )
+        self.connections[websocket] = connection
+        return connection
+
+    def unregister(self, websocket: Any):
+        """Stop delivering to websocket"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._forget(connection)
+            connection.close()
+
+    def _forget(self, connection: FanoutConnection):
+        if self.connections.get(connection.websocket) is connection:
+            del self.connections[connection.websocket]
+            self._unsubscribe(connection, list(connection.topics))
+
+    def send_to(self, websocket: Any, text: str) -> bool:
+        """Queue text for one connection; returns False if it is not registered or its queue is full"""
+        connection = self.connections.get(websocket)
+        return connection.send(text) if connection is not None else False
+
+    def close_all(self):
+        """Stop every writer"""
+        for websocket in list(self.connections):
+            self.unregister(websocket)
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get publish counters and per-connection lag"""
+        connections = [connection.get_stats() for connection in self.connections.values()]
+        return {
+            "connections": len(connections),
+            "published": self.published,
+            "routed": self.routed,
+            "last_seq": self.last_seq,
+            "resumed": self.resumed,
+            "replayed": self.replayed,
+            "resume_gaps": self.resume_gaps,
+            "replay_topics": len(self.replay),
+            "replay_size": self.replay_size,
+            "topics": {topic: len(followers) for topic, followers in self.topic_index.items()},
+            "capacity": self.capacity,
+            "max_queue": self.max_queue,
+            "policy": self.policy,
+            "disconnected_slow": self.disconnected_slow,
+            "max_lag": max((stats["lag"] for stats in connections), default=0),
+            "clients": connections
+        }
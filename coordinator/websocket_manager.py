@@ -8,11 +8,55 @@ for live progress tracking and collaboration updates.
 import asyncio
 import json
 import logging
+import os
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Set
 from dataclasses import dataclass, asdict
 import uuid
 
+from update_coalescer import UpdateCoalescer
+from websocket_fanout import WebSocketFanout
+
+# Agent status and progress messages go out at most this many frames per second
+WS_FRAME_RATE = float(os.getenv("WS_FRAME_RATE", "10"))
+
+# Each client has its own writer task reading broadcasts from a shared ring of
+# WS_BROADCAST_BUFFER messages, so a slow client only delays itself; one that
+# falls WS_MAX_QUEUE messages behind is handled by WS_OVERFLOW_POLICY
+# (drop_oldest, coalesce or disconnect). The last WS_REPLAY_BUFFER messages of
+# each topic are kept so a reconnecting client can resume from its last seq.
+WS_BROADCAST_BUFFER = int(os.getenv("WS_BROADCAST_BUFFER", "1024"))
+WS_MAX_QUEUE = int(os.getenv("WS_MAX_QUEUE", "256"))
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest").lower()
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", "256"))
+
+TERMINAL_STATUSES = ("completed", "failed", "error")
+
+def message_topics(message: Dict[str, Any]) -> Optional[List[str]]:
+    """Get the topics a client can subscribe to for a message: its type, workflow and agent role.
+
+    Chat events belong to no workflow or agent, so they are published without
+    topics and reach every client whatever it subscribed to.
+    """
+    if message["type"].startswith("chat_"):
+        return None
+    topics = [f"type:{message['type']}"]
+    body = message.get("agent") or message.get("workflow") or message
+    if body.get("workflow_id"):
+        topics.append(f"workflow:{body['workflow_id']}")
+    if body.get("role"):
+        topics.append(f"agent:{body['role']}")
+    return topics
+
+def update_key(update: Dict[str, Any]) -> Optional[str]:
+    """Get the key under which newer status updates replace older ones for lagging clients"""
+    if update["type"] == "agent_status_update":
+        return f"agent_status:{update['agent']['agent_id']}"
+    if update["type"] == "agent_message" and update["message_type"] == "progress":
+        return f"agent_progress:{update['agent_id']}"
+    return None
+
 # WebSocket connection management
 active_connections: Set[Any] = set()
 agent_status_updates: Dict[str, Dict[str, Any]] = {}
@@ -28,6 +72,7 @@ class AgentStatus:
     progress: int  # 0-100
     estimated_completion: Optional[str] = None
     last_update: str = None
+    workflow_id: Optional[str] = None
     
     def __post_init__(self):
         if self.last_update is None:
@@ -51,61 +96,125 @@ class WorkflowUpdate:
             self.last_update = datetime.now().isoformat()
 
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: Set[Any] = set()
+    def __init__(self, fanout: Optional[WebSocketFanout] = None, frame_rate: float = WS_FRAME_RATE):
+        # Each client gets its own writer, so a slow browser never delays the agents broadcasting
+        self.fanout = fanout or WebSocketFanout()
+        # Progress ticks keep only the latest update per (agent, message type) until the next frame
+        self.coalescer = UpdateCoalescer(self._publish_frame, frame_rate)
         self.agent_status_updates: Dict[str, AgentStatus] = {}
         self.workflow_progress: Dict[str, WorkflowUpdate] = {}
         self.logger = logging.getLogger(__name__)
         
-    async def connect(self, websocket):
-        """Add new WebSocket connection"""
-        self.active_connections.add(websocket)
-        self.logger.info(f"New WebSocket connection. Total connections: {len(self.active_connections)}")
+    async def connect(self, websocket, topics: Optional[List[str]] = None, last_seq: Optional[int] = None):
+        """Add new WebSocket connection, optionally subscribed to topics from the start.
+
+        A reconnecting client passes the last seq it received and gets only the
+        messages it missed, or the current state if those are no longer held.
+        """
+        self.fanout.register(websocket)
+        if topics:
+            self.fanout.subscribe(websocket, topics)
+        self.logger.info(f"New WebSocket connection. Total connections: {len(self.fanout)}")
         
+        if last_seq is not None and self.resume(websocket, last_seq):
+            return
         # Send current state to new connection
-        await self.send_current_state(websocket)
+        await self.send_current_state(websocket, topics)
+
+    def resume(self, websocket, last_seq: int) -> bool:
+        """Replay what a client missed since last_seq; returns False if it needs the current state instead"""
+        # Updates still waiting for their frame would otherwise jump ahead of the replay
+        self.coalescer.flush()
+        return self.fanout.resume(websocket, last_seq)
+
+    async def handle_client_message(self, websocket, message: Dict[str, Any]) -> bool:
+        """Handle a control message from a client: subscribe, unsubscribe, resume or ping.
+
+        Topics are "workflow:<id>", "agent:<role>" and "type:<message type>". A
+        client with no subscriptions receives everything; once subscribed it
+        receives only messages on its topics. Resume takes the last seq the
+        client received. Malformed control messages get an error frame back.
+        Returns False if message is not a control message.
+        """
+        message_type = message.get("type")
+        if message_type not in ("subscribe", "unsubscribe", "resume", "ping"):
+            return False
+        topics = message.get("topics", [])
+        if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+            self._send_error(websocket, message_type, "topics must be a list of strings")
+            return True
+        if message_type == "subscribe":
+            current = self.fanout.subscribe(websocket, topics)
+            self.fanout.send_to(websocket, json.dumps({"type": "subscribed", "topics": sorted(current)}))
+            # Catch the client up on what it just started following
+            await self.send_current_state(websocket, topics)
+        elif message_type == "unsubscribe":
+            current = self.fanout.unsubscribe(websocket, topics or None)
+            self.fanout.send_to(websocket, json.dumps({"type": "subscribed", "topics": sorted(current)}))
+        elif message_type == "resume":
+            last_seq = message.get("last_seq")
+            if not isinstance(last_seq, int) or isinstance(last_seq, bool):
+                self._send_error(websocket, message_type, "last_seq must be an integer")
+                return True
+            if not self.resume(websocket, last_seq):
+                connection = self.fanout.connections.get(websocket)
+                await self.send_current_state(websocket, sorted(connection.topics) if connection else None)
+        elif message_type == "ping":
+            self.fanout.send_to(websocket, json.dumps({"type": "pong", "timestamp": datetime.now().isoformat()}))
+        return True
+
+    def _send_error(self, websocket, request_type: str, error: str):
+        self.fanout.send_to(websocket, json.dumps({"type": "error", "request": request_type, "error": error}))
         
     async def disconnect(self, websocket):
         """Remove WebSocket connection"""
-        self.active_connections.discard(websocket)
-        self.logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        self.fanout.unregister(websocket)
+        self.logger.info(f"WebSocket disconnected. Total connections: {len(self.fanout)}")
         
-    async def broadcast(self, message: Dict[str, Any]):
-        """Broadcast message to all connected clients"""
-        if not self.active_connections:
-            return
-            
-        message_str = json.dumps(message)
-        disconnected = set()
-        
-        for websocket in self.active_connections:
-            try:
-                await websocket.send_text(message_str)
-            except Exception as e:
-                self.logger.error(f"Error sending message: {e}")
-                disconnected.add(websocket)
-                
-        # Remove disconnected websockets
-        for websocket in disconnected:
-            self.active_connections.discard(websocket)
+    async def broadcast(self, message: Dict[str, Any], key: Optional[str] = None):
+        """Queue message for all connected clients without waiting on any of them.
+
+        Messages sharing a key are versions of one update, which lagging clients
+        on the coalesce policy receive only the latest of. Every message is
+        stamped with a seq and kept for replay even with no client connected,
+        so one that reconnects can catch up.
+        """
+        # Coalesced updates queued before this message must not arrive after it
+        self.coalescer.flush()
+        self.fanout.publish(message, key, message_topics(message))
+
+    def _publish_frame(self, updates: List[Dict[str, Any]]):
+        """Publish one frame of coalesced updates; each client's writer batches those on its topics"""
+        for update in updates:
+            self.fanout.publish(update, update_key(update), message_topics(update), batchable=True)
             
-    async def send_current_state(self, websocket):
-        """Send current state to a specific connection"""
+    async def send_current_state(self, websocket, topics: Optional[List[str]] = None):
+        """Send current state to a specific connection, limited to topics if given"""
+        def wanted(message: Dict[str, Any]) -> bool:
+            return not topics or not set(topics).isdisjoint(message_topics(message))
+
         state = {
             "type": "current_state",
-            "agent_status": [asdict(status) for status in self.agent_status_updates.values()],
-            "workflow_progress": [asdict(progress) for progress in self.workflow_progress.values()],
-            "timestamp": datetime.now().isoformat()
+            "agent_status": [
+                asdict(status) for status in self.agent_status_updates.values()
+                if wanted({"type": "agent_status_update", "agent": {"role": status.role, "workflow_id": status.workflow_id}})
+            ],
+            "workflow_progress": [
+                asdict(progress) for progress in self.workflow_progress.values()
+                if wanted({"type": "workflow_progress_update", "workflow": {"workflow_id": progress.workflow_id}})
+            ],
+            "timestamp": datetime.now().isoformat(),
+            # The client resumes from here after a reconnect
+            "seq": self.fanout.last_seq
         }
         
-        try:
-            await websocket.send_text(json.dumps(state))
-        except Exception as e:
-            self.logger.error(f"Error sending current state: {e}")
+        if not self.fanout.send_to(websocket, json.dumps(state)):
+            self.logger.error("Error sending current state: connection is not registered or its queue is full")
             
     async def update_agent_status(self, agent_id: str, agent_name: str, role: str, 
                                 status: str, current_task: str, progress: int, 
-                                estimated_completion: Optional[str] = None):
+                                estimated_completion: Optional[str] = None,
+                                workflow_id: Optional[str] = None):
         """Update agent status and broadcast to all clients"""
         agent_status = AgentStatus(
             agent_id=agent_id,
@@ -114,19 +223,25 @@ class WebSocketManager:
             status=status,
             current_task=current_task,
             progress=progress,
-            estimated_completion=estimated_completion
+            estimated_completion=estimated_completion,
+            workflow_id=workflow_id
         )
         
         self.agent_status_updates[agent_id] = agent_status
         
-        message = {
-            "type": "agent_status_update",
-            "agent": asdict(agent_status),
-            "timestamp": datetime.now().isoformat()
-        }
+        def build_message() -> Dict[str, Any]:
+            return {
+                "type": "agent_status_update",
+                "agent": asdict(agent_status),
+                "timestamp": agent_status.last_update
+            }
         
-        await self.broadcast(message)
-        self.logger.info(f"Agent {agent_name} ({role}) status: {status} - {current_task} ({progress}%)")
+        terminal = status in TERMINAL_STATUSES
+        self.coalescer.submit((agent_id, "agent_status_update"), build_message, terminal)
+        self.logger.log(
+            logging.INFO if terminal else logging.DEBUG,
+            f"Agent {agent_name} ({role}) status: {status} - {current_task} ({progress}%)"
+        )
         
     async def update_workflow_progress(self, workflow_id: str, workflow_name: str,
                                      status: str, current_step: int, total_steps: int,
@@ -154,33 +269,41 @@ class WebSocketManager:
             "timestamp": datetime.now().isoformat()
         }
         
-        await self.broadcast(message)
+        await self.broadcast(message, key=f"workflow_progress:{workflow_id}")
         self.logger.info(f"Workflow {workflow_name} progress: {current_step}/{total_steps} ({status})")
         
     async def send_agent_message(self, agent_id: str, agent_name: str, role: str,
-                               message: str, message_type: str = "progress"):
-        """Send agent message to all clients"""
+                               message: str, message_type: str = "progress",
+                               workflow_id: Optional[str] = None):
+        """Send agent message to all clients; only progress messages are coalesced per agent"""
         message_data = {
             "type": "agent_message",
             "agent_id": agent_id,
             "agent_name": agent_name,
             "role": role,
+            "workflow_id": workflow_id,
             "message": message,
             "message_type": message_type,
             "timestamp": datetime.now().isoformat()
         }
         
-        await self.broadcast(message_data)
-        self.logger.info(f"Agent {agent_name} ({role}): {message}")
+        if message_type == "progress":
+            self.coalescer.submit((agent_id, "agent_message"), lambda: message_data)
+        else:
+            # Every other message (start, complete, error...) is delivered, after any pending progress
+            await self.broadcast(message_data)
+        self.logger.log(logging.INFO if message_type != "progress" else logging.DEBUG, f"Agent {agent_name} ({role}): {message}")
         
     async def send_file_generated(self, agent_id: str, agent_name: str, role: str,
-                                filename: str, file_path: str, file_type: str):
+                                filename: str, file_path: str, file_type: str,
+                                workflow_id: Optional[str] = None):
         """Send file generation notification to all clients"""
         file_data = {
             "type": "file_generated",
             "agent_id": agent_id,
             "agent_name": agent_name,
             "role": role,
+            "workflow_id": workflow_id,
             "filename": filename,
             "file_path": file_path,
             "file_type": file_type,
@@ -207,7 +330,7 @@ class WebSocketManager:
         
     def get_connection_count(self) -> int:
         """Get number of active connections"""
-        return len(self.active_connections)
+        return len(self.fanout)
         
     def get_agent_status(self, agent_id: str) -> Optional[AgentStatus]:
         """Get current status of an agent"""
@@ -217,5 +340,15 @@ class WebSocketManager:
         """Get current progress of a workflow"""
         return self.workflow_progress.get(workflow_id)
 
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """Get per-connection queue lag and delivery counters"""
+        return {**self.fanout.get_stats(), "coalescer": self.coalescer.get_stats()}
+
 # Global WebSocket manager instance
-websocket_manager = WebSocketManager() 
\ No newline at end of file
+websocket_manager = WebSocketManager(WebSocketFanout(
+    capacity=WS_BROADCAST_BUFFER,
+    max_queue=WS_MAX_QUEUE,
+    policy=WS_OVERFLOW_POLICY,
+    send_timeout=WS_SEND_TIMEOUT,
+    replay_size=WS_REPLAY_BUFFER
+)) 
\ No newline at end of file
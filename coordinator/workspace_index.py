@@ -0,0 +1,237 @@
+"""
+Workspace File Index for Sumeru AI Platform
+
+This module keeps an in-memory index of every file under the workspace. It is
+built with one walk at startup and then kept current by the code paths that
+write files and, when watchdog is installed, by filesystem events, so file
+listings never walk the tree again. Per-directory sizes and mtimes are
+maintained alongside it; a directory's mtime is that of the newest file below
+it, recomputed when that file goes away.
+"""
+
+import bisect
+import os
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Any, Callable, Set
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+@dataclass
+class FileEntry:
+    name: str
+    type: str
+    icon: str
+    path: str
+    size: int
+    mtime: float
+
+@dataclass
+class DirectoryStats:
+    files: int = 0
+    size: int = 0
+    mtime: float = 0.0
+
+class WorkspaceIndex:
+    def __init__(self, root: str, file_type: Callable[[str], str], file_icon: Callable[[str], str]):
+        self.root = os.path.realpath(root)
+        self.file_type = file_type
+        self.file_icon = file_icon
+        self.entries: Dict[str, FileEntry] = {}
+        self.sorted_paths: List[str] = []
+        self.by_type: Dict[str, Set[str]] = {}
+        # Totals for every directory, including everything below it; "" is the root
+        self.directories: Dict[str, DirectoryStats] = {}
+        self.lock = threading.RLock()
+        self.observer = None
+
+    def build(self):
+        """Walk the workspace once and replace the index with what is on disk"""
+        entries = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                entry = self._stat(os.path.join(dirpath, filename))
+                if entry is not None:
+                    entries[entry.path] = entry
+
+        with self.lock:
+            self.entries = {}
+            self.sorted_paths = []
+            self.by_type = {}
+            self.directories = {}
+            for entry in entries.values():
+                self._add(entry)
+
+    def start_watching(self) -> bool:
+        """Follow filesystem events with watchdog; returns False when it is not installed"""
+        if not WATCHDOG_AVAILABLE:
+            print("watchdog not available. Workspace index is updated by write hooks only.")
+            return False
+        if self.observer is None:
+            self.observer = Observer()
+            self.observer.schedule(_WorkspaceEventHandler(self), self.root, recursive=True)
+            self.observer.daemon = True
+            self.observer.start()
+        return True
+
+    @property
+    def watching(self) -> bool:
+        """Whether filesystem events keep the index current, rather than only the write hooks"""
+        return self.observer is not None
+
+    def stop_watching(self):
+        """Stop following filesystem events"""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def _relative(self, full_path: str) -> Optional[str]:
+        path = os.path.relpath(os.path.realpath(full_path), self.root)
+        if path == "." or path.startswith(".."):
+            return None
+        return path
+
+    def _stat(self, full_path: str) -> Optional[FileEntry]:
+        path = self._relative(full_path)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        name = os.path.basename(path)
+        file_type = self.file_type(name)
+        return FileEntry(name, file_type, self.file_icon(file_type), path, stat.st_size, stat.st_mtime)
+
+    def _ancestors(self, path: str) -> List[str]:
+        parts = path.split(os.sep)[:-1]
+        return [""] + [os.sep.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+    def _add(self, entry: FileEntry):
+        self.entries[entry.path] = entry
+        bisect.insort(self.sorted_paths, entry.path)
+        self.by_type.setdefault(entry.type, set()).add(entry.path)
+        for directory in self._ancestors(entry.path):
+            stats = self.directories.setdefault(directory, DirectoryStats())
+            stats.files += 1
+            stats.size += entry.size
+            stats.mtime = max(stats.mtime, entry.mtime)
+
+    def _range(self, directory: str) -> slice:
+        """Get the slice of sorted_paths holding every file under directory"""
+        if not directory:
+            return slice(0, len(self.sorted_paths))
+        start = bisect.bisect_left(self.sorted_paths, directory + os.sep)
+        end = bisect.bisect_left(self.sorted_paths, directory + chr(ord(os.sep) + 1))
+        return slice(start, end)
+
+    def _refresh_mtime(self, directory: str):
+        stats = self.directories.get(directory)
+        if stats is not None:
+            stats.mtime = max((self.entries[path].mtime for path in self.sorted_paths[self._range(directory)]), default=0.0)
+
+    def _discard(self, path: str, refresh: bool = True, replacement_mtime: float = 0.0) -> Optional[FileEntry]:
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return None
+        del self.sorted_paths[bisect.bisect_left(self.sorted_paths, path)]
+        self.by_type[entry.type].discard(path)
+        for directory in self._ancestors(path):
+            stats = self.directories[directory]
+            stats.files -= 1
+            stats.size -= entry.size
+            if stats.files == 0:
+                del self.directories[directory]
+        # Only directories whose newest file this was need a rescan, and not if a newer replacement follows
+        if refresh and entry.mtime > replacement_mtime:
+            for directory in reversed(self._ancestors(path)):
+                stats = self.directories.get(directory)
+                if stats is not None and stats.mtime > entry.mtime:
+                    break
+                self._refresh_mtime(directory)
+        return entry
+
+    def record_write(self, full_path: str):
+        """Add or refresh one file after it has been written"""
+        entry = self._stat(full_path)
+        if entry is None or not os.path.isfile(full_path):
+            return
+        with self.lock:
+            self._discard(entry.path, replacement_mtime=entry.mtime)
+            self._add(entry)
+
+    def record_delete(self, full_path: str):
+        """Drop a file, or everything under a directory, after it has been removed"""
+        path = self._relative(full_path)
+        if path is None:
+            return
+        with self.lock:
+            if self._discard(path) is None:
+                for child in self.sorted_paths[self._range(path)]:
+                    self._discard(child, refresh=False)
+                for directory in self._ancestors(path + os.sep):
+                    self._refresh_mtime(directory)
+
+    @staticmethod
+    def _directory(prefix: str) -> str:
+        """Normalize a directory prefix such as "proj/" or "." to an index key"""
+        directory = os.path.normpath(prefix) if prefix else ""
+        return "" if directory == "." else directory.strip(os.sep)
+
+    def list_files(self, prefix: str = "", file_type: Optional[str] = None,
+                   limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        """Get one page of files in path order, optionally under a directory prefix and of one type"""
+        with self.lock:
+            listed = self.sorted_paths[self._range(self._directory(prefix))]
+            if file_type is None:
+                paths = listed
+            else:
+                typed = self.by_type.get(file_type, set())
+                paths = [path for path in listed if path in typed]
+            page = paths[offset:offset + limit] if limit is not None else paths[offset:]
+            return {
+                "files": [asdict(self.entries[path]) for path in page],
+                "total": len(paths),
+                "offset": offset
+            }
+
+    def get_directory_stats(self, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+        """Get file count, total size and newest mtime for a directory prefix and every directory under it"""
+        root = self._directory(prefix)
+        with self.lock:
+            return {
+                directory or ".": asdict(stats)
+                for directory, stats in sorted(self.directories.items())
+                if not root or directory == root or directory.startswith(root + os.sep)
+            }
+
+class _WorkspaceEventHandler(FileSystemEventHandler):
+    def __init__(self, index: WorkspaceIndex):
+        self.index = index
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.index.record_write(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.index.record_write(event.src_path)
+
+    def on_deleted(self, event):
+        self.index.record_delete(event.src_path)
+
+    def on_moved(self, event):
+        self.index.record_delete(event.src_path)
+        if event.is_directory:
+            for dirpath, _, filenames in os.walk(event.dest_path):
+                for filename in filenames:
+                    self.index.record_write(os.path.join(dirpath, filename))
+        else:
+            self.index.record_write(event.dest_path)
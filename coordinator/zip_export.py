@@ -0,0 +1,183 @@
+"""
+Streaming ZIP Export for Sumeru AI Platform
+
+This module builds ZIP archives on the fly: each member is read in chunks and
+the archive bytes are yielded as they are produced, so exporting a project
+takes constant memory however large it is; compression runs in a worker
+thread so the event loop never waits on it. Finished archives can be kept in
+an export cache keyed by a fingerprint of their contents, which lets clients
+resume a download with Range requests.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import List, Optional, AsyncIterator, Callable
+
+CHUNK_SIZE = 64 * 1024
+
+COMPRESSION_METHODS = {"deflate": zipfile.ZIP_DEFLATED, "store": zipfile.ZIP_STORED}
+
+@dataclass
+class ZipEntry:
+    name: str
+    mtime: float
+    size: int
+    chunks: Callable[[], AsyncIterator[bytes]]
+    version: str = ""  # changes whenever the content does, even at the same size and mtime
+
+class _ZipSink:
+    """A write-only, unseekable file object that buffers what zipfile writes until it is drained"""
+
+    def __init__(self):
+        self.buffer: List[bytes] = []
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.buffer)
+        self.buffer.clear()
+        return data
+
+def file_entry(path: str, name: str) -> ZipEntry:
+    """Describe a file on disk as an archive member read in chunks"""
+    stat = os.stat(path)
+
+    async def chunks() -> AsyncIterator[bytes]:
+        with open(path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    # Hashing every file would read the tree twice per export; a write always moves
+    # ctime, which unlike mtime cannot be set back, and a replaced file gets a new inode
+    return ZipEntry(name, stat.st_mtime, stat.st_size, chunks, f"{stat.st_ino}:{stat.st_ctime_ns}")
+
+def directory_entries(root: str) -> List[ZipEntry]:
+    """Describe every file under root, walking the directory, named by its path relative to root"""
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            try:
+                entries.append(file_entry(path, os.path.relpath(path, root)))
+            except OSError:
+                continue  # deleted while walking
+    return entries
+
+def loaded_entry(name: str, size: int, mtime: float, load: Callable[[], Optional[bytes]], version: str = "") -> ZipEntry:
+    """Describe content loaded in one piece, off the event loop, only when the archive reaches it"""
+    async def chunks() -> AsyncIterator[bytes]:
+        data = await asyncio.to_thread(load) or b""
+        for start in range(0, len(data), CHUNK_SIZE):
+            yield data[start:start + CHUNK_SIZE]
+
+    return ZipEntry(name, mtime, size, chunks, version)
+
+def bytes_entry(name: str, data: bytes, mtime: Optional[float] = None) -> ZipEntry:
+    """Describe in-memory content as an archive member"""
+    async def chunks() -> AsyncIterator[bytes]:
+        for start in range(0, len(data), CHUNK_SIZE):
+            yield data[start:start + CHUNK_SIZE]
+
+    return ZipEntry(name, mtime if mtime is not None else time.time(), len(data), chunks, hashlib.sha256(data).hexdigest())
+
+def fingerprint(entries: List[ZipEntry], compression: str) -> str:
+    """Identify an archive by its member names, sizes, mtimes and content versions"""
+    digest = hashlib.sha256(compression.encode())
+    for entry in entries:
+        digest.update(f"\0{entry.name}\0{entry.size}\0{entry.mtime!r}\0{entry.version}".encode())
+    return digest.hexdigest()
+
+async def stream_zip(entries: List[ZipEntry], compression: str = "deflate") -> AsyncIterator[bytes]:
+    """Yield a ZIP archive of entries chunk by chunk as it is built"""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=COMPRESSION_METHODS[compression], allowZip64=True) as archive:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, date_time=time.localtime(max(entry.mtime, 315532800))[:6])
+            info.compress_type = COMPRESSION_METHODS[compression]
+            info.external_attr = 0o644 << 16
+            # The output cannot seek back, so zip64 headers must be chosen up front
+            with archive.open(info, "w", force_zip64=entry.size >= zipfile.ZIP64_LIMIT) as member:
+                async for chunk in entry.chunks():
+                    await asyncio.to_thread(member.write, chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()
+    if data:
+        yield data
+
+class ExportCache:
+    def __init__(self, directory: str, max_entries: int = 20):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.zip")
+
+    def get(self, key: str) -> Optional[str]:
+        """Get the cached archive for key, if a complete one exists"""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        return None
+
+    async def tee(self, key: str, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pass stream through while writing it to the cache; only a complete archive is kept"""
+        path = self.path_for(key)
+        temp_path = f"{path}.{os.getpid()}.{id(stream)}.part"
+        completed = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "wb") as f:
+                async for chunk in stream:
+                    await asyncio.to_thread(f.write, chunk)
+                    yield chunk
+            os.replace(temp_path, path)
+            completed = True
+            self.prune()
+        finally:
+            if not completed and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def build(self, key: str, stream: AsyncIterator[bytes]) -> str:
+        """Write stream to the cache in full and return the archive's path"""
+        async for _ in self.tee(key, stream):
+            pass
+        return self.path_for(key)
+
+    def prune(self):
+        """Keep only the most recently used max_entries archives"""
+        archives = [
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".zip")
+        ]
+        archives.sort(key=os.path.getmtime, reverse=True)
+        for path in archives[self.max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
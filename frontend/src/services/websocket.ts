@@ -57,12 +57,15 @@ export interface WorkflowCompleted {
 }
 
 export type WebSocketMessage = 
-  | { type: 'current_state'; agent_status: AgentStatus[]; workflow_progress: WorkflowUpdate[]; timestamp: string }
+  | { type: 'current_state'; agent_status: AgentStatus[]; workflow_progress: WorkflowUpdate[]; timestamp: string; seq: number }
   | { type: 'agent_status_update'; agent: AgentStatus; timestamp: string }
   | { type: 'workflow_progress_update'; workflow: WorkflowUpdate; timestamp: string }
   | { type: 'agent_message'; agent_id: string; agent_name: string; role: string; message: string; message_type: string; timestamp: string }
   | { type: 'file_generated'; agent_id: string; agent_name: string; role: string; filename: string; file_path: string; file_type: string; timestamp: string }
   | { type: 'workflow_completed'; workflow_id: string; workflow_name: string; total_files: number; total_agents: number; timestamp: string }
+  | { type: 'batch'; updates: WebSocketMessage[] }
+  | { type: 'subscribed'; topics: string[] }
+  | { type: 'error'; request: string; error: string }
   | { type: 'pong'; timestamp: string };
 
 class WebSocketService {
@@ -72,6 +75,10 @@ class WebSocketService {
   private reconnectDelay = 1000;
   private listeners: Map<string, Set<(data: any) => void>> = new Map();
   private isConnecting = false;
+  // Topics like 'workflow:<id>' or 'agent:<role>'; with none, every update is received
+  private topics: Set<string> = new Set();
+  // Sequence number of the last broadcast received; a reconnect resumes after it
+  private lastSeq: number | null = null;
 
   constructor() {
     this.connect();
@@ -83,7 +90,15 @@ class WebSocketService {
     }
 
     this.isConnecting = true;
-    const wsUrl = `ws://localhost:8001/ws`;
+    const params = new URLSearchParams();
+    if (this.topics.size > 0) {
+      params.set('topics', Array.from(this.topics).join(','));
+    }
+    if (this.lastSeq !== null) {
+      params.set('last_seq', String(this.lastSeq));
+    }
+    const query = params.toString();
+    const wsUrl = `ws://localhost:8001/ws${query ? `?${query}` : ''}`;
     
     try {
       this.ws = new WebSocket(wsUrl);
@@ -139,6 +154,12 @@ class WebSocketService {
 
   private handleMessage(message: WebSocketMessage) {
     console.log('WebSocket message received:', message);
+    const seq = (message as { seq?: number }).seq;
+    // A snapshot restarts the count; anything else only moves it forward
+    const restarts = message.type === 'current_state';
+    if (typeof seq === 'number' && (restarts || this.lastSeq === null || seq > this.lastSeq)) {
+      this.lastSeq = seq;
+    }
     
     switch (message.type) {
       case 'current_state':
@@ -159,6 +180,17 @@ class WebSocketService {
       case 'workflow_completed':
         this.emit('workflow_completed', message);
         break;
+      case 'batch':
+        // Several coalesced updates sent as one frame
+        message.updates.forEach(update => this.handleMessage(update));
+        break;
+      case 'subscribed':
+        this.emit('subscribed', message);
+        break;
+      case 'error':
+        console.warn('WebSocket request rejected:', message);
+        this.emit('error', message);
+        break;
       case 'pong':
         this.emit('pong', message);
         break;
@@ -206,6 +238,20 @@ class WebSocketService {
     this.send({ type: 'ping' });
   }
 
+  public subscribe(topics: string[]) {
+    topics.forEach(topic => this.topics.add(topic));
+    this.send({ type: 'subscribe', topics });
+  }
+
+  public unsubscribe(topics?: string[]) {
+    if (topics) {
+      topics.forEach(topic => this.topics.delete(topic));
+    } else {
+      this.topics.clear();
+    }
+    this.send({ type: 'unsubscribe', topics: topics ?? [] });
+  }
+
   public disconnect() {
     if (this.ws) {
       this.ws.close();